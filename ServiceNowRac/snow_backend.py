@@ -0,0 +1,424 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Backends
+
+A backend turns the JSONv2 style calls made by SnowTable, a table name
+and a sysparm string, into requests to the instance and returns the
+response in the JSONv2 shape: a list of records, a list of sys_ids for
+getKeys, or None if there was an error. SnowClient picks the backend from
+its api argument:
+
+    o 'JSONv2' (default), JSONv2Backend: the <table>.do?JSONv2 processor
+    o 'table', TableAPIBackend: the /api/now/table REST API, with
+      server side pagination through sysparm_limit/sysparm_offset and the
+      Link header, sysparm_fields and sysparm_exclude_reference_link
+
+A SnowBackend object can also be passed as api. Aggregate queries go to
+the /api/now/stats API whatever the backend, JSONv2 has no equivalent.
+
+sysparm_fields is honoured by both backends. JSONv2 has no server side
+projection so JSONv2Backend removes the other fields from the records
+it returns.
+'''
+
+import json
+
+try:
+    from urllib.parse import urlencode, urljoin
+except ImportError:
+    from urllib import urlencode
+    from urlparse import urljoin
+
+from requests.exceptions import HTTPError
+
+from .snow_lazy import lazy_records
+
+TABLE_API = '/api/now/table/'
+STATS_API = '/api/now/stats/'
+
+def parse_sysparm(sysparm):
+    ''' Split a sysparm string into a dict. Values are not URL decoded
+        as SnowTable does not encode them.
+    '''
+    params = {}
+    for item in sysparm.split('&'):
+        name, _, value = item.partition('=')
+        if name:
+            params[name] = value
+    return params
+
+def _url(table, sys_id=None, **params):
+    url = TABLE_API + table
+    if sys_id is not None:
+        url += '/%s' % sys_id
+    params['sysparm_exclude_reference_link'] = 'true'
+    return '%s?%s' % (url, urlencode(sorted(params.items())))
+
+def _records(replies):
+    ''' Return the list of results of replies, or None if one failed.
+    '''
+    records = []
+    for status, body in replies:
+        if status not in (200, 201) or not isinstance(body, dict):
+            return None
+        result = body.get('result')
+        if isinstance(result, list):
+            records.extend(result)
+        else:
+            records.append(result)
+    return records
+
+def translate(method, table, sysparm, data=None):
+    ''' Translate a JSONv2 call to Table API requests.
+
+        Returns
+            tuple of the list of (method, url, body) requests and a
+            function converting the list of their (status, decoded body)
+            replies to the JSONv2 response, or None if the call can not
+            be translated
+    '''
+    # pylint: disable=too-many-return-statements
+    params = parse_sysparm(sysparm)
+    action = params.get('sysparm_action')
+    query = params.get('sysparm_query', '')
+    extra = {}
+    for name in ('sysparm_view', 'sysparm_fields'):
+        if params.get(name):
+            extra[name] = params[name]
+
+    if method == 'GET':
+        if action in (None, 'get') and 'sysparm_sys_id' in params:
+            sys_id = params['sysparm_sys_id']
+
+            def get_one(replies):
+                ''' A missing record is an empty response in JSONv2.
+                '''
+                return [] if replies[0][0] == 404 else _records(replies)
+            return [('GET', _url(table, sys_id, **extra), None)], get_one
+        if action == 'getRecords':
+            url = _url(table, sysparm_query=query, **extra)
+            return [('GET', url, None)], _records
+        if action == 'getKeys':
+            url = _url(table, sysparm_query=query, sysparm_fields='sys_id')
+
+            def get_keys(replies):
+                ''' Reduce the records to their sys_ids.
+                '''
+                records = _records(replies)
+                if records is None:
+                    return None
+                return [record['sys_id'] for record in records]
+            return [('GET', url, None)], get_keys
+        return None
+
+    if action == 'insert':
+        return [('POST', _url(table), data)], _records
+    if action == 'insertMultiple':
+        return [('POST', _url(table), record)
+                for record in data.get('records', [])], _records
+    if action == 'update' and query.startswith('sys_id=') and \
+            '^' not in query:
+        return [('PATCH', _url(table, query[7:]), data)], _records
+    if action == 'deleteRecord':
+        sys_id = data.get('sysparm_sys_id')
+
+        def delete(replies):
+            ''' JSONv2 returns the deleted record, only its sys_id is
+                known here.
+            '''
+            status = replies[0][0]
+            if status == 404:
+                return []
+            return [{'sys_id': sys_id}] if status in (200, 204) else None
+        return [('DELETE', _url(table, sys_id), None)], delete
+    return None
+
+def _project(records, fields):
+    ''' Limit a list of records to the comma separated fields.
+    '''
+    fields = [field for field in fields.split(',') if field]
+    return [dict((field, record[field]) for field in fields
+                 if field in record)
+            if isinstance(record, dict) else record for record in records]
+
+class SnowBackend(object):
+    ''' Interface of the backends used by SnowClient.
+    '''
+    name = None
+
+    # True if the instance itself limits responses to sysparm_fields
+    server_fields = False
+
+    @staticmethod
+    def _request(client, method, url, body=None, lazy=False):
+        ''' Make one request. Returns the status code, the decoded body
+            and the response. Client errors are returned, not raised. If
+            lazy is set the result records are LazyRecord.
+        '''
+        kwargs = {'headers': {'Accept': 'application/json'},
+                  'timeout': client.timeout}
+        if body is not None:
+            kwargs['data'] = json.dumps(body)
+        try:
+            response = getattr(client.session, method.lower())(
+                urljoin(client.instance, url), **kwargs)
+        except HTTPError as error:
+            if error.response is None or \
+               not 400 <= error.response.status_code < 500:
+                raise
+            response = error.response
+        if lazy and response.status_code == 200:
+            records = lazy_records(response.content, 'result')
+            if records is not None:
+                return response.status_code, {'result': records}, response
+        try:
+            decoded = response.json() if response.content else None
+        except ValueError:
+            decoded = None
+        return response.status_code, decoded, response
+
+    def stats(self, client, table, sysparm):
+        ''' Query the /api/now/stats aggregate API, which both backends
+            share. Return the result, the stats of the table or the list
+            of groups when sysparm_group_by is given, or None if there was
+            an error.
+        '''
+        status, body, _ = self._request(
+            client, 'GET', '%s%s?%s' % (STATS_API, table, sysparm))
+        if status != 200 or not isinstance(body, dict) or \
+                'result' not in body:
+            client.log.error('stats: Request Error: %s', body)
+            return None
+        return body['result']
+
+    def get(self, client, table, sysparm, lazy=False):
+        ''' Perform a read. Return the list of records or None if there
+            was an error. If lazy is set the records of a getRecords are
+            LazyRecord, see snow_lazy.
+        '''
+        raise NotImplementedError
+
+    def post(self, client, table, sysparm, data):
+        ''' Perform a write. Return the list of records or None if there
+            was an error in the request or in any record.
+        '''
+        raise NotImplementedError
+
+class JSONv2Backend(SnowBackend):
+    ''' The <table>.do?JSONv2 processor interface.
+    '''
+    name = 'JSONv2'
+
+    def __init__(self, api='JSONv2'):
+        self.api = api
+
+    def url(self, client, table, sysparm):
+        ''' Return the URL of a call.
+        '''
+        return '%s%s.do?%s&%s' % (client.instance, table, self.api, sysparm)
+
+    def get(self, client, table, sysparm, lazy=False):
+        url = self.url(client, table, sysparm)
+
+        # Set proper headers
+        headers = {'Accept': 'application/json'}
+
+        response = client.session.get(url, headers=headers,
+                                      timeout=client.timeout)
+
+        if lazy:
+            fields = parse_sysparm(sysparm).get('sysparm_fields')
+            records = lazy_records(response.content, 'records',
+                                   fields.split(',') if fields else None)
+            if records is not None:
+                return records
+
+        try:
+            response = response.json()
+        except ValueError:
+            client.log.error('get: Request Error: Request response is not '
+                             'Json')
+            return None
+
+        if 'error' in response:
+            client.log.error('get: Request Error: %s', response['error'])
+            return None
+        else:
+            if 'records' in response:
+                fields = parse_sysparm(sysparm).get('sysparm_fields')
+                if fields:
+                    return _project(response['records'], fields)
+                return response['records']
+            else:
+                return response
+
+    def post(self, client, table, sysparm, data):
+        url = self.url(client, table, sysparm)
+
+        response = client.session.post(url, data=json.dumps(data),
+                                       timeout=client.timeout)
+
+        try:
+            response = response.json()
+        except ValueError:
+            client.log.error('post: Request Error: Request response is not '
+                             'Json')
+            return None
+
+        if 'records' in response:
+            # Check every record returned to see if there is an error
+            # message in the record. If one record has an error then
+            # return None, otherwise return all the records
+            for record in response['records']:
+                if '__error' in record:
+                    client.log.error('Record Error: %s',
+                                     record['__error']['message'])
+                    return None
+            return response['records']
+        else:
+            if 'error' in response:
+                client.log.error('post: Request Error: %s',
+                                 response['error'])
+            return None
+
+class TableAPIBackend(SnowBackend):
+    ''' The /api/now/table REST API. Reads are paged page_size records at
+        a time following the Link header, or X-Total-Count when there is
+        no Link header. Update by query and deleteMultiple, which the
+        Table API lacks, list the matching sys_ids and then update or
+        delete the records one by one.
+    '''
+    name = 'table'
+    server_fields = True
+
+    def __init__(self, page_size=1000):
+        self.page_size = page_size
+
+    def _pages(self, client, url, lazy=False):
+        ''' Read every page of a list request. Returns the list of
+            (status, decoded body) replies.
+        '''
+        replies = []
+        base = '%s&sysparm_limit=%d' % (url, self.page_size)
+        offset = 0
+        url = base
+        while url:
+            status, body, response = self._request(client, 'GET', url,
+                                                   lazy=lazy)
+            replies.append((status, body))
+            if status != 200 or not isinstance(body, dict):
+                break
+            result = body.get('result') or []
+            offset += len(result)
+            url = response.links.get('next', {}).get('url')
+            total = response.headers.get('X-Total-Count')
+            if url is None and total is not None and result and \
+                    offset < int(total):
+                url = '%s&sysparm_offset=%d' % (base, offset)
+        return replies
+
+    def get(self, client, table, sysparm, lazy=False):
+        translated = translate('GET', table, sysparm)
+        if translated is None:
+            client.log.error('get: Request Error: Unsupported sysparm %s',
+                             sysparm)
+            return None
+        calls, convert = translated
+        url = calls[0][1]
+        if '%s%s/' % (TABLE_API, table) in url:
+            replies = [self._request(client, 'GET', url)[:2]]
+        else:
+            replies = self._pages(client, url, lazy)
+        result = convert(replies)
+        if result is None:
+            client.log.error('get: Request Error: %s', replies[-1])
+        return result
+
+    def _each(self, client, table, query, method, data=None):
+        ''' Apply a PATCH or DELETE to every record matching the query.
+            Returns the replies, or None if listing the records failed.
+        '''
+        sys_ids = self.get(client, table, 'sysparm_action=getKeys&'
+                           'sysparm_query=%s' % query)
+        if sys_ids is None:
+            return None
+        return [self._request(client, method, _url(table, sys_id), data)[:2]
+                for sys_id in sys_ids]
+
+    def post(self, client, table, sysparm, data):
+        translated = translate('POST', table, sysparm, data)
+        if translated is not None:
+            calls, convert = translated
+            replies = [self._request(client, method, url, body)[:2]
+                       for method, url, body in calls]
+            result = convert(replies)
+        else:
+            params = parse_sysparm(sysparm)
+            action = params.get('sysparm_action')
+            replies = None
+            result = None
+            if action == 'update':
+                replies = self._each(client, table,
+                                     params.get('sysparm_query', ''),
+                                     'PATCH', data)
+                result = replies and _records(replies)
+                if replies == []:
+                    result = []
+            elif action == 'deleteMultiple':
+                replies = self._each(client, table,
+                                     data.get('sysparm_query', ''),
+                                     'DELETE')
+                if replies is not None:
+                    result = [{'count': len([reply for reply in replies
+                                             if reply[0] in (200, 204)])}]
+            else:
+                client.log.error('post: Request Error: Unsupported '
+                                 'sysparm_action %s', action)
+                return None
+        if result is None:
+            client.log.error('post: Request Error: %s', replies)
+        return result
+
+BACKENDS = {
+    JSONv2Backend.name: JSONv2Backend,
+    TableAPIBackend.name: TableAPIBackend,
+}
+
+def get_backend(api):
+    ''' Return the backend for the api argument of SnowClient: a backend
+        object, 'table' or the name of the JSONv2 style api.
+    '''
+    if isinstance(api, SnowBackend):
+        return api
+    if api in BACKENDS:
+        return BACKENDS[api]()
+    return JSONv2Backend(api)
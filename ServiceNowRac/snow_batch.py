@@ -0,0 +1,237 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Batch Transport
+
+Pack many SnowTable calls into one round trip to the Batch REST API of the
+instance (/api/now/v1/batch). Inside a `with client.batch():` block the
+calls made by the current thread through SnowClient.get and
+SnowClient.post are queued and a SnowFuture is returned in place of the
+response. Leaving the block sends the queued calls, max_requests REST
+requests per batch, and sets the result of every future to what the call
+would have returned outside of a batch.
+
+    with client.batch():
+        first = incidents.get(sys_id)
+        keys = incidents.get_keys('active=true')
+        incidents.insert({'short_description': 'Batched'})
+    print first.result()['number'], len(keys.result())
+
+The Batch API only wraps the REST APIs, so queued calls are translated to
+Table API requests by snow_backend.translate(). Calls that can not be
+expressed as fixed Table API requests (update by query, deleteMultiple)
+are sent immediately as usual. Calls that
+look at the result of an earlier call, such as get_multiple or
+upsert_many, should not be made inside a batch.
+'''
+
+import json
+import base64
+
+from .snow_backend import translate
+
+BATCH_API = 'api/now/v1/batch'
+
+class SnowFuture(object):
+    ''' The response of a call queued in a batch. The result is available
+        once the batch has been sent.
+    '''
+    def __init__(self, convert=None):
+        self._convert = convert
+        self._done = False
+        self._value = None
+        self._error = None
+        self._children = []
+
+    def done(self):
+        ''' Return True once the result is available.
+        '''
+        return self._done
+
+    def result(self):
+        ''' Return the response of the call. Raises RuntimeError if the
+            batch has not been sent, or the exception raised while sending
+            it.
+        '''
+        if not self._done:
+            raise RuntimeError('The batch has not been sent')
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def then(self, func):
+        ''' Return a new future whose result is func applied to the result
+            of this one.
+        '''
+        child = SnowFuture(func)
+        if self._error is not None:
+            child.set_exception(self._error)
+        elif self._done:
+            child.set_result(self._value)
+        else:
+            self._children.append(child)
+        return child
+
+    def set_result(self, value):
+        ''' Set the result and resolve the futures chained with then().
+        '''
+        if self._convert is not None:
+            value = self._convert(value)
+        self._value = value
+        self._done = True
+        for child in self._children:
+            child.set_result(value)
+        self._children = []
+
+    def set_exception(self, error):
+        ''' Fail the call with an exception, raised by result() of this
+            future and the futures chained with then().
+        '''
+        self._error = error
+        self._done = True
+        for child in self._children:
+            child.set_exception(error)
+        self._children = []
+
+class SnowBatch(object):
+    ''' Context manager queueing the calls of a SnowClient and sending
+        them through the Batch API. Create it with SnowClient.batch().
+    '''
+    def __init__(self, client, max_requests=100):
+        self.client = client
+        self.max_requests = max_requests
+        self.requests = 0
+        self._queued = []
+        self._previous = None
+
+    def add(self, method, table, sysparm, data=None):
+        ''' Queue a call. Returns a SnowFuture or None if the call can not
+            be batched.
+        '''
+        translated = translate(method, table, sysparm, data)
+        if translated is None:
+            return None
+        future = SnowFuture()
+        self._queued.append((translated[0], translated[1], future))
+        return future
+
+    def _groups(self, queued):
+        ''' Split the queued calls into groups of at most max_requests
+            REST requests, keeping the requests of a call together.
+        '''
+        group, size = [], 0
+        for call in queued:
+            if group and size + len(call[0]) > self.max_requests:
+                yield group
+                group, size = [], 0
+            group.append(call)
+            size += len(call[0])
+        if group:
+            yield group
+
+    def _send_group(self, group):
+        rest_requests = []
+        for calls, _, _ in group:
+            for method, url, body in calls:
+                rest = {'id': '%d' % len(rest_requests), 'method': method,
+                        'url': url,
+                        'headers': [
+                            {'name': 'Content-Type',
+                             'value': 'application/json'},
+                            {'name': 'Accept',
+                             'value': 'application/json'}]}
+                if body is not None:
+                    rest['body'] = base64.b64encode(
+                        json.dumps(body).encode('utf-8')).decode('ascii')
+                rest_requests.append(rest)
+        payload = {'batch_request_id': '%d' % self.requests,
+                   'rest_requests': rest_requests}
+        self.requests += 1
+
+        client = self.client
+        response = client.session.post(client.instance + BATCH_API,
+                                       data=json.dumps(payload),
+                                       timeout=client.timeout)
+        serviced = {}
+        try:
+            for reply in response.json().get('serviced_requests', []):
+                body = base64.b64decode(reply.get('body') or '')
+                try:
+                    body = json.loads(body.decode('utf-8')) if body else None
+                except ValueError:
+                    body = None
+                serviced[reply['id']] = (reply.get('status_code'), body)
+        except ValueError:
+            client.log.error('batch: Request Error: Request response is not '
+                             'Json')
+
+        next_id = 0
+        for calls, convert, future in group:
+            ids = ['%d' % num for num in range(next_id,
+                                               next_id + len(calls))]
+            next_id += len(calls)
+            if not all(rest_id in serviced for rest_id in ids):
+                client.log.error('batch: Request Error: Unserviced request')
+                future.set_result(None)
+                continue
+            result = convert([serviced[rest_id] for rest_id in ids])
+            if result is None:
+                client.log.error('batch: Request Error: %s', [
+                    serviced[rest_id] for rest_id in ids
+                    if serviced[rest_id][0] not in (200, 201, 204)])
+            future.set_result(result)
+
+    def send(self):
+        ''' Send the queued calls and set the results of their futures.
+            If sending raises, the exception is set on every future not
+            yet resolved and raised again.
+        '''
+        queued, self._queued = self._queued, []
+        try:
+            for group in self._groups(queued):
+                self._send_group(group)
+        except Exception as error:
+            for _, _, future in queued:
+                if not future.done():
+                    future.set_exception(error)
+            raise
+
+    def __enter__(self):
+        # pylint: disable=protected-access
+        self._previous = getattr(self.client._local, 'batch', None)
+        self.client._local.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # pylint: disable=protected-access
+        self.client._local.batch = self._previous
+        if exc_type is None:
+            self.send()
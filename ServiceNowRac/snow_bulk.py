@@ -0,0 +1,243 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Bulk Mutation
+
+Apply an update or delete to every record matching a query in chunks, so
+that a large mutation does not run into the transaction timeout of the
+instance. The target sys_ids are listed once with getKeys, a page at a
+time past the row cap of the instance (SnowTable.get_all_keys), and then
+mutated with sys_idIN queries, chunk_size records at a time, optionally
+by several worker threads. Every chunk repeats the query, so a record that
+stopped matching since it was listed, e.g. between a checkpoint and its
+resume, is left alone.
+
+Progress can be checkpointed to a file. The checkpoint holds the target
+sys_ids and a log of applied chunks is appended next to it (.done);
+running the same operation again with the same checkpoint resumes where
+the last run stopped. Both files are removed once every chunk has been
+applied.
+
+    bulk = SnowBulk(SnowTable('incident', client), chunk_size=200,
+                    workers=4, checkpoint='close_incidents.json')
+    report = bulk.update({'state': '7'}, 'active=true^sys_created_on<2015')
+'''
+
+import os
+import json
+import time
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class SnowBulk(object):
+    ''' Chunked, resumable bulk update and delete on a SnowTable.
+
+        Parameters:
+            table: SnowTable to mutate
+            chunk_size: number of records mutated by one request
+            workers: number of threads applying chunks in parallel
+            checkpoint: path of the checkpoint file, None to disable
+            progress: function called with the number of records
+                      affected so far and the total number of targets
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self, table, chunk_size=200, workers=1, checkpoint=None,
+                 progress=None):
+        self.table = table
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.log = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def update(self, data, query):
+        ''' Update every record matching the encoded query with data.
+            Returns the report dict described in run().
+        '''
+        return self.run('update', query, data)
+
+    def delete(self, query):
+        ''' Delete every record matching the encoded query. Returns the
+            report dict described in run().
+        '''
+        return self.run('delete', query)
+
+    def _load(self, operation, query, data):
+        ''' Return the saved state matching this operation, or None.
+        '''
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as state_file:
+            state = json.load(state_file)
+        if (state.get('operation'), state.get('query'),
+                state.get('data'), state.get('chunk_size')) != \
+                (operation, query, data, self.chunk_size):
+            self.log.error('bulk: %s: Checkpoint %s is for another '
+                           'operation, starting over', self.table.table,
+                           self.checkpoint)
+            return None
+        state['done'] = []
+        state['affected'] = 0
+        if os.path.exists(self._done_file()):
+            with open(self._done_file()) as done_file:
+                for line in done_file:
+                    fields = line.split()
+                    # A partial last line is from an interrupted write
+                    if len(fields) == 2:
+                        state['done'].append(int(fields[0]))
+                        state['affected'] += int(fields[1])
+        return state
+
+    def _done_file(self):
+        return '%s.done' % self.checkpoint
+
+    def _start(self, state):
+        ''' Atomically write the targets to the checkpoint file and
+            start an empty log of applied chunks.
+        '''
+        if not self.checkpoint:
+            return
+        tmp_name = '%s.tmp' % self.checkpoint
+        with open(tmp_name, 'w') as state_file:
+            json.dump(dict((key, value) for key, value in state.items()
+                           if key not in ('done', 'affected')), state_file)
+        open(self._done_file(), 'w').close()
+        os.rename(tmp_name, self.checkpoint)
+
+    def _mark_done(self, index, affected):
+        ''' Append an applied chunk to the checkpoint log.
+        '''
+        if not self.checkpoint:
+            return
+        with open(self._done_file(), 'a') as done_file:
+            done_file.write('%d %d\n' % (index, affected))
+
+    def _finish(self):
+        ''' Remove the checkpoint files.
+        '''
+        for filename in (self.checkpoint, self._done_file()):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _apply(self, operation, query, data, sys_ids):
+        ''' Mutate the records of one chunk that still match the query.
+            Returns the number of records affected or None if the request
+            failed.
+        '''
+        chunk_query = 'sys_idIN%s' % ','.join(sys_ids)
+        if query:
+            chunk_query = '%s^%s' % (chunk_query, query)
+        query = chunk_query
+        if operation == 'update':
+            response = self.table.update(data, query)
+            return None if response is None else len(response)
+        response = self.table.delete_multiple(query, sys_ids)
+        return None if response is None else response[0].get('count', 0)
+
+    # pylint: disable=too-many-locals
+    def run(self, operation, query, data=None):
+        ''' Run a bulk 'update' or 'delete'.
+
+            Returns
+                dict with the number of 'targets', records 'affected',
+                'chunks' applied and 'failed' in this run, the records
+                affected by all runs ('total_affected'), the 'seconds'
+                taken and the 'throughput' in records per second, or None
+                if the targets could not be listed
+        '''
+        started = time.time()
+        state = self._load(operation, query, data)
+        if state is None:
+            sys_ids = self.table.get_all_keys(query)
+            if sys_ids is None:
+                self.log.error('bulk: %s: getKeys failed', self.table.table)
+                return None
+            state = {'operation': operation, 'query': query, 'data': data,
+                     'chunk_size': self.chunk_size, 'sys_ids': sys_ids,
+                     'done': [], 'affected': 0}
+            self._start(state)
+
+        sys_ids = state['sys_ids']
+        done = set(state['done'])
+        pending = queue.Queue()
+        for index in range(0, len(sys_ids), self.chunk_size):
+            if index not in done:
+                pending.put(index)
+        report = {'targets': len(sys_ids), 'affected': 0, 'chunks': 0,
+                  'failed': 0}
+
+        def worker():
+            ''' Apply chunks until none are left.
+            '''
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+                chunk = sys_ids[index:index + self.chunk_size]
+                try:
+                    affected = self._apply(operation, query, data, chunk)
+                except Exception as error:   # pylint: disable=broad-except
+                    self.log.error('bulk: %s: Chunk %d failed: %s',
+                                   self.table.table, index, error)
+                    affected = None
+                with self._lock:
+                    if affected is None:
+                        report['failed'] += 1
+                        continue
+                    report['chunks'] += 1
+                    report['affected'] += affected
+                    state['done'].append(index)
+                    state['affected'] += affected
+                    self._mark_done(index, affected)
+                    if self.progress is not None:
+                        self.progress(state['affected'], len(sys_ids))
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(max(1, self.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not report['failed'] and self.checkpoint:
+            self._finish()
+        report['total_affected'] = state['affected']
+        report['seconds'] = time.time() - started
+        report['throughput'] = report['affected'] / report['seconds'] \
+            if report['seconds'] else 0.0
+        return report
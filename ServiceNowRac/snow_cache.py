@@ -0,0 +1,219 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Persistent GET Response Cache
+
+ResponseCache stores successful GET responses in a SQLite database so
+that stable lookup data (sys_user, cmn_location, cmdb_ci classes) is
+read from disk across restarts and by every process of a host sharing
+the database file:
+
+    client.session.start_cache('/var/cache/snow/responses.db', ttl=300,
+                               table_ttl={'sys_user': 3600,
+                                          'incident': 0})
+
+Responses are keyed by the user and the full URL, which holds the query
+and the projection (sysparm_fields, sysparm_view). The TTL of a response
+is the one of its table in table_ttl, else ttl; a TTL of 0 disables
+caching for a table. Only 200 responses that are not JSONv2 error
+replies are stored. Writes made through the session (POST, PUT, PATCH
+and DELETE) invalidate the responses of their table, so a process reads
+its own writes; writes made elsewhere are seen once the TTL expires.
+
+A running total of the stored content is kept and the oldest responses
+are evicted when it exceeds max_size bytes. The total is recounted from
+the database, along with the removal of expired responses, every
+EVICT_INTERVAL stores so that the writes of other processes are
+accounted for.
+
+The database runs in WAL mode with a busy timeout so that several
+processes can read and write it at once. Each thread, and each process
+after a fork, opens its own connection.
+'''
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .snow_capture import split_url
+
+_ERROR_RE = re.compile(br'^\s*\{\s*"error"\s*:')
+
+class ResponseCache(object):
+    ''' SQLite store of GET responses.
+
+        Parameters:
+            path: database file, shared by the processes using the cache
+            ttl: default time to live of a response in seconds
+            table_ttl: dict of table name to time to live
+            max_size: bytes of content kept before evicting
+            clock: function returning the current time
+    '''
+    # Stores between two full evictions
+    EVICT_INTERVAL = 100
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, path, ttl=300, table_ttl=None,
+                 max_size=256 * 1024 * 1024, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.table_ttl = dict(table_ttl or {})
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Running total of the content size, None until counted
+        self._size = None
+        self._puts = 0
+        with self._db() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                       'key TEXT PRIMARY KEY, table_name TEXT, '
+                       'headers TEXT, content BLOB, size INTEGER, '
+                       'stored REAL, expires REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS responses_stored '
+                       'ON responses (stored)')
+
+    def _db(self):
+        ''' Return the connection of this thread and process.
+        '''
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @staticmethod
+    def key(url, user=None):
+        ''' Return the cache key of a URL read by user.
+        '''
+        return '%s %s' % (user or '', url)
+
+    def get(self, url, user=None):
+        ''' Return the (headers dict, content) of a cached response, or
+            None if there is no fresh response for the URL.
+        '''
+        row = self._db().execute(
+            'SELECT headers, content FROM responses WHERE key = ? AND '
+            'expires > ?', (self.key(url, user), self.clock())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), bytes(row[1])
+
+    def put(self, url, response, user=None):
+        ''' Store a response. Returns True if it was stored: errors and
+            responses of tables with a TTL of 0 are not.
+        '''
+        table = split_url(url)[0]
+        ttl = self.table_ttl.get(table, self.ttl)
+        content = response.content
+        if not ttl or response.status_code != 200 or \
+                _ERROR_RE.match(content):
+            return False
+        now = self.clock()
+        headers = dict((name, value) for name, value
+                       in response.headers.items()
+                       if name.lower() in ('content-type', 'link',
+                                           'x-total-count'))
+        with self._db() as db:
+            db.execute('INSERT OR REPLACE INTO responses VALUES '
+                       '(?, ?, ?, ?, ?, ?, ?)',
+                       (self.key(url, user), table, json.dumps(headers),
+                        sqlite3.Binary(content), len(content), now,
+                        now + ttl))
+        with self._lock:
+            self._puts += 1
+            due = self._size is None or \
+                self._puts % self.EVICT_INTERVAL == 0
+            if not due:
+                self._size += len(content)
+                due = self._size > self.max_size
+        if due:
+            self.evict()
+        return True
+
+    def evict(self):
+        ''' Delete the expired responses, then the oldest ones until the
+            content fits in max_size.
+        '''
+        with self._db() as db:
+            db.execute('DELETE FROM responses WHERE expires <= ?',
+                       (self.clock(),))
+            size = db.execute('SELECT TOTAL(size) FROM responses'
+                              ).fetchone()[0]
+            if size > self.max_size:
+                doomed = []
+                for key, entry_size in db.execute(
+                        'SELECT key, size FROM responses ORDER BY stored'):
+                    if size <= self.max_size:
+                        break
+                    doomed.append((key,))
+                    size -= entry_size
+                db.executemany('DELETE FROM responses WHERE key = ?',
+                               doomed)
+        with self._lock:
+            self._size = size
+
+    def invalidate(self, table=None):
+        ''' Delete the responses of a table, or every response.
+        '''
+        with self._db() as db:
+            if table is None:
+                db.execute('DELETE FROM responses')
+            else:
+                db.execute('DELETE FROM responses WHERE table_name = ?',
+                           (table,))
+
+    def invalidate_url(self, url):
+        ''' Delete the responses of the table written to by a request to
+            url, or every response for a batch request which may write to
+            any table.
+        '''
+        if '/api/now/v1/batch' in url:
+            self.invalidate()
+        else:
+            self.invalidate(split_url(url)[0])
+
+    def close(self):
+        ''' Close the connection of this thread.
+        '''
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Traffic Capture
+
+Capture writes a compact log of the requests made by a SnowSession to
+disk, one JSON object per line:
+
+    {"t": 0.412, "method": "GET", "table": "incident",
+     "sysparm": "sysparm_action=getKeys&sysparm_query=active=true",
+     "out": 0, "in": 1832, "status": 200, "latency": 0.083, "attempt": 1}
+
+where t is the offset in seconds from the start of the capture, out and
+in are the request and response body sizes in bytes and status is the
+HTTP status code or the name of the requests exception that was raised.
+Table API requests also carry the path of the URL, e.g.
+"/api/now/table/incident/<sys_id>", and their query string as sysparm.
+Every attempt is logged, retries have an attempt number above 1.
+Credentials are never written. Request bodies are only written when
+asked for, and sysparm can be dropped as well.
+
+The log can be played back with snow_replay.
+'''
+
+import json
+import time
+import threading
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+def table_path(url):
+    ''' Return the path of a Table API URL or None for other URLs.
+    '''
+    path = urlsplit(url).path
+    if '/api/now/table/' in path:
+        return '/api/now/table/' + path.split('/api/now/table/', 1)[1]
+    return None
+
+def split_url(url):
+    ''' Split a `<table>.do?<api>&<sysparm>` URL into the table name and
+        the sysparm string. Table API URLs `/api/now/table/<table>[/<id>]`
+        give their table name and query string.
+    '''
+    parts = urlsplit(url)
+    if '/api/now/table/' in parts.path:
+        table = parts.path.split('/api/now/table/', 1)[1].split('/')[0]
+        return table, parts.query
+    table = parts.path.rsplit('/', 1)[-1]
+    if table.endswith('.do'):
+        table = table[:-3]
+    sysparm = parts.query
+    api, sep, rest = sysparm.partition('&')
+    if '=' not in api:
+        sysparm = rest if sep else ''
+    return table, sysparm
+
+class TrafficCapture(object):
+    ''' Append request records to a capture log file.
+
+        Parameters:
+            filename: path of the log, appended to if it exists
+            bodies: write the request bodies to the log
+            sysparm: write the sysparm string to the log
+    '''
+    def __init__(self, filename, bodies=False, sysparm=True):
+        self.filename = filename
+        self.bodies = bodies
+        self.sysparm = sysparm
+        self.start = time.time()
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(filename, 'a')
+
+    # pylint: disable=too-many-arguments
+    def record(self, method, url, body, status, started, latency, size,
+               attempt=1):
+        ''' Write one request record to the log.
+        '''
+        table, sysparm = split_url(url)
+        if body is not None and not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        # Bytes on the wire, before decoding
+        out = len(body) if body else 0
+        if body is not None:
+            body = body.decode('utf-8')
+        entry = {
+            't': round(started - self.start, 6),
+            'method': method,
+            'table': table,
+            'out': out,
+            'in': size,
+            'status': status,
+            'latency': round(latency, 6),
+            'attempt': attempt,
+        }
+        path = table_path(url)
+        if path is not None:
+            entry['path'] = path
+        if self.sysparm:
+            entry['sysparm'] = sysparm
+        if self.bodies and body:
+            entry['body'] = body
+        line = json.dumps(entry, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + '\n')
+                self.count += 1
+
+    def close(self):
+        ''' Flush and close the log.
+        '''
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def load_capture(filename):
+    ''' Return the list of request records in a capture log, ordered by
+        their time offset.
+    '''
+    with open(filename) as log_file:
+        events = [json.loads(line) for line in log_file if line.strip()]
+    events.sort(key=lambda event: event['t'])
+    return events
@@ -34,89 +34,169 @@
 This module provides the client for ServiceNow actions. It provides
 the underlying reliable connection and defines the get and post methods
 for interacting with ServiceNow REST API.
+
+The api argument selects the backend making the requests, see
+snow_backend: 'JSONv2' (default) for the JSONv2 processor, 'table' for
+the Table REST API, or a SnowBackend object. The transport argument
+selects what carries the requests, e.g. 'http2', see snow_transport.
+
+Identical GETs made by several threads at the same time are coalesced:
+while a GET for a table and sysparm is in flight, later callers wait for
+it and get a copy of its decoded response instead of sending their own
+request. SnowClient.coalesced counts the requests saved. A POST to a
+table ends the coalescing of the GETs in flight on it, so a GET made
+after a write never shares the response of a GET sent before it.
 '''
 
-import json
-import logging
+import copy
+import threading
 
-from logging.handlers import SysLogHandler
+from .snow_backend import get_backend
+from .snow_batch import SnowBatch
+from .snow_logging import setup_logging
 from .snow_session import SnowSession
 
 # XXX
 # 1) Need to create well defined errors that the caller can handle
 
+def _copy(result, lazy):
+    ''' Return a copy of a GET response for a coalesced caller. LazyRecords
+        are read only, only the list holding them is copied.
+    '''
+    if lazy and isinstance(result, list):
+        return list(result)
+    return copy.deepcopy(result)
+
+class _Flight(object):
+    ''' A GET in flight, waited on by coalesced callers.
+    '''
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
 class SnowClient(object):
     ''' Use this class to create a persistent connection to a ServiceNow
         instance.
     '''
     # pylint: disable=R0913
-    def __init__(self, hostname, username, password, timeout=60, api='JSONv2'):
+    def __init__(self, hostname, username, password, timeout=60, api='JSONv2',
+                 transport=None):
         self.timeout = timeout
         self.api = api
+        self.backend = get_backend(api)
         self.instance = 'https://%s.service-now.com/' % hostname
         self.session = SnowSession()
         self.session.auth = (username, password)
+        if transport is not None:
+            self.session.set_transport(transport)
 
         # Enables sending logging messages to the local syslog server.
-        self.log = logging.getLogger('ServiceNowRac')
-        sysh = SysLogHandler()
-        formatter = logging.Formatter('%(levelname)s: %(message)s')
-        sysh.setFormatter(formatter)
-        self.log.addHandler(sysh)
+        # The handler is attached once per process, see snow_logging.
+        self.log = setup_logging()
+
+        # Per thread state, holds the active SnowBatch
+        self._local = threading.local()
+
+        # GETs in flight by (table, sysparm), see get()
+        self.coalesce = True
+        self.coalesced = 0
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def batch(self, max_requests=100):
+        ''' Return a context manager that queues the calls made by this
+            thread and sends them through the Batch API on exit, see
+            snow_batch.
+        '''
+        return SnowBatch(self, max_requests)
+
+    def batching(self):
+        ''' Return True if this thread is queuing calls in a batch.
+        '''
+        return getattr(self._local, 'batch', None) is not None
 
-    def get(self, table, sysparm):
+    def _queue(self, method, table, sysparm, data=None):
+        ''' Queue a call in the active batch. Returns a SnowFuture, or None
+            if there is no batch or the call can not be batched.
+        '''
+        batch = getattr(self._local, 'batch', None)
+        if batch is None:
+            return None
+        return batch.add(method, table, sysparm, data)
+
+    def get(self, table, sysparm, lazy=False):
         ''' Make a GET request to the instance. Return the JSON response
             which is an array of records or return None if there was an error.
+            Inside a batch a SnowFuture of the response is returned. A GET
+            identical to one in flight waits for it and returns a copy of
+            its response. If lazy is set records are decoded on access, see
+            snow_lazy.
         '''
-        url = '%s%s.do?%s&%s' % (self.instance, table, self.api, sysparm)
+        future = self._queue('GET', table, sysparm)
+        if future is not None:
+            return future
+        if not self.coalesce:
+            return self.backend.get(self, table, sysparm, lazy=lazy)
 
-        # Set proper headers
-        headers = {'Accept': 'application/json'}
+        key = (table, sysparm, lazy)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
 
-        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _copy(flight.result, lazy)
 
+        result = None
         try:
-            response = response.json()
-        except ValueError:
-            self.log.error('get: Request Error: Request response is not Json')
-            return None
+            result = self.backend.get(self, table, sysparm, lazy=lazy)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._flights_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            # The waiters copy a version the leader's caller can not modify
+            flight.result = _copy(result, lazy) if flight.waiters else None
+            flight.done.set()
+        return result
 
-        if 'error' in response:
-            self.log.error('get: Request Error: %s', response['error'])
-            return None
-        else:
-            if 'records' in response:
-                return response['records']
-            else:
-                return response
+    def _end_flights(self, table):
+        ''' Stop later GETs on a table from joining the GETs in flight,
+            whose responses may predate a write.
+        '''
+        with self._flights_lock:
+            for key in [key for key in self._flights if key[0] == table]:
+                del self._flights[key]
 
     def post(self, table, sysparm, data):
         ''' Make a POST request to the instance. Return the JSON response
             or return None if there was an error in the request or in any
-            record returned.
+            record returned. Inside a batch a SnowFuture of the response is
+            returned.
         '''
-        url = '%s%s.do?%s&%s' % (self.instance, table, self.api, sysparm)
-
-        response = self.session.post(url, data=json.dumps(data),
-                                     timeout=self.timeout)
+        future = self._queue('POST', table, sysparm, data)
+        if future is not None:
+            return future
 
+        self._end_flights(table)
         try:
-            response = response.json()
-        except ValueError:
-            self.log.error('post: Request Error: Request response is not Json')
-            return None
+            return self.backend.post(self, table, sysparm, data)
+        finally:
+            self._end_flights(table)
 
-        if 'records' in response:
-            # Check every record returned to see if there is an error
-            # message in the record. If one record has an error then
-            # return None, otherwise return all the records
-            for record in response['records']:
-                if '__error' in record:
-                    self.log.error('Record Error: %s',
-                                   record['__error']['message'])
-                    return None
-            return response['records']
-        else:
-            if 'error' in response:
-                self.log.error('post: Request Error: %s', response['error'])
-            return None
+    def stats(self, table, sysparm):
+        ''' Make an aggregate query to the /api/now/stats API. Return the
+            result or None if there was an error.
+        '''
+        return self.backend.stats(self, table, sysparm)
@@ -0,0 +1,120 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Columnar Results
+
+SnowTable.get_columns() returns the records of a query as a dict of NumPy
+arrays, one per field, for vectorized analysis. The records are read in
+chunks through SnowTable.iter_records() and each chunk is converted one
+column at a time with NumPy, not row by row in Python.
+
+Column types, given per field in dtypes:
+
+    o 'str' (default): object array of the strings
+    o 'int': int64, empty values are 0
+    o 'float': float64, empty values are NaN
+    o 'bool': bool, True for 'true'
+    o 'datetime': datetime64[s] from 'YYYY-MM-DD HH:MM:SS', empty values
+      are NaT
+    o 'duration': timedelta64[s], ServiceNow stores durations as a date
+      time since 1970-01-01 00:00:00
+
+NumPy is an optional dependency, imported when get_columns() is called.
+'''
+
+DTYPES = ('str', 'int', 'float', 'bool', 'datetime', 'duration')
+
+def _numpy():
+    try:
+        import numpy   # pylint: disable=import-outside-toplevel
+    except ImportError:
+        raise ImportError('get_columns requires numpy, install '
+                          'ServiceNowRac[numpy]')
+    return numpy
+
+def convert(values, dtype='str'):
+    ''' Convert a list of ServiceNow string values to a NumPy array.
+    '''
+    numpy = _numpy()
+    if dtype == 'str':
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+    strings = numpy.array(values, dtype=str) if values else \
+        numpy.array([], dtype=str)
+    empty = strings == ''
+    if dtype == 'bool':
+        return strings == 'true'
+    if dtype == 'int':
+        return numpy.where(empty, '0', strings).astype(numpy.int64)
+    if dtype == 'float':
+        return numpy.where(empty, 'nan', strings).astype(numpy.float64)
+    if dtype in ('datetime', 'duration'):
+        times = numpy.where(empty, 'NaT', numpy.char.replace(strings, ' ',
+                                                             'T'))
+        times = times.astype('datetime64[s]')
+        if dtype == 'duration':
+            return times - numpy.datetime64('1970-01-01T00:00:00', 's')
+        return times
+    raise ValueError('Unknown dtype %s' % dtype)
+
+def to_columns(records, fields, dtypes=None, chunk_size=1000):
+    ''' Build a dict of NumPy arrays, one per field, from an iterable of
+        records, converting chunk_size records at a time.
+    '''
+    numpy = _numpy()
+    dtypes = dict(dtypes or {})
+    for field, dtype in dtypes.items():
+        if dtype not in DTYPES:
+            raise ValueError('Unknown dtype %s for %s' % (dtype, field))
+    chunks = dict((field, []) for field in fields)
+    pending = dict((field, []) for field in fields)
+    count = 0
+
+    def flush():
+        ''' Convert the pending values of every field.
+        '''
+        for field in fields:
+            chunks[field].append(convert(pending[field],
+                                         dtypes.get(field, 'str')))
+            pending[field] = []
+
+    for record in records:
+        for field in fields:
+            value = record.get(field, '')
+            pending[field].append('' if value is None else value)
+        count += 1
+        if count % chunk_size == 0:
+            flush()
+    if count % chunk_size or not count:
+        flush()
+    return dict((field, numpy.concatenate(chunks[field]))
+                for field in fields)
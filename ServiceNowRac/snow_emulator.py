@@ -0,0 +1,757 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Emulator
+
+A local stand-in for the `<table>.do?JSONv2` interface of a ServiceNow
+instance, backed by an in-memory table store. It is meant for load and
+resilience testing of the client without a real instance.
+
+The emulator can be used in two ways:
+    o In-process, by mounting a requests transport adapter on the
+      session of a SnowClient (SnowEmulator.attach)
+    o As a threaded HTTP server on localhost (SnowEmulatorServer)
+
+Supported sysparm_action values:
+    getRecords, getKeys, insert, insertMultiple, update, deleteRecord,
+    deleteMultiple and a plain GET by sysparm_sys_id
+
+The /api/now/table REST API (GET, POST, PUT, PATCH and DELETE with
+sysparm_query, sysparm_fields, sysparm_limit and sysparm_offset) and the
+/api/now/v1/batch API wrapping it are emulated on the same store, as is
+the /api/now/stats aggregate API (sysparm_count, sysparm_group_by and
+sysparm_avg/sum/min/max_fields).
+
+Encoded queries support the ^, ^OR and ^NQ conjunctions, ORDERBY and
+ORDERBYDESC, and the =, !=, >, >=, <, <=, IN, NOT IN, STARTSWITH,
+ENDSWITH, LIKE, NOT LIKE, ISEMPTY and ISNOTEMPTY operators.
+
+Faults that can be injected:
+    o Latency drawn from a distribution for every request
+    o HTTP 502/503/504 responses at a configurable rate
+    o Timeouts at a configurable rate
+    o A row cap on getRecords/getKeys results
+    o Partial failures, where records in a POST response carry an
+      __error entry and are not written to the store
+
+UI views registered with add_view() limit the fields returned when a
+request passes sysparm_view.
+
+Table API list responses carry the X-Total-Count header and, when more
+records follow, a Link header with the rel="next" page.
+'''
+
+import re
+import json
+import base64
+import math
+import time
+import uuid
+import random
+import threading
+
+try:
+    from urllib.parse import urlsplit, parse_qsl, urlencode
+except ImportError:
+    from urllib import urlencode
+    from urlparse import urlsplit, parse_qsl
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ReadTimeout
+from requests.structures import CaseInsensitiveDict
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TABLE_API = '/api/now/table/'
+BATCH_API = '/api/now/v1/batch'
+STATS_API = '/api/now/stats/'
+STATS_FUNCTIONS = ('avg', 'sum', 'min', 'max')
+
+_TERM_RE = re.compile(r'^([a-z0-9_.]+?)(ISNOTEMPTY|ISEMPTY|NOT IN|IN|'
+                      r'STARTSWITH|ENDSWITH|NOT LIKE|LIKE|!=|>=|<=|=|>|<)'
+                      r'(.*)$', re.DOTALL)
+
+class EmulatorTimeout(Exception):
+    ''' Raised by the emulator when a timeout fault is injected.
+    '''
+
+def constant_latency(seconds):
+    ''' Return a latency function that always returns seconds.
+    '''
+    return lambda rand: seconds
+
+def uniform_latency(low, high):
+    ''' Return a latency function uniformly distributed over [low, high].
+    '''
+    return lambda rand: rand.uniform(low, high)
+
+def lognormal_latency(median, sigma=0.5):
+    ''' Return a latency function with a log-normal distribution. This
+        has the long tail typically seen on a hosted instance.
+    '''
+    return lambda rand: rand.lognormvariate(math.log(median), sigma)
+
+def _compare_key(value):
+    ''' Return a key so that numeric strings compare as numbers and
+        everything else compares as strings.
+    '''
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0.0, value)
+
+def _match_term(record, field, oper, value):
+    ''' Evaluate a single encoded query term against a record.
+    '''
+    actual = record.get(field, '')
+    actual = '' if actual is None else '%s' % actual
+    if oper == '=':
+        return actual == value
+    if oper == '!=':
+        return actual != value
+    if oper == 'IN':
+        return actual in value.split(',')
+    if oper == 'NOT IN':
+        return actual not in value.split(',')
+    if oper == 'STARTSWITH':
+        return actual.startswith(value)
+    if oper == 'ENDSWITH':
+        return actual.endswith(value)
+    if oper == 'LIKE':
+        return value in actual
+    if oper == 'NOT LIKE':
+        return value not in actual
+    if oper == 'ISEMPTY':
+        return actual == ''
+    if oper == 'ISNOTEMPTY':
+        return actual != ''
+    left, right = _compare_key(actual), _compare_key(value)
+    if oper == '>':
+        return left > right
+    if oper == '>=':
+        return left >= right
+    if oper == '<':
+        return left < right
+    return left <= right
+
+def compile_query(query):
+    ''' Compile an encoded query string. Returns a tuple of a predicate
+        function that takes a record and a list of (field, descending)
+        ordering tuples. Raises ValueError for terms that can not be
+        parsed.
+    '''
+    groups = []
+    order = []
+    for sub_query in (query or '').split('^NQ'):
+        clauses = []
+        for term in sub_query.split('^'):
+            if not term or term == 'EQ':
+                continue
+            if term.startswith('ORDERBYDESC'):
+                order.append((term[11:], True))
+                continue
+            if term.startswith('ORDERBY'):
+                order.append((term[7:], False))
+                continue
+            is_or = term.startswith('OR') and clauses
+            if is_or:
+                term = term[2:]
+            match = _TERM_RE.match(term)
+            if match is None:
+                raise ValueError('Invalid query term: %s' % term)
+            if is_or:
+                clauses[-1].append(match.groups())
+            else:
+                clauses.append([match.groups()])
+        groups.append(clauses)
+
+    def predicate(record):
+        ''' Return True if the record matches the query.
+        '''
+        for clauses in groups:
+            if all(any(_match_term(record, *term) for term in clause)
+                   for clause in clauses):
+                return True
+        return False
+
+    return predicate, order
+
+class SnowEmulator(object):
+    ''' In-memory emulation of a ServiceNow instance JSONv2 interface.
+
+        Parameters:
+            latency: seconds, or a function taking a random.Random
+                     object and returning seconds, applied per request
+            error_rates: dict of HTTP status code (502, 503, 504) to the
+                         probability of returning that status
+            timeout_rate: probability that a request times out
+            row_cap: maximum number of rows returned by a read, None
+                     for no limit
+            record_error_rate: probability that a record in a POST
+                               response carries an __error entry
+            seed: seed for the random number generator
+    '''
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(self, latency=0, error_rates=None, timeout_rate=0.0,
+                 row_cap=10000, record_error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rates = dict(error_rates or {})
+        self.timeout_rate = timeout_rate
+        self.row_cap = row_cap
+        self.record_error_rate = record_error_rate
+        self.tables = {}
+        self.views = {}
+        self.requests = 0
+        self.clock = time.time
+        self._rand = random.Random(seed)
+        self._rand_lock = threading.Lock()
+        self._lock = threading.RLock()
+
+    def load(self, table, records):
+        ''' Load records into a table as-is. Records without a sys_id
+            are assigned one. Returns the list of sys_ids.
+        '''
+        sys_ids = []
+        with self._lock:
+            store = self.tables.setdefault(table, {})
+            for record in records:
+                record = dict(record)
+                record.setdefault('sys_id', uuid.uuid4().hex)
+                store[record['sys_id']] = record
+                sys_ids.append(record['sys_id'])
+        return sys_ids
+
+    def add_view(self, table, view, fields):
+        ''' Register a UI view of a table returning only the given fields.
+        '''
+        self.views[(table, view)] = tuple(fields)
+
+    def records(self, table):
+        ''' Return a copy of all of the records in a table.
+        '''
+        with self._lock:
+            return [dict(rec) for rec in self.tables.get(table, {}).values()]
+
+    def _random(self):
+        with self._rand_lock:
+            return self._rand.random()
+
+    def _delay(self):
+        latency = self.latency
+        if callable(latency):
+            with self._rand_lock:
+                latency = latency(self._rand)
+        if latency > 0:
+            time.sleep(latency)
+
+    def _fault(self):
+        ''' Return a status code to fail the request with, or None.
+        '''
+        if self.timeout_rate and self._random() < self.timeout_rate:
+            raise EmulatorTimeout('Emulated timeout')
+        for status, rate in sorted(self.error_rates.items()):
+            if rate and self._random() < rate:
+                return status
+        return None
+
+    def _now(self):
+        return time.strftime(TIME_FORMAT, time.gmtime(self.clock()))
+
+    def _record_error(self, action, table):
+        if self.record_error_rate and \
+           self._random() < self.record_error_rate:
+            return {'message': 'Invalid %s into: %s' % (action, table),
+                    'reason': 'Emulated record error'}
+        return None
+
+    def _project(self, table, view, records):
+        ''' Return copies of records limited to the fields of a view.
+        '''
+        fields = self.views.get((table, view))
+        if fields is None:
+            return [dict(rec) for rec in records]
+        return [dict((field, rec.get(field, '')) for field in fields)
+                for rec in records]
+
+    def _select(self, table, query, limit=None, capped=True):
+        predicate, order = compile_query(query)
+        rows = [rec for rec in self.tables.get(table, {}).values()
+                if predicate(rec)]
+        for field, desc in reversed(order):
+            rows.sort(key=lambda rec, f=field: _compare_key(rec.get(f, '')),
+                      reverse=desc)
+        caps = [cap for cap in (limit, self.row_cap if capped else None)
+                if cap is not None]
+        if caps:
+            rows = rows[:min(caps)]
+        return rows
+
+    def _write(self, table, action, data, existing=None):
+        ''' Insert or update one record honouring record errors. Returns
+            the record to be placed in the response.
+        '''
+        error = self._record_error(action, table)
+        record = dict(existing or {})
+        record.update(data)
+        if error is not None:
+            record['__error'] = error
+            record['__status'] = 'failure'
+            return record
+        now = self._now()
+        if existing is None:
+            record.setdefault('sys_id', uuid.uuid4().hex)
+            record.setdefault('sys_created_on', now)
+            record['sys_mod_count'] = '0'
+        else:
+            record['sys_mod_count'] = '%d' % (
+                int(existing.get('sys_mod_count') or 0) + 1)
+        record['sys_updated_on'] = now
+        self.tables.setdefault(table, {})[record['sys_id']] = record
+        response = dict(record)
+        response['__status'] = 'success'
+        return response
+
+    def _dispatch(self, table, params, body):
+        # pylint: disable=too-many-return-statements
+        action = params.get('sysparm_action')
+        query = params.get('sysparm_query', '')
+        store = self.tables.setdefault(table, {})
+        limit = params.get('sysparm_record_count')
+        limit = int(limit) if limit else None
+
+        view = params.get('sysparm_view')
+        if action in (None, 'get'):
+            sys_id = params.get('sysparm_sys_id')
+            if sys_id is None:
+                return {'records': self._project(
+                    table, view, self._select(table, query, limit))}
+            record = store.get(sys_id)
+            return {'records': self._project(table, view,
+                                             [record] if record else [])}
+        if action == 'getRecords':
+            return {'records': self._project(
+                table, view, self._select(table, query, limit))}
+        if action == 'getKeys':
+            return {'records': [rec['sys_id'] for rec in
+                                self._select(table, query, limit)]}
+        if action == 'insert':
+            return {'records': [self._write(table, action, body)]}
+        if action == 'insertMultiple':
+            return {'records': [self._write(table, action, rec)
+                                for rec in body.get('records', [])]}
+        if action == 'update':
+            predicate = compile_query(query)[0]
+            return {'records': [self._write(table, action, body, rec)
+                                for rec in list(store.values())
+                                if predicate(rec)]}
+        if action == 'deleteRecord':
+            record = store.pop(body.get('sysparm_sys_id'), None)
+            return {'records': [dict(record)] if record else []}
+        if action == 'deleteMultiple':
+            predicate = compile_query(body.get('sysparm_query', ''))[0]
+            doomed = [key for key, rec in store.items() if predicate(rec)]
+            for key in doomed:
+                del store[key]
+            return {'records': [{'count': len(doomed)}]}
+        return {'error': 'Invalid sysparm_action',
+                'reason': 'Unsupported action %s' % action}
+
+    def _jsonv2(self, method, path, params, body):
+        ''' Handle a request to the <table>.do?JSONv2 interface.
+        '''
+        table = path.rsplit('/', 1)[-1][:-3]
+        if method == 'POST':
+            try:
+                body = json.loads(body or 'null') or {}
+            except ValueError:
+                body = {}
+            if not body:
+                reply = {'error': 'Request JSON object for %s cannot be '
+                                  'null.' % params.get('sysparm_action'),
+                         'reason': 'No data'}
+                return 200, json.dumps(reply).encode('utf-8'), {}
+        elif method != 'GET':
+            return 405, b'', {}
+
+        with self._lock:
+            try:
+                reply = self._dispatch(table, params, body)
+            except ValueError as error:
+                reply = {'error': 'Invalid query', 'reason': '%s' % error}
+        return 200, json.dumps(reply).encode('utf-8'), {}
+
+    @staticmethod
+    def _rest_reply(status, result=None, headers=None):
+        content = b''
+        if result is not None:
+            content = json.dumps(result).encode('utf-8')
+        return status, content, headers or {}
+
+    def _rest_error(self, status, message, detail):
+        return self._rest_reply(status, {'error': {'message': message,
+                                                   'detail': '%s' % detail},
+                                         'status': 'failure'})
+
+    # pylint: disable=too-many-return-statements
+    def _rest(self, method, path, params, body):
+        ''' Handle a request to the /api/now/table REST API.
+        '''
+        parts = path[len(TABLE_API):].strip('/').split('/')
+        table, sys_id = parts[0], parts[1] if len(parts) > 1 else None
+        fields = [field for field in
+                  params.get('sysparm_fields', '').split(',') if field]
+
+        def project(record):
+            ''' Limit a record to sysparm_fields and drop JSONv2 status.
+            '''
+            record = dict((key, value) for key, value in record.items()
+                          if key != '__status')
+            if not fields:
+                return record
+            return dict((field, record.get(field, '')) for field in fields)
+
+        data = None
+        if method in ('POST', 'PUT', 'PATCH'):
+            try:
+                data = json.loads(body or 'null')
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                return self._rest_error(400, 'Invalid request body', body)
+
+        with self._lock:
+            store = self.tables.setdefault(table, {})
+            if sys_id is None and method == 'GET':
+                try:
+                    rows = self._select(table, params.get('sysparm_query'),
+                                        capped=False)
+                except ValueError as error:
+                    return self._rest_error(400, 'Invalid query', error)
+                offset = int(params.get('sysparm_offset') or 0)
+                limit = int(params.get('sysparm_limit') or
+                            self.row_cap or len(rows))
+                page = [project(rec) for rec in rows[offset:offset + limit]]
+                headers = {'X-Total-Count': len(rows)}
+                if offset + limit < len(rows):
+                    following = dict(params, sysparm_offset=offset + limit,
+                                     sysparm_limit=limit)
+                    headers['Link'] = '<%s?%s>;rel="next"' % (
+                        path, urlencode(sorted(following.items())))
+                return self._rest_reply(200, {'result': page}, headers)
+            if sys_id is None and method == 'POST':
+                record = self._write(table, 'insert', data)
+            elif sys_id not in store:
+                return self._rest_error(404, 'No Record found', sys_id)
+            elif method == 'GET':
+                return self._rest_reply(200, {'result': project(
+                    store[sys_id])})
+            elif method in ('PUT', 'PATCH'):
+                record = self._write(table, 'update', data, store[sys_id])
+            elif method == 'DELETE':
+                del store[sys_id]
+                return self._rest_reply(204)
+            else:
+                return self._rest_error(405, 'Method not allowed', method)
+        if '__error' in record:
+            return self._rest_error(403, record['__error']['message'],
+                                    record['__error']['reason'])
+        return self._rest_reply(201 if method == 'POST' else 200,
+                                {'result': project(record)})
+
+    def _stats(self, method, path, params):
+        ''' Handle a request to the /api/now/stats aggregate API.
+        '''
+        if method != 'GET':
+            return self._rest_error(405, 'Method not allowed', method)
+        table = path[len(STATS_API):].strip('/')
+        group_by = [field for field in
+                    params.get('sysparm_group_by', '').split(',') if field]
+        with self._lock:
+            try:
+                rows = self._select(table, params.get('sysparm_query'),
+                                    capped=False)
+            except ValueError as error:
+                return self._rest_error(400, 'Invalid query', error)
+        groups = {}
+        for rec in rows:
+            key = tuple(rec.get(field, '') for field in group_by)
+            groups.setdefault(key, []).append(rec)
+
+        def stats(rows):
+            ''' The stats object of a group of rows.
+            '''
+            result = {}
+            if params.get('sysparm_count') == 'true':
+                result['count'] = '%d' % len(rows)
+            for function in STATS_FUNCTIONS:
+                fields = [field for field in params.get(
+                    'sysparm_%s_fields' % function, '').split(',') if field]
+                if not fields:
+                    continue
+                result[function] = {}
+                for field in fields:
+                    values = [rec.get(field, '') for rec in rows
+                              if rec.get(field, '') != '']
+                    if function in ('min', 'max'):
+                        pick = min if function == 'min' else max
+                        value = pick(values, key=_compare_key) \
+                            if values else ''
+                    else:
+                        numbers = [_compare_key(value)[1] for value in values
+                                   if _compare_key(value)[0] == 0]
+                        total = sum(numbers)
+                        if function == 'avg':
+                            total = total / len(numbers) if numbers else 0
+                        value = '%s' % total if numbers else ''
+                    result[function][field] = value
+            return result
+
+        if not group_by:
+            return self._rest_reply(200, {'result': {'stats': stats(rows)}})
+        result = [{'stats': stats(groups[key]),
+                   'groupby_fields': [{'field': field, 'value': value}
+                                      for field, value in zip(group_by, key)]}
+                  for key in sorted(groups)]
+        return self._rest_reply(200, {'result': result})
+
+    def _batch(self, body):
+        ''' Handle a request to the /api/now/v1/batch REST API. The
+            batched requests share the latency and faults of the batch.
+        '''
+        try:
+            batch = json.loads(body or 'null')
+            rest_requests = batch['rest_requests']
+        except (KeyError, TypeError, ValueError) as error:
+            return self._rest_error(400, 'Invalid batch request', error)
+        serviced, unserviced = [], []
+        for rest in rest_requests:
+            parts = urlsplit(rest['url'])
+            if not parts.path.startswith(TABLE_API):
+                unserviced.append(rest['id'])
+                continue
+            sub_body = rest.get('body')
+            if sub_body:
+                sub_body = base64.b64decode(sub_body).decode('utf-8')
+            status, content, headers = self._rest(
+                rest['method'], parts.path,
+                dict(parse_qsl(parts.query, keep_blank_values=True)),
+                sub_body)
+            serviced.append({
+                'id': rest['id'],
+                'status_code': status,
+                'status_text': 'OK' if status < 400 else 'Error',
+                'headers': [{'name': name, 'value': '%s' % value}
+                            for name, value in headers.items()],
+                'body': base64.b64encode(content).decode('ascii'),
+                'execution_time': 0,
+            })
+        reply = {'batch_request_id': batch.get('batch_request_id'),
+                 'serviced_requests': serviced,
+                 'unserviced_requests': unserviced}
+        return 200, json.dumps(reply).encode('utf-8'), {}
+
+    def handle(self, method, url, body=None):
+        ''' Handle one request. Returns a tuple of the HTTP status code,
+            the response body and a dict of extra response headers.
+            Raises EmulatorTimeout for injected timeouts.
+        '''
+        with self._lock:
+            self.requests += 1
+        self._delay()
+        status = self._fault()
+        if status is not None:
+            return status, b'', {}
+
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        parts = urlsplit(url)
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        if parts.path == BATCH_API and method == 'POST':
+            return self._batch(body)
+        if parts.path.startswith(TABLE_API):
+            return self._rest(method, parts.path, params, body)
+        if parts.path.startswith(STATS_API):
+            return self._stats(method, parts.path, params)
+        if parts.path.endswith('.do'):
+            return self._jsonv2(method, parts.path, params, body)
+        return 404, b'', {}
+
+    def attach(self, client):
+        ''' Route all requests made by a SnowClient to this emulator
+            through an in-process transport adapter.
+        '''
+        client.session.mount(client.instance, SnowEmulatorAdapter(self))
+        return client
+
+class SnowEmulatorAdapter(BaseAdapter):
+    ''' requests transport adapter that answers from a SnowEmulator
+        without opening a socket.
+    '''
+    def __init__(self, emulator):
+        super(SnowEmulatorAdapter, self).__init__()
+        self.emulator = emulator
+
+    # pylint: disable=too-many-arguments,unused-argument
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        ''' Send a PreparedRequest to the emulator.
+        '''
+        try:
+            status, content, headers = self.emulator.handle(
+                request.method, request.url, request.body)
+        except EmulatorTimeout as error:
+            raise ReadTimeout(error, request=request)
+
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(
+            {'content-type': 'application/json'})
+        response.headers.update((name, '%s' % value)
+                                for name, value in headers.items())
+        response._content = content    # pylint: disable=protected-access
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if status == 200 else 'Emulated'
+        return response
+
+    def close(self):
+        pass
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class _EmulatorRequestHandler(BaseHTTPRequestHandler):
+    ''' Hand HTTP requests to the emulator of the server.
+    '''
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY the
+    # body waits for a delayed ACK on a keep-alive connection.
+    disable_nagle_algorithm = True
+
+    def _respond(self, method):
+        length = int(self.headers.get('content-length') or 0)
+        body = self.rfile.read(length) if length else None
+        if body is not None:
+            body = body.decode('utf-8')
+        server = self.server
+        try:
+            status, content, headers = server.emulator.handle(
+                method, self.path, body)
+        except EmulatorTimeout:
+            time.sleep(server.stall)
+            self.close_connection = True
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in headers.items():
+            self.send_header(name, '%s' % value)
+        self.send_header('Content-Length', '%d' % len(content))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):    # pylint: disable=invalid-name
+        ''' Handle a GET request.
+        '''
+        self._respond('GET')
+
+    def do_POST(self):   # pylint: disable=invalid-name
+        ''' Handle a POST request.
+        '''
+        self._respond('POST')
+
+    def do_PUT(self):    # pylint: disable=invalid-name
+        ''' Handle a PUT request.
+        '''
+        self._respond('PUT')
+
+    def do_PATCH(self):  # pylint: disable=invalid-name
+        ''' Handle a PATCH request.
+        '''
+        self._respond('PATCH')
+
+    def do_DELETE(self): # pylint: disable=invalid-name
+        ''' Handle a DELETE request.
+        '''
+        self._respond('DELETE')
+
+    def log_message(self, *args):   # pylint: disable=arguments-differ
+        pass
+
+class SnowEmulatorServer(object):
+    ''' Serve a SnowEmulator over HTTP on localhost from a background
+        thread. Injected timeouts stall the connection for `stall`
+        seconds so the client timeout fires. Can be used as a context
+        manager.
+    '''
+    def __init__(self, emulator=None, host='127.0.0.1', port=0, stall=5):
+        self.emulator = emulator or SnowEmulator()
+        self.httpd = _ThreadingHTTPServer((host, port),
+                                          _EmulatorRequestHandler)
+        self.httpd.emulator = self.emulator
+        self.httpd.stall = stall
+        self.url = 'http://%s:%d/' % self.httpd.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        ''' Start serving requests.
+        '''
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        ''' Stop serving requests and close the socket.
+        '''
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+
+    def attach(self, client):
+        ''' Point a SnowClient at this server.
+        '''
+        client.instance = self.url
+        return client
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,198 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Lazy Records
+
+Decoding a whole response with response.json() builds every field of
+every record, even when the caller only looks at a few fields of a few
+records. With SnowTable.get_records(lazy=True) the raw response is only
+split into per-record byte ranges; each record is a LazyRecord that
+decodes a field from its byte range when the field is first read, and
+decodes the whole record only when it is iterated over.
+
+The split relies on the records being JSON objects whose values are
+strings or objects of strings, as both the JSONv2 and the Table API
+return them, and runs at C speed through bytes searches. A response that
+can not be split, such as an error, is decoded as usual.
+'''
+
+import json
+import re
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+_STRING_RE = re.compile(br'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_ESCAPE_RE = re.compile(br'\\.', re.DOTALL)
+_BOUNDARY_RE = re.compile(br'\}\s*,\s*\{')
+_CLEANED_STRING_RE = re.compile(br'"[^"]*"')
+_FIELD_RES = {}
+
+def split_records(content, key='records'):
+    ''' Return the list of (start, end, flat) byte ranges of the records
+        in the key array of a JSON response, flat being False for records
+        which may hold objects, or None if the response is not a single
+        key object holding an array of objects.
+
+        The scan runs on a copy of the content where escape sequences are
+        blanked out, so that the quotes left delimit strings: a "}, {"
+        found after an even number of quotes is a record boundary.
+    '''
+    match = re.match(br'\s*\{\s*"' + re.escape(key.encode('ascii')) +
+                     br'"\s*:\s*\[\s*', content)
+    if match is None:
+        return None
+    cleaned = _ESCAPE_RE.sub(b'__', content)
+    tail = cleaned.rstrip()
+    if not tail.endswith(b'}'):
+        return None
+    tail = tail[:-1].rstrip()
+    if not tail.endswith(b']'):
+        return None
+    last = len(tail[:-1].rstrip())
+    start = match.end()
+    if last <= start:
+        return []
+    if cleaned[start:start + 1] != b'{' or cleaned[last - 1:last] != b'}':
+        return None
+
+    spans = []
+    quotes = 0
+    scanned = start
+    for boundary in _BOUNDARY_RE.finditer(cleaned, start, last):
+        quotes += cleaned.count(b'"', scanned, boundary.start())
+        scanned = boundary.start()
+        if quotes % 2:
+            continue
+        spans.append((start, boundary.start() + 1))
+        start = boundary.end() - 1
+    spans.append((start, last))
+    return [(start, end, _flat(cleaned, start, end)) for start, end in spans]
+
+def _flat(cleaned, start, end):
+    ''' Return True if a record holds no object, looking for a { outside
+        strings only when there is one at all.
+    '''
+    if cleaned.find(b'{', start + 1, end) == -1:
+        return True
+    outside = _CLEANED_STRING_RE.sub(b'', cleaned[start + 1:end])
+    return outside.find(b'{') == -1
+
+def lazy_records(content, key='records', fields=None):
+    ''' Return the records of a JSON response as a list of LazyRecord, or
+        None if the response can not be split, see split_records().
+    '''
+    spans = split_records(content, key)
+    if spans is None:
+        return None
+    if fields is not None:
+        fields = frozenset(fields)
+    return [LazyRecord(content, start, end, flat, fields)
+            for start, end, flat in spans]
+
+def _field_re(field):
+    pattern = _FIELD_RES.get(field)
+    if pattern is None:
+        pattern = _FIELD_RES[field] = re.compile(
+            br'"' + re.escape(field.encode('utf-8')) + br'"\s*:\s*')
+    return pattern
+
+class LazyRecord(Mapping):
+    ''' Read-only mapping on the byte range of a record in a response.
+        flat tells the record holds no objects, fields limits the record
+        to a set of field names.
+    '''
+    __slots__ = ('_content', '_start', '_end', '_flat', '_fields',
+                 '_values', '_record')
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, content, start, end, flat=True, fields=None):
+        self._content = content
+        self._start = start
+        self._end = end
+        self._flat = flat
+        self._fields = fields
+        self._values = {}
+        self._record = None
+
+    def _decode(self):
+        ''' Decode the whole record.
+        '''
+        if self._record is None:
+            record = json.loads(self._content[self._start:self._end]
+                                .decode('utf-8'))
+            if self._fields is not None:
+                record = dict((field, value) for field, value
+                              in record.items() if field in self._fields)
+            self._record = record
+            # Records may be shared between threads (request coalescing),
+            # _values stays a dict for readers that already passed the
+            # _record check
+            self._values = {}
+        return self._record
+
+    def __getitem__(self, field):
+        values, record = self._values, self._record
+        if record is not None:
+            return record[field]
+        if self._fields is not None and field not in self._fields:
+            raise KeyError(field)
+        if field in values:
+            return values[field]
+        # Objects may hold the same names, decode the whole record
+        if not self._flat:
+            return self._decode()[field]
+        content, start, end = self._content, self._start, self._end
+        match = _field_re(field).search(content, start, end)
+        if match is None:
+            raise KeyError(field)
+        value = _STRING_RE.match(content, match.end(), end)
+        if value is None:
+            return self._decode()[field]
+        value = json.loads(value.group().decode('utf-8'))
+        values[field] = value
+        return value
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __repr__(self):
+        return 'LazyRecord(%r)' % self._decode()
+
+    def decoded(self):
+        ''' Return True if the whole record has been decoded.
+        '''
+        return self._record is not None
@@ -0,0 +1,172 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Logging
+
+Process wide logging setup for the ServiceNowRac package. All of the
+package loggers propagate to the 'ServiceNowRac' logger which gets a
+single queue based handler. The queue is drained by a background listener
+thread which owns the real handler (local syslog by default), so emitting
+a log record never blocks the request path or a retry loop on socket I/O.
+
+The handler is attached once per process no matter how many SnowClient
+objects are created. After a fork the listener thread is restarted in
+the child.
+'''
+
+import os
+import atexit
+import logging
+import threading
+
+from logging.handlers import SysLogHandler
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    class QueueHandler(logging.Handler):
+        ''' Minimal QueueHandler for interpreters that lack one.
+        '''
+        def __init__(self, log_queue):
+            logging.Handler.__init__(self)
+            self.queue = log_queue
+
+        def prepare(self, record):
+            ''' Format the message and strip unpicklable arguments.
+            '''
+            msg = self.format(record)
+            record.msg = msg
+            record.args = None
+            record.exc_info = None
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except Exception:   # pylint: disable=broad-except
+                self.handleError(record)
+
+    class QueueListener(object):
+        ''' Minimal QueueListener for interpreters that lack one.
+        '''
+        _sentinel = None
+
+        def __init__(self, log_queue, *handlers):
+            self.queue = log_queue
+            self.handlers = handlers
+            self._thread = None
+
+        def start(self):
+            ''' Start the thread that drains the queue.
+            '''
+            self._thread = threading.Thread(target=self._monitor)
+            self._thread.daemon = True
+            self._thread.start()
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+        def stop(self):
+            ''' Flush the queue and stop the thread.
+            '''
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+LOGGER_NAME = 'ServiceNowRac'
+LOG_FORMAT = '%(levelname)s: %(message)s'
+
+_LOCK = threading.Lock()
+_STATE = {'pid': None, 'handler': None, 'listener': None, 'target': None}
+
+def _default_handler():
+    ''' Return the default handler which sends logging messages to the
+        local syslog server.
+    '''
+    handler = SysLogHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+def _stop_listener():
+    ''' Stop the listener thread and flush any pending messages.
+    '''
+    listener = _STATE['listener']
+    if listener is not None and _STATE['pid'] == os.getpid():
+        listener.stop()
+    _STATE['listener'] = None
+
+def setup_logging(handler=None):
+    ''' Attach the queue handler to the 'ServiceNowRac' logger and start
+        the listener thread. Only the first call in a process does any
+        work; later calls return the configured logger. Pass a handler
+        to send messages somewhere other than the local syslog server,
+        it must be given before the first SnowClient is created.
+
+        Returns
+            The 'ServiceNowRac' `logging.Logger` object
+    '''
+    log = logging.getLogger(LOGGER_NAME)
+    pid = os.getpid()
+    if _STATE['pid'] == pid:
+        return log
+
+    with _LOCK:
+        if _STATE['pid'] == pid:
+            return log
+
+        if _STATE['handler'] is not None:
+            # Forked child, the listener thread did not survive the fork
+            log.removeHandler(_STATE['handler'])
+        else:
+            atexit.register(_stop_listener)
+
+        target = handler or _STATE['target'] or _default_handler()
+        log_queue = queue.Queue(-1)
+        listener = QueueListener(log_queue, target)
+        queue_handler = QueueHandler(log_queue)
+        log.addHandler(queue_handler)
+        listener.start()
+
+        _STATE.update({'handler': queue_handler, 'listener': listener,
+                       'target': target})
+        _STATE['pid'] = pid
+    return log
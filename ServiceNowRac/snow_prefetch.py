@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Read-Ahead Prefetching
+
+prefetch() runs an iterator in a background thread and hands its items to
+the caller through a queue of depth items. While the caller processes an
+item the thread is already producing the next ones, so that for paged
+reads the download of the next pages overlaps with the processing of the
+current one and a scan takes about max(network, processing) instead of
+their sum. The bounded queue provides backpressure: the thread stops
+once depth items are waiting.
+
+SnowTable.iter_records(prefetch=N) reads N pages ahead this way.
+'''
+
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+_DONE = object()
+
+class _Error(object):
+    ''' An exception raised by the iterator, re-raised in the caller.
+    '''
+    def __init__(self, info):
+        self.info = info
+
+def prefetch(iterable, depth=2):
+    ''' Iterate over iterable with up to depth items produced ahead by a
+        background thread. Exceptions raised by the iterable are raised
+        by this iterator. Closing it stops the thread.
+    '''
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        ''' Queue an item unless the consumer went away. Returns False if
+            the producer should stop.
+        '''
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        ''' Run the iterable into the queue.
+        '''
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception:    # pylint: disable=broad-except
+            put(_Error(sys.exc_info()))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name='snow-prefetch')
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Error):
+                raise item.info[1]
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,231 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Table Reconciliation
+
+Find the records where a local copy of a table has drifted from the
+instance without downloading the table. The instance is asked for a
+summary of each bucket of records, on sys_id prefix, with the aggregate
+API: the record count and the sum of sys_mod_count, or the maximum of
+sys_updated_on (any other version field is summarized by its maximum).
+Only buckets whose summary differs from the local one are split, one hex
+digit at a time, down to a leaf small enough to compare record by record;
+only the leaves are downloaded, as sys_id and version pairs a page at a
+time past the row cap of the instance.
+
+The Table API backend is asked for sys_id and the version field only.
+JSONv2 returns every field of a record unless a UI view is requested, so
+with JSONv2 a view holding only sys_id and the version field must be
+passed as `view`, otherwise every leaf fetch would download whole
+records.
+
+    local = dict((rec['sys_id'], rec['sys_updated_on'])
+                 for rec in sync.records('incident'))
+    drift = SnowReconciler(SnowTable('incident', client),
+                           view='reconcile').reconcile(local)
+    stale = table.get_multiple(drift['changed'] + drift['missing'])
+'''
+
+import logging
+
+HEX_DIGITS = '0123456789abcdef'
+SYS_ID_LENGTH = 32
+
+def _split(pairs, depth):
+    ''' Split a dict of sys_id to version into sixteen buckets on the hex
+        digit at position depth.
+    '''
+    buckets = dict((digit, {}) for digit in HEX_DIGITS)
+    for sys_id, version in pairs.items():
+        bucket = buckets.get(sys_id[depth:depth + 1].lower())
+        if bucket is not None:
+            bucket[sys_id] = version
+    return buckets
+
+class SnowReconciler(object):
+    ''' Compare a local copy of a SnowTable with the instance.
+
+        Parameters:
+            table: SnowTable to compare with
+            query: encoded query string restricting the compared records
+            version_field: field used as the record version
+            view: UI view returning only sys_id and the version field,
+                  required with the JSONv2 backend
+            depth: number of hex digits in the top level buckets
+            leaf_size: largest bucket downloaded and compared record by
+                       record, larger differing buckets are split
+            row_cap: maximum number of records the instance returns for
+                     one request (glide.json.return_limit)
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self, table, query='', version_field='sys_updated_on',
+                 view=None, depth=1, leaf_size=64, row_cap=10000):
+        self.table = table
+        self.query = query
+        self.version_field = version_field
+        self.view = view
+        self.depth = depth
+        self.leaf_size = leaf_size
+        self.row_cap = row_cap
+        self.metric = 'sum' if version_field == 'sys_mod_count' else 'max'
+        self.requests = 0
+        self.log = logging.getLogger(__name__)
+        backend = getattr(table.conn, 'backend', None)
+        if view is None and not getattr(backend, 'server_fields', False):
+            raise ValueError('A view holding only sys_id and %s is required '
+                             'by the %s backend' %
+                             (version_field, getattr(backend, 'name', '')))
+
+    def _summary(self, pairs):
+        ''' Return the (count, value) summary of a dict of sys_id to
+            version, as the instance computes it.
+        '''
+        values = [version for version in pairs.values() if version != '']
+        if self.metric == 'max':
+            return (len(pairs), max(values) if values else '')
+        total = 0
+        for value in values:
+            try:
+                total += float(value)
+            except (TypeError, ValueError):
+                pass
+        return (len(pairs), total)
+
+    def _remote_summary(self, prefix):
+        ''' Return the (count, value) summary of the remote records whose
+            sys_id starts with prefix, or None if a request failed.
+        '''
+        self.requests += 1
+        groups = self.table.aggregate(
+            self._query(prefix), metrics={self.metric: [self.version_field]})
+        if not groups:
+            self.log.error('reconcile: %s: Summary of bucket %s failed',
+                           self.table.table, prefix)
+            return None
+        count = groups[0]['count']
+        value = groups[0].get(self.metric, {}).get(self.version_field, '')
+        if self.metric == 'sum':
+            value = float(value) if count and value != '' else 0
+        return (count, value)
+
+    def _query(self, prefix):
+        query = 'sys_idSTARTSWITH%s' % prefix
+        if self.query:
+            query = '%s^%s' % (self.query, query)
+        return query
+
+    def _remote(self, prefix):
+        ''' Return a dict of sys_id to version of the remote records whose
+            sys_id starts with prefix, or None if a request failed. A page
+            truncated by the row cap is continued after its last sys_id.
+        '''
+        pairs = {}
+        last = None
+        while True:
+            query = self._query(prefix)
+            if last is not None:
+                query = '%s^sys_id>%s' % (query, last)
+            self.requests += 1
+            records = self.table.get_records(
+                query + '^ORDERBYsys_id', view=self.view,
+                fields=['sys_id', self.version_field])
+            if records is None:
+                self.log.error('reconcile: %s: Fetch of bucket %s failed',
+                               self.table.table, prefix)
+                return None
+            pairs.update((rec['sys_id'], rec.get(self.version_field, ''))
+                         for rec in records)
+            if len(records) < self.row_cap:
+                return pairs
+            last = max(rec['sys_id'] for rec in records)
+
+    def _diff(self, prefix, local, drift):
+        ''' Compare the summaries of a bucket, recurse into a differing
+            one and add its drifted sys_ids to drift. Returns False if a
+            request failed.
+        '''
+        remote = self._remote_summary(prefix)
+        if remote is None:
+            return False
+        if remote == self._summary(local):
+            return True
+        drift['buckets'] += 1
+        if max(remote[0], len(local)) > self.leaf_size and \
+                len(prefix) < SYS_ID_LENGTH:
+            local_buckets = _split(local, len(prefix))
+            for digit in HEX_DIGITS:
+                if not self._diff(prefix + digit, local_buckets[digit],
+                                  drift):
+                    return False
+            return True
+        remote = self._remote(prefix)
+        if remote is None:
+            return False
+        for sys_id, version in remote.items():
+            if sys_id not in local:
+                drift['missing'].append(sys_id)
+            elif local[sys_id] != version:
+                drift['changed'].append(sys_id)
+        drift['extra'].extend(sys_id for sys_id in local
+                              if sys_id not in remote)
+        return True
+
+    def _prefixes(self, depth):
+        prefixes = ['']
+        for _ in range(depth):
+            prefixes = [prefix + digit for prefix in prefixes
+                        for digit in HEX_DIGITS]
+        return prefixes
+
+    def reconcile(self, local):
+        ''' Compare local, a dict of sys_id to version, with the instance.
+
+            Returns
+                dict with the lists of sys_ids 'missing' locally, 'extra'
+                locally and 'changed', the number of differing 'buckets'
+                and the number of 'requests' made, or None if a request
+                failed
+        '''
+        self.requests = 0
+        drift = {'missing': [], 'extra': [], 'changed': [], 'buckets': 0}
+        local_buckets = dict((prefix, {}) for prefix in
+                             self._prefixes(self.depth))
+        for sys_id, version in local.items():
+            bucket = local_buckets.get(sys_id[:self.depth].lower())
+            if bucket is not None:
+                bucket[sys_id] = version
+        for prefix in sorted(local_buckets):
+            if not self._diff(prefix, local_buckets[prefix], drift):
+                return None
+        for key in ('missing', 'extra', 'changed'):
+            drift[key].sort()
+        drift['requests'] = self.requests
+        return drift
@@ -0,0 +1,189 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Compact Records
+
+A record decoded from a response is a dict holding about 150 string keys,
+so large result sets spend most of their memory on repeated keys and dict
+overhead. SnowRecords stores a result set compactly:
+
+    o One RecordSchema per result set holds the interned field names and
+      their positions; it only grows when a record brings a new field
+    o Each row is a tuple of its values in schema order
+    o Short values (flags, states, empty strings, sys_ids of references)
+      are shared between rows
+
+SnowRecords is a sequence of SnowRecord, a read-only mapping view on one
+row, so record['number'], record.get() and dict(record) work as with the
+plain dicts. SnowTable.get_records() and iter_records() return them when
+called with compact=True.
+'''
+
+import sys
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+try:
+    _intern = sys.intern
+    _TEXT = str
+except AttributeError:
+    _intern = intern      # pylint: disable=undefined-variable
+    _TEXT = basestring    # pylint: disable=undefined-variable
+
+# Values up to this length are shared between the rows of a result set
+SHARED_VALUE_LENGTH = 40
+
+_MISSING = object()
+
+class RecordSchema(object):
+    ''' The field names of a result set and their positions.
+    '''
+    __slots__ = ('fields', 'index')
+
+    def __init__(self, fields=()):
+        self.fields = ()
+        self.index = {}
+        for field in fields:
+            self.position(field)
+
+    def position(self, field):
+        ''' Return the position of a field, adding it if it is new.
+        '''
+        pos = self.index.get(field)
+        if pos is None:
+            field = _intern(str(field))
+            pos = self.index[field] = len(self.fields)
+            self.fields += (field,)
+        return pos
+
+    def __len__(self):
+        return len(self.fields)
+
+class SnowRecord(Mapping):
+    ''' Read-only mapping view on one row of a SnowRecords.
+    '''
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema, values):
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, field):
+        pos = self._schema.index.get(field)
+        if pos is None or pos >= len(self._values) or \
+                self._values[pos] is _MISSING:
+            raise KeyError(field)
+        return self._values[pos]
+
+    def __iter__(self):
+        for field, value in zip(self._schema.fields, self._values):
+            if value is not _MISSING:
+                yield field
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not _MISSING)
+
+    def __repr__(self):
+        return 'SnowRecord(%r)' % dict(self)
+
+    def to_dict(self):
+        ''' Return the record as a plain dict.
+        '''
+        return dict(self)
+
+class SnowRecords(Sequence):
+    ''' Compact sequence of records sharing one RecordSchema.
+
+        Parameters:
+            records: iterable of dicts to add
+            schema: RecordSchema to share, e.g. across the pages of
+                iter_records
+    '''
+    def __init__(self, records=(), schema=None):
+        self.schema = schema if schema is not None else RecordSchema()
+        self._rows = []
+        self._shared = {}
+        self.extend(records)
+
+    def _share(self, value):
+        if isinstance(value, _TEXT) and len(value) <= SHARED_VALUE_LENGTH:
+            return self._shared.setdefault(value, value)
+        return value
+
+    def row(self, record):
+        ''' Return the values tuple of a dict in schema order.
+        '''
+        position = self.schema.position
+        values = {}
+        for field, value in record.items():
+            values[position(field)] = self._share(value)
+        return tuple(values.get(pos, _MISSING)
+                     for pos in range(max(values) + 1)) if values else ()
+
+    def append(self, record):
+        ''' Add a record, a dict or SnowRecord, and return its view.
+        '''
+        self._rows.append(self.row(record))
+        return SnowRecord(self.schema, self._rows[-1])
+
+    def extend(self, records):
+        ''' Add records.
+        '''
+        for record in records:
+            self._rows.append(self.row(record))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            records = SnowRecords(schema=self.schema)
+            records._rows = self._rows[index]   # pylint: disable=W0212
+            records._shared = self._shared      # pylint: disable=W0212
+            return records
+        return SnowRecord(self.schema, self._rows[index])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        schema = self.schema
+        for values in self._rows:
+            yield SnowRecord(schema, values)
+
+    def __repr__(self):
+        return '<SnowRecords %d records, %d fields>' % (len(self),
+                                                        len(self.schema))
+
+    def to_dicts(self):
+        ''' Return the records as a list of plain dicts.
+        '''
+        return [dict(record) for record in self]
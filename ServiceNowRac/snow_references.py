@@ -0,0 +1,157 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Reference Resolution
+
+Reference fields such as assigned_to, cmdb_ci or assignment_group hold
+the sys_id of a record in another table. Resolving them one record at a
+time costs a request per reference. SnowReferences collects the distinct
+sys_ids per target table, fetches them with bulk sys_idIN queries, keeps
+them in a cache and attaches the requested fields to the records using
+dot-walked names:
+
+    refs = SnowReferences(client)
+    refs.resolve_references(records, {
+        'assigned_to': ('sys_user', ['name', 'email']),
+        'assignment_group': ('sys_user_group', ['name']),
+    })
+    records[0]['assigned_to.email']
+
+A target may also be given as (table, fields, view) to fetch through a UI
+view holding only those fields. Only the requested fields are fetched;
+the targets on one table and view share a fetch of the union of their
+fields. Records are cached per table, view and field set, up to
+max_records records, the least recently used are evicted first.
+'''
+
+import logging
+
+from collections import OrderedDict
+
+from .snow_table import SnowTable
+
+class SnowReferences(object):
+    ''' Resolve reference fields in bulk with a cache shared by all calls.
+
+        Parameters:
+            client: SnowClient used to fetch the referenced records
+            chunk_size: number of sys_ids in one bulk fetch
+            max_records: number of referenced records kept in the cache
+    '''
+    def __init__(self, client, chunk_size=100, max_records=10000):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_records = max_records
+        # (table, view, fields, sys_id) to record, in least recently used
+        # order
+        self.cache = OrderedDict()
+        self.requests = 0
+        self.log = logging.getLogger(__name__)
+
+    def _remember(self, table, view, fields, records):
+        ''' Cache a dict of sys_id to record, evicting the least recently
+            used records past max_records.
+        '''
+        for sys_id, record in records.items():
+            self.cache.pop((table, view, fields, sys_id), None)
+            self.cache[(table, view, fields, sys_id)] = record
+        while len(self.cache) > self.max_records:
+            self.cache.popitem(last=False)
+
+    def _fetch(self, table, sys_ids, view, fields):
+        ''' Return a dict of sys_id to record of table, or None if the
+            record does not exist, with the given fields. Only the records
+            not in the cache are fetched. Returns None if a request
+            failed.
+        '''
+        found = {}
+        missing = []
+        for sys_id in sys_ids:
+            key = (table, view, fields, sys_id)
+            if key in self.cache:
+                found[sys_id] = self.cache.pop(key)
+                self.cache[key] = found[sys_id]
+            else:
+                missing.append(sys_id)
+        if not missing:
+            return found
+        self.requests += (len(missing) + self.chunk_size - 1) // \
+            self.chunk_size
+        records = SnowTable(table, self.client).get_multiple(
+            missing, self.chunk_size, view=view, fields=list(fields))
+        if records is None:
+            self.log.error('references: %s: Fetch of %d records failed',
+                           table, len(missing))
+            return None
+        # Remember references to records that do not exist
+        fetched = dict((sys_id, None) for sys_id in missing)
+        fetched.update((record['sys_id'], record) for record in records)
+        self._remember(table, view, fields, fetched)
+        found.update(fetched)
+        return found
+
+    def resolve_references(self, records, references):
+        ''' Attach the fields of referenced records to records, in place.
+            references maps a reference field to a tuple of the target
+            table and the list of fields to attach, and optionally a UI
+            view. The value of field f of the record referenced by r is
+            stored as 'r.f', or '' if the reference is empty or the
+            referenced record does not exist.
+
+            Returns
+                records, or None if a request failed
+        '''
+        targets = {}
+        for field, target in references.items():
+            table, view = target[0], target[2] if len(target) > 2 else None
+            sys_ids, fields = targets.setdefault((table, view),
+                                                 (set(), set(['sys_id'])))
+            sys_ids.update(record.get(field) for record in records
+                           if record.get(field))
+            fields.update(target[1])
+
+        resolved = {}
+        for (table, view), (sys_ids, fields) in targets.items():
+            found = self._fetch(table, sorted(sys_ids), view,
+                                tuple(sorted(fields)))
+            if found is None:
+                return None
+            resolved[(table, view)] = found
+
+        for field, target in references.items():
+            view = target[2] if len(target) > 2 else None
+            found = resolved[(target[0], view)]
+            for record in records:
+                referenced = found.get(record.get(field)) or {}
+                for ref_field in target[1]:
+                    record['%s.%s' % (field, ref_field)] = \
+                        referenced.get(ref_field, '')
+        return records
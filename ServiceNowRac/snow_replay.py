@@ -0,0 +1,239 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Traffic Replay
+
+Play a capture log written by snow_capture back through a SnowClient,
+keeping the original timing scaled by a speed factor (1x, 10x, 100x...).
+The target is normally a local stand-in server such as the emulator, so
+throughput and tail latency of a client version can be checked against
+a real production request mix.
+
+Only the first attempt of each captured request is replayed, the client
+performs its own retries. JSONv2 requests are replayed through the client,
+Table API requests by their method and URL. Requests captured without
+their body are replayed with a filler body of the captured size. Logs
+captured with sysparm=False are refused, their reads can not be replayed.
+
+The capture holds no record data, so a local emulator has to be seeded
+with the tables the requests read and write. Run from the command line
+against an emulator loaded from a fixture, a JSON object of table name to
+list of records (with the sys_ids the capture refers to):
+
+    python -m ServiceNowRac.snow_replay capture.log --speed 10 \
+        --fixture tables.json
+
+or against a stand-in server holding the data with --url.
+'''
+from __future__ import print_function
+
+import sys
+import json
+import time
+import argparse
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from urllib.parse import urljoin
+except ImportError:
+    from urlparse import urljoin
+
+from .snow_capture import load_capture
+from .snow_client import SnowClient
+from .snow_emulator import SnowEmulator, SnowEmulatorServer, \
+    lognormal_latency
+
+def _percentile(values, pct):
+    ''' Nearest rank percentile of a sorted list.
+    '''
+    if not values:
+        return 0.0
+    rank = int(round(pct / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+def _body(event):
+    ''' Return the request payload to replay for a POST event.
+    '''
+    if 'body' in event:
+        return json.loads(event['body'])
+    # {"replay": ""} is 14 bytes, pad it to the captured size
+    return {'replay': 'x' * max(0, event.get('out', 0) - 14)}
+
+def _issue(client, event):
+    ''' Issue one captured request through the client.
+    '''
+    sysparm = event['sysparm']
+    if 'path' in event:
+        url = event['path'] + ('?' + sysparm if sysparm else '')
+        kwargs = {'headers': {'Accept': 'application/json'},
+                  'timeout': client.timeout}
+        if event['method'] in ('POST', 'PUT', 'PATCH'):
+            kwargs['data'] = json.dumps(_body(event))
+        return getattr(client.session, event['method'].lower())(
+            urljoin(client.instance, url), **kwargs)
+    if event['method'] == 'GET':
+        return client.get(event['table'], sysparm)
+    return client.post(event['table'], sysparm, _body(event))
+
+def replay(events, client, speed=1.0, workers=16):
+    ''' Replay a list of captured events through a SnowClient. Each event
+        is issued at its captured offset divided by speed, by a pool of
+        worker threads. GET coalescing is turned off on the client for the
+        replay so that every captured request is sent.
+
+        Returns
+            dict report with the number of requests and errors, the
+            duration, throughput, latency percentiles and the worst
+            dispatch lag in seconds
+
+        Raises ValueError if the events were captured without sysparm.
+    '''
+    events = [event for event in events if event.get('attempt', 1) == 1]
+    if any('sysparm' not in event for event in events):
+        raise ValueError('Capture has no sysparm, start the capture with '
+                         'sysparm=True to replay it')
+    work = queue.Queue(maxsize=workers * 4)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        ''' Issue events until the None sentinel is received.
+        '''
+        while True:
+            event = work.get()
+            if event is None:
+                return
+            started = time.time()
+            try:
+                _issue(client, event)
+            except Exception as error:   # pylint: disable=broad-except
+                with lock:
+                    errors.append(type(error).__name__)
+            with lock:
+                latencies.append(time.time() - started)
+
+    coalesce, client.coalesce = client.coalesce, False
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    start = time.time()
+    lag = 0.0
+    origin = events[0]['t'] if events else 0.0
+    for event in events:
+        due = start + (event['t'] - origin) / speed
+        delay = due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            lag = max(lag, -delay)
+        work.put(event)
+    for _ in threads:
+        work.put(None)
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+    client.coalesce = coalesce
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'duration': round(duration, 6),
+        'throughput': round(len(latencies) / duration, 3) if duration else 0,
+        'latency': {
+            'mean': round(sum(latencies) / len(latencies), 6)
+                    if latencies else 0.0,
+            'p50': round(_percentile(latencies, 50), 6),
+            'p90': round(_percentile(latencies, 90), 6),
+            'p99': round(_percentile(latencies, 99), 6),
+            'max': round(latencies[-1], 6) if latencies else 0.0,
+        },
+        'lag': round(lag, 6),
+    }
+
+def main(argv=None):
+    ''' Replay a capture log against a server, or a local emulator if no
+        URL is given, and print the report as JSON.
+    '''
+    parser = argparse.ArgumentParser(description='Replay a ServiceNowRac '
+                                                 'capture log')
+    parser.add_argument('capture', help='capture log file')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='time scale factor, e.g. 1, 10 or 100')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--url', help='URL of the stand-in server, a local '
+                                      'emulator is started if not given')
+    parser.add_argument('--fixture', help='JSON file of table name to '
+                                          'records loaded into the local '
+                                          'emulator')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='median latency in seconds of the emulator')
+    args = parser.parse_args(argv)
+    if not args.url and not args.fixture:
+        parser.error('an empty emulator does not reflect the captured '
+                     'workload, give --fixture or --url')
+
+    events = load_capture(args.capture)
+    if any('sysparm' not in event for event in events):
+        print('%s: capture has no sysparm and can not be replayed' %
+              args.capture, file=sys.stderr)
+        return 1
+    client = SnowClient('replay', 'replay', 'replay')
+    server = None
+    if args.url:
+        client.instance = args.url.rstrip('/') + '/'
+    else:
+        latency = lognormal_latency(args.latency) if args.latency else 0
+        emulator = SnowEmulator(latency=latency)
+        with open(args.fixture) as fixture:
+            for table, records in json.load(fixture).items():
+                emulator.load(table, records)
+        server = SnowEmulatorServer(emulator).start()
+        server.attach(client)
+    try:
+        report = replay(events, client, speed=args.speed,
+                        workers=args.workers)
+    finally:
+        if server is not None:
+            server.stop()
+    print(json.dumps(report, indent=2, sort_keys=True))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Table Schema
+
+SnowSchema loads the dictionary metadata of a table, its fields with
+their internal type, maximum length, mandatory flag and choice values,
+including the fields inherited from its parent tables (incident extends
+task). The metadata is read from sys_db_object, sys_dictionary and
+sys_choice once, then kept in memory and, with cache_dir, in a JSON file
+per table, both for ttl seconds.
+
+    schema = SnowSchema(client, cache_dir='/var/cache/snow')
+    schema.coerce('incident', record)   # native Python values
+    schema.validate('incident', data)   # list of problems, empty if valid
+
+A SnowTable created with a schema validates insert and update payloads
+before sending them and returns None for invalid ones, logging the
+problems, so bad records do not cost a request.
+'''
+
+import datetime
+import json
+import logging
+import os
+import time
+
+from .snow_table import SnowTable
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+EPOCH = datetime.datetime(1970, 1, 1)
+
+INTEGER_TYPES = ('integer', 'longint')
+FLOAT_TYPES = ('decimal', 'float', 'currency', 'price', 'percent_complete')
+BOOLEAN_TYPES = ('boolean',)
+DATETIME_TYPES = ('glide_date_time', 'due_date', 'calendar_date_time')
+DATE_TYPES = ('glide_date',)
+DURATION_TYPES = ('glide_duration', 'timer')
+NATIVE_TYPES = INTEGER_TYPES + FLOAT_TYPES + BOOLEAN_TYPES + \
+    DATETIME_TYPES + DATE_TYPES + DURATION_TYPES
+
+def _parse(internal_type, value):
+    ''' Convert a ServiceNow string value to a Python value. Raises
+        ValueError if the value does not match the type.
+    '''
+    # pylint: disable=too-many-return-statements
+    if internal_type in INTEGER_TYPES:
+        return int(value)
+    if internal_type in FLOAT_TYPES:
+        return float(value)
+    if internal_type in BOOLEAN_TYPES:
+        if value not in ('true', 'false'):
+            raise ValueError('not a boolean: %s' % value)
+        return value == 'true'
+    if internal_type in DATETIME_TYPES:
+        return datetime.datetime.strptime(value, TIME_FORMAT)
+    if internal_type in DATE_TYPES:
+        return datetime.datetime.strptime(value, DATE_FORMAT).date()
+    if internal_type in DURATION_TYPES:
+        return datetime.datetime.strptime(value, TIME_FORMAT) - EPOCH
+    return value
+
+class SnowSchema(object):
+    ''' Cache of table dictionary metadata.
+
+        Parameters:
+            client: SnowClient used to read the metadata
+            cache_dir: directory of the on-disk cache, None to keep the
+                metadata in memory only
+            ttl: seconds before cached metadata is loaded again
+            clock: function returning the current time
+    '''
+    def __init__(self, client, cache_dir=None, ttl=86400, clock=time.time):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.clock = clock
+        self.cache = {}
+        self.log = logging.getLogger(__name__)
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _path(self, table):
+        return os.path.join(self.cache_dir, '%s.json' % table)
+
+    def _hierarchy(self, table):
+        ''' Return the table and its parents, or None if a request failed.
+        '''
+        tables = SnowTable('sys_db_object', self.client)
+        names = []
+        query = 'name=%s' % table
+        while query:
+            records = tables.get_records(query)
+            if records is None:
+                return None
+            if not records:
+                break
+            names.append(records[0]['name'])
+            parent = records[0].get('super_class')
+            if isinstance(parent, dict):
+                parent = parent.get('value')
+            query = 'sys_id=%s' % parent if parent else None
+        return names or [table]
+
+    def load(self, table):
+        ''' Read the metadata of a table from the instance. Returns the
+            dict of field name to metadata, or None if a request failed.
+        '''
+        names = self._hierarchy(table)
+        if names is None:
+            return None
+        query = 'nameIN%s' % ','.join(names)
+        elements = SnowTable('sys_dictionary', self.client).get_records(
+            query + '^elementISNOTEMPTY')
+        choices = SnowTable('sys_choice', self.client).get_records(
+            query + '^inactive=false')
+        if elements is None or choices is None:
+            return None
+
+        # Fields of the table override the ones of its parents
+        depth = dict((name, index) for index, name in enumerate(names))
+        fields = {}
+        for element in sorted(elements, reverse=True,
+                              key=lambda rec: depth.get(rec.get('name'), 0)):
+            fields[element['element']] = {
+                'type': element.get('internal_type') or 'string',
+                'max_length': int(element.get('max_length') or 0),
+                'mandatory': element.get('mandatory') == 'true',
+                'default': bool(element.get('default_value')),
+                'choices': None,
+            }
+        for choice in choices:
+            field = fields.get(choice.get('element'))
+            if field is not None:
+                if field['choices'] is None:
+                    field['choices'] = []
+                if choice['value'] not in field['choices']:
+                    field['choices'].append(choice['value'])
+        return fields
+
+    def fields(self, table):
+        ''' Return the dict of field name to metadata of a table, each
+            holding type, max_length, mandatory, default (True if the field
+            has a default value) and choices (None or the list of values),
+            from the cache when it is recent enough. Returns None if the
+            metadata can not be loaded.
+        '''
+        now = self.clock()
+        cached = self.cache.get(table)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+        if self.cache_dir is not None:
+            try:
+                with open(self._path(table)) as cache_file:
+                    loaded = json.load(cache_file)
+                if now - loaded['loaded'] < self.ttl:
+                    self.cache[table] = (loaded['loaded'], loaded['fields'])
+                    return loaded['fields']
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+
+        fields = self.load(table)
+        if fields is None:
+            self.log.error('schema: %s: Failed to load the dictionary', table)
+            return None
+        self.cache[table] = (now, fields)
+        if self.cache_dir is not None:
+            # Write then rename so readers never see a partial file
+            path = self._path(table)
+            with open(path + '.tmp', 'w') as cache_file:
+                json.dump({'loaded': now, 'fields': fields}, cache_file)
+            os.rename(path + '.tmp', path)
+        return fields
+
+    def invalidate(self, table=None):
+        ''' Drop the cached metadata of a table, or of every table.
+        '''
+        tables = [table] if table is not None else list(self.cache)
+        for name in tables:
+            self.cache.pop(name, None)
+            if self.cache_dir is not None:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def coerce(self, table, record):
+        ''' Return a copy of a record with its values converted to Python
+            types: int, float, bool, datetime, date and timedelta. Empty
+            values of those types become None, values that do not parse
+            are left as they are.
+        '''
+        fields = self.fields(table) or {}
+        coerced = {}
+        for name, value in record.items():
+            field = fields.get(name)
+            if field is None or not isinstance(value, (str, type(u''))):
+                coerced[name] = value
+                continue
+            if value == '' and field['type'] in NATIVE_TYPES:
+                coerced[name] = None
+                continue
+            try:
+                coerced[name] = _parse(field['type'], value)
+            except ValueError:
+                coerced[name] = value
+        return coerced
+
+    def validate(self, table, data, insert=False):
+        ''' Check a write payload against the metadata of a table. Return
+            the list of problems found, empty if the payload is valid.
+            Mandatory fields without a default value are only checked
+            when insert is set.
+            Returns None if the metadata can not be loaded.
+        '''
+        fields = self.fields(table)
+        if fields is None:
+            return None
+        problems = []
+        for name, value in sorted(data.items()):
+            field = fields.get(name)
+            if field is None:
+                problems.append('%s: unknown field' % name)
+                continue
+            if isinstance(value, bool):
+                value = 'true' if value else 'false'
+            value = u'%s' % value
+            if field['max_length'] and len(value) > field['max_length']:
+                problems.append('%s: longer than %d' %
+                                (name, field['max_length']))
+            if value == '':
+                continue
+            if field['choices'] and value not in field['choices']:
+                problems.append('%s: %s is not a choice' % (name, value))
+            try:
+                _parse(field['type'], value)
+            except ValueError:
+                problems.append('%s: %s is not a valid %s' %
+                                (name, value, field['type']))
+        if insert:
+            for name, field in sorted(fields.items()):
+                if field['mandatory'] and not field['default'] and \
+                        data.get(name) in (None, ''):
+                    problems.append('%s: mandatory' % name)
+        return problems
@@ -40,15 +40,27 @@ retry in the case of the following errors:
     o requests Exceptions
         - Timeout
         - ConnectionError
+
+Traffic can be captured to a log file with start_capture(), see
+snow_capture. GET responses can be kept in a persistent cache shared by
+processes with start_cache(), see snow_cache. The transport carrying
+the requests, for instance HTTP/2, is set with set_transport(), see
+snow_transport.
 '''
 
 import time
 import logging
 
-from requests import Session
+from requests import Response, Session
 from requests.exceptions import RequestException, ConnectionError, HTTPError, \
     Timeout
 
+from requests.structures import CaseInsensitiveDict
+
+from .snow_cache import ResponseCache
+from .snow_capture import TrafficCapture
+from .snow_transport import get_transport
+
 class MaxRetryError(RequestException):
     '''An Max Retry error occurred.'''
 
@@ -69,6 +81,103 @@ class SnowSession(Session):
         # Define class level logger
         self.log = logging.getLogger(__name__)
 
+        # TrafficCapture object when capturing, see start_capture()
+        self.capture = None
+
+        # ResponseCache object when caching, see start_cache()
+        self.cache = None
+
+    def start_capture(self, filename, bodies=False, sysparm=True):
+        ''' Start writing a log of every request made by this session to
+            filename. Request bodies are only logged if bodies is True and
+            the sysparm strings are left out if sysparm is False.
+
+            Returns
+                `snow_capture.TrafficCapture` object
+        '''
+        self.stop_capture()
+        self.capture = TrafficCapture(filename, bodies=bodies,
+                                      sysparm=sysparm)
+        return self.capture
+
+    def stop_capture(self):
+        ''' Stop capturing requests and close the log.
+        '''
+        capture, self.capture = self.capture, None
+        if capture is not None:
+            capture.close()
+
+    def set_transport(self, transport):
+        ''' Send every request of this session through a transport, an
+            adapter object or a name such as 'http2'. Retries are still
+            handled by this session.
+
+            Returns
+                the transport adapter
+        '''
+        adapter = get_transport(transport)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        return adapter
+
+    # pylint: disable=too-many-arguments
+    def start_cache(self, path, ttl=300, table_ttl=None,
+                    max_size=256 * 1024 * 1024):
+        ''' Start keeping the successful GET responses in the SQLite
+            database path, for ttl seconds or the time given for their
+            table in table_ttl, up to max_size bytes. Writes made through
+            the session invalidate the responses of their table.
+
+            Returns
+                `snow_cache.ResponseCache` object
+        '''
+        self.stop_cache()
+        self.cache = ResponseCache(path, ttl=ttl, table_ttl=table_ttl,
+                                   max_size=max_size)
+        return self.cache
+
+    def stop_cache(self):
+        ''' Stop caching GET responses. The database is kept.
+        '''
+        cache, self.cache = self.cache, None
+        if cache is not None:
+            cache.close()
+
+    @staticmethod
+    def _cached(cache, url, user):
+        ''' Return a Response built from the cache, or None.
+        '''
+        cached = cache.get(url, user)
+        if cached is None:
+            return None
+        response = Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict(cached[0])
+        response._content = cached[1]    # pylint: disable=protected-access
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+    def _send(self, method, req_type, url, kwargs, attempt):
+        ''' Issue a single request attempt, logging it to the capture if
+            one is active.
+        '''
+        capture = self.capture
+        if capture is None:
+            return method(url, **kwargs)
+
+        body = kwargs.get('data')
+        started = time.time()
+        try:
+            response = method(url, **kwargs)
+        except RequestException as error:
+            capture.record(req_type, url, body, type(error).__name__,
+                           started, time.time() - started, 0, attempt)
+            raise
+        capture.record(req_type, url, body, response.status_code, started,
+                       time.time() - started, len(response.content), attempt)
+        return response
+
     def _make_request(self, req_type, url, **kwargs):
         ''' _make_request wrapper function used to perform
             a GET/PUT/POST/DELETE/etc request and handle select
@@ -90,9 +199,11 @@ class SnowSession(Session):
         while retry_num < max_retries:
             retry_num += 1
             try:
-                response = method(url, **kwargs)
+                response = self._send(method, req_type, url, kwargs,
+                                      retry_num)
                 response.raise_for_status()
-                if response.status_code == 200:
+                # Table API writes answer 201 Created or 204 No Content
+                if 200 <= response.status_code < 300:
                     return response
             except HTTPError as error:
                 if error.response.status_code in [502, 503, 504]:
@@ -128,26 +239,46 @@ class SnowSession(Session):
         return self._make_request('HEAD', url, **kwargs)
 
     def get(self, url, **kwargs):
-        ''' Over-ride the get() method
+        ''' Over-ride the get() method, answering from the cache if one
+            is active
+        '''
+        cache = self.cache
+        if cache is None:
+            return self._make_request('GET', url, **kwargs)
+        user = self.auth[0] if isinstance(self.auth, tuple) else None
+        response = self._cached(cache, url, user)
+        if response is None:
+            response = self._make_request('GET', url, **kwargs)
+            cache.put(url, response, user)
+        return response
+
+    def _write(self, req_type, url, kwargs):
+        ''' Make a write request, invalidating the cached responses of its
+            table if a cache is active.
         '''
-        return self._make_request('GET', url, **kwargs)
+        try:
+            return self._make_request(req_type, url, **kwargs)
+        finally:
+            cache = self.cache
+            if cache is not None:
+                cache.invalidate_url(url)
 
     def post(self, url, **kwargs):
         ''' Over-ride the post() method
         '''
-        return self._make_request('POST', url, **kwargs)
+        return self._write('POST', url, kwargs)
 
     def put(self, url, **kwargs):
         ''' Over-ride the put() method
         '''
-        return self._make_request('PUT', url, **kwargs)
+        return self._write('PUT', url, kwargs)
 
     def patch(self, url, **kwargs):
         ''' Over-ride the patch() method
         '''
-        return self._make_request('PATCH', url, **kwargs)
+        return self._write('PATCH', url, kwargs)
 
     def delete(self, url, **kwargs):
         ''' Over-ride the delete() method
         '''
-        return self._make_request('DELETE', url, **kwargs)
+        return self._write('DELETE', url, kwargs)
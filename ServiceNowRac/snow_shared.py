@@ -0,0 +1,297 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Cross-Process Record Cache
+
+SharedRecordCache is a record cache in a memory-mapped file that every
+process of a host can open, so that in a pre-fork worker pool a record
+fetched by one worker is a hit for all the others:
+
+    cache = SharedRecordCache('/dev/shm/snow-records', ttl=300)
+    incidents = SnowTable('incident', client, cache=cache)
+    incidents.get(sys_id)              # cached for every worker
+    incidents.get_multiple(sys_ids)    # only the misses are fetched
+
+The file is a set-associative hash table: a key (table and sys_id) hashes
+to a bucket of `ways` fixed size slots. A slot holds the key, the expiry
+and last access times and the record as JSON. A full bucket evicts its
+least recently used slot, expired slots are reused first. Records larger
+than a slot are not cached and are counted in `rejected`. The default
+16 KB slots hold records of a few hundred fields; the file is created
+sparse, so memory is only used by the slots written to.
+
+Every process must open the file with the same geometry (buckets, ways
+and slot_size). A file of another geometry is refused with ValueError
+rather than reset under the processes that have it mapped.
+
+Each bucket is protected by an fcntl byte range lock on its slots, shared
+for reads and exclusive for writes, so processes only contend on the
+same bucket; a striped threading lock does the same between the threads
+of a process. fcntl makes this module POSIX only.
+
+Entries of a table can be stale up to the TTL: SnowTable refreshes the
+records returned by update() and drops deleted ones, other processes and
+writes through other paths are only seen once the entry expires.
+'''
+
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b'SNOWSHM1'
+HEADER = struct.Struct('<8sIII')
+# Key, expiry, last access, length of the JSON record
+SLOT_HEADER = struct.Struct('<96sddI')
+KEY_SIZE = 96
+THREAD_LOCKS = 64
+
+class SharedRecordCache(object):
+    ''' Record cache shared by processes through a memory-mapped file.
+
+        Parameters:
+            path: cache file, created if missing or empty
+            buckets: number of buckets
+            ways: number of slots in a bucket
+            slot_size: bytes of a slot, records must fit in slot_size - 116
+            ttl: seconds a record stays in the cache
+            clock: function returning the current time
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self, path, buckets=1024, ways=8, slot_size=16384,
+                 ttl=300, clock=time.time):
+        self.path = path
+        self.buckets = buckets
+        self.ways = ways
+        self.slot_size = slot_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # Records too large for a slot
+        self.rejected = 0
+        self._locks = [threading.Lock() for _ in range(THREAD_LOCKS)]
+        self._size = HEADER.size + buckets * ways * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._init()
+        except ValueError:
+            os.close(self._fd)
+            raise
+        self._map = mmap.mmap(self._fd, self._size)
+
+    def _init(self):
+        ''' Lay out an empty file. Raises ValueError if the file holds a
+            cache of another geometry, or something else.
+        '''
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            expected = HEADER.pack(MAGIC, self.buckets, self.ways,
+                                   self.slot_size)
+            size = os.fstat(self._fd).st_size
+            if not size:
+                os.ftruncate(self._fd, self._size)
+                os.write(self._fd, expected)
+                return
+            header = os.read(self._fd, HEADER.size)
+            if header != expected or size != self._size:
+                raise ValueError('%s is not a record cache of %d buckets '
+                                 'of %d slots of %d bytes' %
+                                 (self.path, self.buckets, self.ways,
+                                  self.slot_size))
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 0, 0, os.SEEK_SET)
+
+    @staticmethod
+    def _key(table, sys_id):
+        key = ('%s:%s' % (table, sys_id)).encode('utf-8')
+        return key if len(key) <= KEY_SIZE else None
+
+    def _bucket(self, key):
+        bucket = (zlib.crc32(key) & 0xffffffff) % self.buckets
+        return bucket, HEADER.size + bucket * self.ways * self.slot_size
+
+    def _lock(self, bucket, exclusive):
+        ''' Lock a bucket for the threads of this process and for the
+            other processes. Returns the function releasing the locks.
+        '''
+        thread_lock = self._locks[bucket % THREAD_LOCKS]
+        thread_lock.acquire()
+        length = self.ways * self.slot_size
+        start = HEADER.size + bucket * length
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else
+                        fcntl.LOCK_SH, length, start, os.SEEK_SET)
+        except Exception:
+            thread_lock.release()
+            raise
+
+        def release():
+            ''' Release the bucket.
+            '''
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start, os.SEEK_SET)
+            thread_lock.release()
+        return release
+
+    def _find(self, key, base):
+        ''' Return the offset of the slot holding key, or None.
+        '''
+        padded = key.ljust(KEY_SIZE, b'\0')
+        for way in range(self.ways):
+            offset = base + way * self.slot_size
+            if self._map[offset:offset + KEY_SIZE] == padded:
+                return offset
+        return None
+
+    def get(self, table, sys_id):
+        ''' Return a cached record, or None.
+        '''
+        key = self._key(table, sys_id)
+        if key is None:
+            return None
+        bucket, base = self._bucket(key)
+        release = self._lock(bucket, False)
+        try:
+            offset = self._find(key, base)
+            record = None
+            now = self.clock()
+            if offset is not None:
+                _, expires, _, length = SLOT_HEADER.unpack_from(self._map,
+                                                                offset)
+                if expires > now:
+                    start = offset + SLOT_HEADER.size
+                    record = json.loads(self._map[start:start + length]
+                                        .decode('utf-8'))
+                    # Readers only touch the access time, a lost update
+                    # only changes which slot is evicted next
+                    struct.pack_into('<d', self._map, offset + KEY_SIZE + 8,
+                                     now)
+        finally:
+            release()
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def put(self, table, record):
+        ''' Store a record by its sys_id. Returns False if the record does
+            not fit in a slot.
+        '''
+        key = self._key(table, record.get('sys_id', ''))
+        data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        if key is None:
+            return False
+        if SLOT_HEADER.size + len(data) > self.slot_size:
+            self.rejected += 1
+            return False
+        bucket, base = self._bucket(key)
+        release = self._lock(bucket, True)
+        try:
+            now = self.clock()
+            offset = self._find(key, base)
+            if offset is None:
+                # An empty or expired slot, else the least recently used
+                victims = []
+                for way in range(self.ways):
+                    slot = base + way * self.slot_size
+                    _, expires, accessed, length = SLOT_HEADER.unpack_from(
+                        self._map, slot)
+                    if not length or expires <= now:
+                        offset = slot
+                        break
+                    victims.append((accessed, slot))
+                if offset is None:
+                    offset = min(victims)[1]
+            SLOT_HEADER.pack_into(self._map, offset, key, now + self.ttl,
+                                  now, len(data))
+            start = offset + SLOT_HEADER.size
+            self._map[start:start + len(data)] = data
+        finally:
+            release()
+        return True
+
+    def delete(self, table, sys_id):
+        ''' Drop a record from the cache.
+        '''
+        key = self._key(table, sys_id)
+        if key is None:
+            return
+        bucket, base = self._bucket(key)
+        release = self._lock(bucket, True)
+        try:
+            offset = self._find(key, base)
+            if offset is not None:
+                SLOT_HEADER.pack_into(self._map, offset, b'', 0, 0, 0)
+        finally:
+            release()
+
+    def get_many(self, table, sys_ids):
+        ''' Return a dict of sys_id to the cached records.
+        '''
+        found = {}
+        for sys_id in sys_ids:
+            record = self.get(table, sys_id)
+            if record is not None:
+                found[sys_id] = record
+        return found
+
+    def put_many(self, table, records):
+        ''' Store records by their sys_id.
+        '''
+        for record in records:
+            self.put(table, record)
+
+    def clear(self):
+        ''' Drop every record.
+        '''
+        for bucket in range(self.buckets):
+            release = self._lock(bucket, True)
+            try:
+                base = HEADER.size + bucket * self.ways * self.slot_size
+                for way in range(self.ways):
+                    SLOT_HEADER.pack_into(self._map,
+                                          base + way * self.slot_size,
+                                          b'', 0, 0, 0)
+            finally:
+                release()
+
+    def close(self):
+        ''' Unmap and close the file.
+        '''
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = None
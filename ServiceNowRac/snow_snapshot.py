@@ -0,0 +1,272 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Table Snapshots
+
+A snapshot is a table saved as an NDJSON file, one record per line, with
+a sidecar index file mapping sys_ids to the byte range of their line:
+
+    table.snapshot('incident.ndjson', 'active=true')
+
+    with SnowSnapshot('incident.ndjson') as snapshot:
+        record = snapshot.get(sys_id)
+        for line in snapshot.iter_raw():
+            ...
+
+The index (<path>.idx) is an open addressing hash table of fixed size
+slots, so SnowSnapshot finds a record with one or a few probes in the
+memory-mapped index and decodes only its line from the memory-mapped
+data file. iter_raw() yields memoryview slices of the mapping, without
+copying the lines; Python 2 can not take a memoryview of an mmap, there
+the lines are byte string copies.
+
+The writer streams to <path>.tmp and <path>.idx.tmp and renames them over
+the snapshot only once it is complete, so a failed write leaves any
+previous snapshot in place. The two renames are not atomic together, so
+the index records the size and CRC-32 of its data file: a reader opening
+the snapshot between them finds a size that does not match and gets a
+ValueError, and can open it again. verify=True also checks the CRC-32,
+which reads the whole data file.
+
+Index layout, little endian: the 8 byte magic, the number of slots and
+the number of records (8 bytes each), records without a sys_id
+included, the size (8 bytes) and CRC-32 (4 bytes) of the data file, then
+the slots of a 32 byte sys_id, an 8 byte offset and a 4 byte length. A
+slot of length 0 is free.
+'''
+
+import json
+import mmap
+import os
+import struct
+import zlib
+
+INDEX_MAGIC = b'SNOWIDX2'
+HEADER = struct.Struct('<8sQQQI')
+SLOT = struct.Struct('<32sQI')
+KEY_SIZE = 32
+
+def _slot(key, slots):
+    return (zlib.crc32(key) & 0xffffffff) % slots
+
+def _key(sys_id):
+    key = sys_id.encode('ascii')
+    if len(key) > KEY_SIZE:
+        raise ValueError('sys_id longer than %d: %s' % (KEY_SIZE, sys_id))
+    return key
+
+def _view(data):
+    ''' Return an object to slice the lines of a mapping from, without
+        copying them where memoryview supports mmap.
+    '''
+    try:
+        return memoryview(data)
+    except TypeError:
+        return data
+
+class SnowSnapshotWriter(object):
+    ''' Stream records to a snapshot file. The index is written and the
+        snapshot replaced on close, abort() discards it. Leaving a with
+        block on an exception aborts.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path + '.tmp', 'wb')
+        self._offset = 0
+        self._crc = 0
+        self._entries = []
+
+    def write(self, record):
+        ''' Append a record. Records without a sys_id are not indexed.
+        '''
+        key = _key(record['sys_id']) if record.get('sys_id') else None
+        line = json.dumps(dict(record), separators=(',', ':'),
+                          sort_keys=True).encode('utf-8')
+        self._file.write(line + b'\n')
+        self._crc = zlib.crc32(line + b'\n', self._crc)
+        if key is not None:
+            self._entries.append((key, self._offset, len(line)))
+        self._offset += len(line) + 1
+        self.count += 1
+
+    def abort(self):
+        ''' Close and remove the temporary files, keeping the previous
+            snapshot if any.
+        '''
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self._entries = []
+        for path in (self.path + '.tmp', self.path + '.idx.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        ''' Close the data file, write the index and move both over the
+            snapshot.
+        '''
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+
+        # At most half full so probe sequences stay short
+        slots = max(2 * len(self._entries), 1)
+        table = bytearray(HEADER.size + slots * SLOT.size)
+        HEADER.pack_into(table, 0, INDEX_MAGIC, slots, self.count,
+                         self._offset, self._crc & 0xffffffff)
+        for key, offset, length in self._entries:
+            slot = _slot(key, slots)
+            while SLOT.unpack_from(table, HEADER.size +
+                                   slot * SLOT.size)[2]:
+                slot = (slot + 1) % slots
+            SLOT.pack_into(table, HEADER.size + slot * SLOT.size, key,
+                           offset, length)
+        self._entries = []
+        with open(self.path + '.idx.tmp', 'wb') as index:
+            index.write(table)
+        os.rename(self.path + '.tmp', self.path)
+        os.rename(self.path + '.idx.tmp', self.path + '.idx')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class SnowSnapshot(object):
+    ''' Read a snapshot through memory maps of its data and index files.
+        Raises ValueError if the index is not the one of the data file,
+        checking its CRC-32 too if verify is set.
+    '''
+    def __init__(self, path, verify=False):
+        self.path = path
+        self._data = self._map(path)
+        self._index = self._map(path + '.idx')
+        try:
+            magic, self.slots, self.count, size, crc = HEADER.unpack_from(
+                self._index, 0)
+            if magic != INDEX_MAGIC:
+                raise ValueError('%s.idx is not a snapshot index' % path)
+            if size != len(self._data) or \
+                    (verify and zlib.crc32(self._data) & 0xffffffff != crc):
+                raise ValueError('%s.idx does not match %s, the snapshot '
+                                 'may be being replaced' % (path, path))
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+    @staticmethod
+    def _map(path):
+        with open(path, 'rb') as mapped:
+            if not os.fstat(mapped.fileno()).st_size:
+                return b''
+            return mmap.mmap(mapped.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find(self, sys_id):
+        ''' Return the (offset, length) of the line of a record, or None.
+        '''
+        key = _key(sys_id)
+        padded = key.ljust(KEY_SIZE, b'\0')
+        slot = _slot(key, self.slots)
+        for _ in range(self.slots):
+            found, offset, length = SLOT.unpack_from(
+                self._index, HEADER.size + slot * SLOT.size)
+            if not length:
+                return None
+            if found == padded:
+                return offset, length
+            slot = (slot + 1) % self.slots
+        return None
+
+    def raw(self, sys_id):
+        ''' Return the JSON line of a record as a memoryview, or None.
+        '''
+        found = self.find(sys_id)
+        if found is None:
+            return None
+        offset, length = found
+        return _view(self._data)[offset:offset + length]
+
+    def get(self, sys_id):
+        ''' Return a record by sys_id, or None.
+        '''
+        line = self.raw(sys_id)
+        if line is None:
+            return None
+        return json.loads(bytes(line).decode('utf-8'))
+
+    def __contains__(self, sys_id):
+        return self.find(sys_id) is not None
+
+    def __len__(self):
+        return self.count
+
+    def iter_raw(self):
+        ''' Iterate over the JSON lines of the records as memoryview
+            slices of the mapping.
+        '''
+        data = self._data
+        view = _view(data)
+        start = 0
+        while start < len(data):
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+            yield view[start:end]
+            start = end + 1
+
+    def __iter__(self):
+        for line in self.iter_raw():
+            yield json.loads(bytes(line).decode('utf-8'))
+
+    def close(self):
+        ''' Unmap the files. A mapping still referenced by a memoryview is
+            unmapped when the last view is released.
+        '''
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass
+        self._data = self._index = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,168 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Memory-Bounded Results
+
+SpillRecords holds the records of a large read within a memory budget.
+Records are kept in memory until their estimated resident size, the
+sys.getsizeof sum of the dicts, keys and values, reaches max_memory
+bytes. That is several times their JSON size for records of short
+strings. Further records are appended as NDJSON lines to an anonymous
+temporary file, deleted when the container is closed or collected. The
+container supports len(), iteration and indexed access; records read
+back from the file are new dicts.
+
+    with table.get_records_bounded('active=true',
+                                   max_memory=256 * 1024 * 1024) as records:
+        for record in records:
+            ...
+'''
+
+import sys
+import json
+import tempfile
+
+from array import array
+
+try:
+    array('q')
+    OFFSET_TYPE = 'q'
+except ValueError:
+    # Python 2 has no 'q', 'l' is 64 bit on LP64 platforms
+    OFFSET_TYPE = 'l'
+
+def record_size(value):
+    ''' Return the estimated memory size of a decoded JSON value in bytes,
+        counting the containers and everything they hold. Strings shared
+        between records are counted for every record.
+    '''
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + record_size(item)
+    elif isinstance(value, list):
+        for item in value:
+            size += record_size(item)
+    return size
+
+class SpillRecords(object):
+    ''' Sequence of records spilling to disk past max_memory bytes.
+
+        Parameters:
+            max_memory: estimated bytes of records kept in memory, see
+                        record_size
+            directory: directory of the spill file, the default temporary
+                directory if None
+    '''
+    def __init__(self, max_memory=64 * 1024 * 1024, directory=None):
+        self.max_memory = max_memory
+        self.directory = directory
+        self.memory = 0
+        self._records = []
+        self._file = None
+        # Offsets of the spilled lines
+        self._offsets = array(OFFSET_TYPE)
+        self._end = 0
+
+    @property
+    def spilled(self):
+        ''' Number of records written to disk.
+        '''
+        return len(self._offsets)
+
+    def append(self, record):
+        ''' Add a record.
+        '''
+        if not self._offsets:
+            size = record_size(record)
+            if self.memory + size <= self.max_memory:
+                self._records.append(record)
+                self.memory += size
+                return
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.directory,
+                                                prefix='snow-spill-')
+        self._file.seek(self._end)
+        self._file.write(line + b'\n')
+        self._offsets.append(self._end)
+        self._end += len(line) + 1
+
+    def extend(self, records):
+        ''' Add records.
+        '''
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self._records) + len(self._offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('SpillRecords index out of range')
+        if index < len(self._records):
+            return self._records[index]
+        self._file.flush()
+        self._file.seek(self._offsets[index - len(self._records)])
+        return json.loads(self._file.readline().decode('utf-8'))
+
+    def __iter__(self):
+        for record in self._records:
+            yield record
+        if self._file is None:
+            return
+        self._file.flush()
+        position = 0
+        for _ in range(len(self._offsets)):
+            # Appends may move the file position between two records
+            self._file.seek(position)
+            line = self._file.readline()
+            position += len(line)
+            yield json.loads(line.decode('utf-8'))
+
+    def close(self):
+        ''' Drop the records and delete the spill file.
+        '''
+        self._records = []
+        self._offsets = array(OFFSET_TYPE)
+        self._end = 0
+        self.memory = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
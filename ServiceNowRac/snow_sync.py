@@ -0,0 +1,250 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Delta Sync
+
+Keep a local SQLite mirror of selected tables and fields. Each sync only
+fetches records whose sys_updated_on is at or after the stored watermark
+of the table, so the load on the instance follows the change rate rather
+than the table size. Deleted records, and records that no longer match
+the table query, are removed by a periodic reconciliation against the
+sys_ids returned by getKeys.
+
+    sync = SnowSync('mirror.db')
+    sync.add_table(SnowTable('incident', client),
+                   ['number', 'state', 'assigned_to'], query='active=true')
+    sync.sync()
+    rows = sync.records('incident', 'state = ?', ('2',))
+
+Every mirrored table has the columns sys_id, sys_updated_on and the
+requested fields, all stored as text as returned by the instance.
+'''
+
+import time
+import logging
+import sqlite3
+
+META_TABLE = '_snow_sync'
+FIXED_FIELDS = ('sys_id', 'sys_updated_on')
+
+def _quote(name):
+    ''' Quote an SQLite identifier.
+    '''
+    return '"%s"' % name.replace('"', '""')
+
+class SnowSync(object):
+    ''' Mirror ServiceNow tables into an SQLite database.
+
+        Parameters:
+            database: path of the SQLite database, or ':memory:'
+            reconcile_interval: seconds between deletion reconciliations
+                                done as part of sync(), None to disable
+            row_cap: maximum number of records the instance returns for
+                     one request (glide.json.return_limit)
+            chunk_size: number of sys_ids per request when reading the
+                        records past the row cap
+    '''
+    def __init__(self, database, reconcile_interval=3600, row_cap=10000,
+                 chunk_size=100):
+        self.db = sqlite3.connect(database)
+        self.reconcile_interval = reconcile_interval
+        self.row_cap = row_cap
+        self.chunk_size = chunk_size
+        self.tables = {}
+        self.log = logging.getLogger(__name__)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS %s ('
+                            'name TEXT PRIMARY KEY, watermark TEXT, '
+                            'reconciled REAL)' % META_TABLE)
+
+    def close(self):
+        ''' Close the database.
+        '''
+        self.db.close()
+
+    def add_table(self, table, fields, query=''):
+        ''' Mirror a SnowTable. Only the listed fields are stored, along
+            with sys_id and sys_updated_on. The optional encoded query
+            restricts which records are mirrored. Fields can be added to
+            an existing mirror, they are filled in as records change.
+        '''
+        fields = [field for field in fields if field not in FIXED_FIELDS]
+        name = table.table
+        columns = ', '.join(['sys_id TEXT PRIMARY KEY',
+                             'sys_updated_on TEXT'] +
+                            ['%s TEXT' % _quote(field) for field in fields])
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS %s (%s)' %
+                            (_quote(name), columns))
+            existing = set(row[1] for row in self.db.execute(
+                'PRAGMA table_info(%s)' % _quote(name)))
+            for field in fields:
+                if field not in existing:
+                    self.db.execute('ALTER TABLE %s ADD COLUMN %s TEXT' %
+                                    (_quote(name), _quote(field)))
+            self.db.execute('INSERT OR IGNORE INTO %s (name, watermark, '
+                            'reconciled) VALUES (?, ?, ?)' % META_TABLE,
+                            (name, '', 0))
+        self.tables[name] = (table, fields, query)
+
+    def watermark(self, name):
+        ''' Return the sys_updated_on watermark of a mirrored table.
+        '''
+        row = self.db.execute('SELECT watermark FROM %s WHERE name = ?' %
+                              META_TABLE, (name,)).fetchone()
+        return row[0] if row else ''
+
+    def _store(self, name, fields, records):
+        columns = FIXED_FIELDS + tuple(fields)
+        sql = 'INSERT OR REPLACE INTO %s (%s) VALUES (%s)' % (
+            _quote(name), ', '.join(_quote(col) for col in columns),
+            ', '.join('?' * len(columns)))
+        self.db.executemany(sql, [tuple(rec.get(col, '') for col in columns)
+                                  for rec in records])
+
+    def _pages(self, table, delta, columns, first):
+        ''' Yield the truncated first page of a delta, then the records
+            past the row cap: the keys are listed with get_all_keys and
+            the records not on the first page are read chunk_size at a
+            time with sys_idIN queries. Raises RuntimeError if a request
+            fails.
+        '''
+        yield first
+        keys = table.get_all_keys(delta)
+        if keys is None:
+            raise RuntimeError('getKeys failed')
+        seen = set(rec.get('sys_id') for rec in first)
+        rest = [key for key in keys if key not in seen]
+        size = min(self.chunk_size, self.row_cap)
+        for start in range(0, len(rest), size):
+            chunk = rest[start:start + size]
+            records = table.get_records('sys_idIN%s' % ','.join(chunk),
+                                        fields=columns)
+            if records is None:
+                raise RuntimeError('getRecords failed')
+            yield records
+
+    def sync_table(self, name):
+        ''' Fetch the records of a mirrored table changed since its
+            watermark and store them, reading only the mirrored fields.
+            When a result is truncated by the row cap the rest of the
+            changed records are listed past the cap and read by sys_id,
+            so any number of records updated in the same second is
+            synced. Returns the number of records stored or None if a
+            request failed.
+        '''
+        table, fields, query = self.tables[name]
+        columns = list(FIXED_FIELDS) + list(fields)
+        watermark = self.watermark(name)
+        delta = 'sys_updated_on>=%s' % watermark if watermark else ''
+        if query:
+            delta = '%s^%s' % (query, delta) if delta else query
+        records = table.get_records(delta, fields=columns)
+        if records is None:
+            self.log.error('sync: %s: Request failed at watermark %s',
+                           name, watermark)
+            return None
+        pages = [records]
+        if len(records) >= self.row_cap:
+            pages = self._pages(table, delta, columns, records)
+        stored = 0
+        newest = watermark
+        try:
+            with self.db:
+                for page in pages:
+                    self._store(name, fields, page)
+                    stored += len(page)
+                    newest = max([rec.get('sys_updated_on', '')
+                                  for rec in page] + [newest])
+                self.db.execute('UPDATE %s SET watermark = ? WHERE name = ?'
+                                % META_TABLE, (newest, name))
+        except RuntimeError as err:
+            self.log.error('sync: %s: %s at watermark %s', name, err,
+                           watermark)
+            return None
+        return stored
+
+    def reconcile(self, name):
+        ''' Remove the local records of a mirrored table that are no longer
+            returned by getKeys for the table query. The keys are listed a
+            page at a time past the row cap, see SnowTable.get_all_keys.
+            Returns the number of records removed or None if a request
+            failed.
+        '''
+        table, _, query = self.tables[name]
+        keys = table.get_all_keys(query)
+        if keys is None:
+            self.log.error('reconcile: %s: getKeys failed', name)
+            return None
+        remote = set(keys)
+        local = [row[0] for row in self.db.execute(
+            'SELECT sys_id FROM %s' % _quote(name))]
+        stale = [(sys_id,) for sys_id in local if sys_id not in remote]
+        with self.db:
+            self.db.executemany('DELETE FROM %s WHERE sys_id = ?' %
+                                _quote(name), stale)
+            self.db.execute('UPDATE %s SET reconciled = ? WHERE name = ?' %
+                            META_TABLE, (time.time(), name))
+        return len(stale)
+
+    def sync(self):
+        ''' Sync every mirrored table, reconciling deletions on the tables
+            whose last reconciliation is older than reconcile_interval.
+            Returns a dict of table name to the number of records stored.
+        '''
+        counts = {}
+        for name in self.tables:
+            counts[name] = self.sync_table(name)
+            if self.reconcile_interval is None:
+                continue
+            reconciled = self.db.execute(
+                'SELECT reconciled FROM %s WHERE name = ?' % META_TABLE,
+                (name,)).fetchone()[0]
+            if time.time() - reconciled >= self.reconcile_interval:
+                self.reconcile(name)
+        return counts
+
+    def records(self, name, where=None, params=()):
+        ''' Return the local records of a mirrored table as dicts,
+            optionally filtered by an SQL where clause.
+        '''
+        sql = 'SELECT * FROM %s' % _quote(name)
+        if where:
+            sql += ' WHERE %s' % where
+        cursor = self.db.execute(sql, params)
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def get(self, name, sys_id):
+        ''' Return one local record by sys_id or None.
+        '''
+        records = self.records(name, 'sys_id = ?', (sys_id,))
+        return records[0] if records else None
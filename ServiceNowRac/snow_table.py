@@ -33,25 +33,83 @@
     Class containing ServiceNow Table API calls
 '''
 
+import json
+
+from collections import OrderedDict
+
+from .snow_batch import SnowFuture
+from .snow_columns import to_columns
+from .snow_prefetch import prefetch as prefetch_pages
+from .snow_records import RecordSchema, SnowRecords
+from .snow_snapshot import SnowSnapshotWriter
+from .snow_spill import SpillRecords
+from .snow_watch import SnowWatch
+
+def _chunks(items, size):
+    ''' Yield successive lists of at most size items.
+    '''
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _first(response):
+    ''' Return the first record of a response or None.
+    '''
+    if response:
+        return response[0]
+    return None
+
 class SnowTable(object):
     ''' Use this class to perform operations on existing tables.
     '''
 
-    def __init__(self, table, connection):
+    # Number of records kept for update_changed
+    KNOWN_RECORDS = 10000
+
+    def __init__(self, table, connection, schema=None, cache=None):
         self.table = table
         self.conn = connection
 
+        # SnowSchema used to check writes and coerce records, see snow_schema
+        self.schema = schema
+
+        # Record cache for get and get_multiple, e.g. a SharedRecordCache
+        # shared by the processes of a host, see snow_shared
+        self.cache = cache
+
+        # Last known version of records, see update_changed()
+        self.known = OrderedDict()
+        self.diff_stats = {'writes': 0, 'writes_skipped': 0,
+                           'bytes_sent': 0, 'bytes_skipped': 0}
+
     def get(self, sys_id):
         ''' Query a single record from the targeted table by specifying the
             sys_id and return the record and its fields. If the query fails
             then None is returned otherwise the json response is returned.
         '''
+        cache = self._cache()
+        if cache is not None:
+            record = cache.get(self.table, sys_id)
+            if record is not None:
+                return record
+
         # A sysparm_action is optional for get
         sysparm = 'sysparm_sys_id=%s' % sys_id
         response = self.conn.get(self.table, sysparm)
-        if response:
-            return response[0]
-        return None
+        if isinstance(response, SnowFuture):
+            return response.then(_first)
+        record = _first(response)
+        if cache is not None and record is not None:
+            cache.put(self.table, record)
+        return record
+
+    def _cache(self):
+        ''' Return the record cache, unless there is none or calls are
+            being batched.
+        '''
+        if self.cache is None or self.conn.batching():
+            return None
+        return self.cache
 
     def get_keys(self, query):
         ''' Query the targeted table using an encoded query string and return
@@ -61,49 +119,431 @@ class SnowTable(object):
         sysparm = 'sysparm_action=getKeys&sysparm_query=%s' % query
         return self.conn.get(self.table, sysparm)
 
-    def get_records(self, query):
+    def get_all_keys(self, query):
+        ''' Return the list of sys_ids of all records matching an encoded
+            query string, in sys_id order. getKeys results are limited by
+            the row cap of the instance, so the keys are listed a page at
+            a time, each page starting after the last sys_id of the
+            previous one, until a page comes back empty. If a query fails
+            then None is returned.
+        '''
+        keys = []
+        while True:
+            page_query = 'ORDERBYsys_id^' + query if query else \
+                'ORDERBYsys_id'
+            if keys:
+                page_query = '^NQ'.join(
+                    '%s^sys_id>%s' % (sub_query, keys[-1])
+                    for sub_query in page_query.split('^NQ'))
+            page = self.get_keys(page_query)
+            if page is None:
+                return None
+            if not page:
+                return keys
+            keys.extend(page)
+
+    def get_records(self, query, view=None, fields=None, compact=False,
+                    lazy=False, coerce=False):
         ''' Query the targeted table using an encoded query string and return
-            all matching records and their fields. If the query fails
-            then None is returned otherwise the json response is returned.
+            all matching records and their fields. If a UI view is given
+            only the fields of that view are returned, fields is a list of
+            field names to return. If the query fails then None is returned
+            otherwise the json response is returned, as a SnowRecords if
+            compact is set (see snow_records). If lazy is set the records
+            are LazyRecord which decode their fields on access (see
+            snow_lazy). If coerce is set the values are converted to Python
+            types with the schema of the table.
         '''
         sysparm = 'sysparm_action=getRecords&sysparm_query=%s' % query
-        return self.conn.get(self.table, sysparm)
+        if view:
+            sysparm += '&sysparm_view=%s' % view
+        if fields:
+            sysparm += '&sysparm_fields=%s' % ','.join(fields)
+        if lazy:
+            response = self.conn.get(self.table, sysparm, lazy=True)
+        else:
+            response = self.conn.get(self.table, sysparm)
+        if coerce and self.schema is not None and \
+                isinstance(response, list):
+            response = [self.schema.coerce(self.table, record)
+                        for record in response]
+        if compact and isinstance(response, list):
+            return SnowRecords(response)
+        return response
+
+    # pylint: disable=too-many-arguments
+    def iter_records(self, query, view=None, fields=None, chunk_size=100,
+                     compact=False, lazy=False, prefetch=0):
+        ''' Iterate over the records matching an encoded query string
+            without holding the whole result set: the sys_ids are listed
+            with get_all_keys, then the records are read chunk_size at a
+            time with sys_idIN queries, in sys_id order. If compact is
+            set the records are SnowRecord views sharing one schema, if
+            lazy is set they are LazyRecord. With prefetch set, up to
+            prefetch chunks are read ahead by a background thread while the
+            caller processes the current one, see snow_prefetch.
+            Raises RuntimeError if a query fails. sys_id is added to
+            fields as the records are matched to the keys by sys_id.
+        '''
+        if fields and 'sys_id' not in fields:
+            fields = list(fields) + ['sys_id']
+        keys = self.get_all_keys(query)
+        if keys is None:
+            raise RuntimeError('getKeys failed on %s for %s' %
+                               (self.table, query))
+        schema = RecordSchema() if compact else None
+
+        def pages():
+            ''' Read the chunks of records in the order of the keys.
+            '''
+            for chunk in _chunks(keys, chunk_size):
+                response = self.get_records('sys_idIN%s' % ','.join(chunk),
+                                            view=view, fields=fields,
+                                            lazy=lazy)
+                if response is None:
+                    raise RuntimeError('getRecords failed on %s' %
+                                       self.table)
+                found = dict((record.get('sys_id'), record)
+                             for record in response)
+                records = [found[key] for key in chunk if key in found]
+                if compact:
+                    records = SnowRecords(records, schema)
+                yield records
+
+        for records in prefetch_pages(pages(), prefetch) if prefetch else \
+                pages():
+            for record in records:
+                yield record
+
+    # pylint: disable=too-many-arguments
+    def get_multiple(self, sys_ids, chunk_size=100, view=None, fields=None,
+                     use_cache=True):
+        ''' Query the records with the given sys_ids in bulk, using one
+            sys_idIN query for every chunk_size sys_ids. Return the list of
+            records found. If a query fails then None is returned. fields
+            is a list of field names to return, sys_id is added to it.
+            With a cache only the records missing from it are queried,
+            when neither view nor fields is given. If use_cache is False
+            every record is queried and the cache refreshed with them.
+        '''
+        if fields and 'sys_id' not in fields:
+            fields = list(fields) + ['sys_id']
+        cache = self._cache() if view is None and not fields else None
+        records = []
+        if cache is not None and use_cache:
+            found = cache.get_many(self.table, sys_ids)
+            records.extend(found.values())
+            sys_ids = [sys_id for sys_id in sys_ids if sys_id not in found]
+        for chunk in _chunks(sys_ids, chunk_size):
+            query = 'sys_idIN%s' % ','.join(chunk)
+            response = self.get_records(query, view=view, fields=fields)
+            if response is None:
+                return None
+            if cache is not None:
+                cache.put_many(self.table, response)
+            records.extend(response)
+        return records
+
+    def get_records_bounded(self, query, max_memory=64 * 1024 * 1024,
+                            view=None, fields=None, chunk_size=100,
+                            directory=None):
+        ''' Query the records matching an encoded query string through
+            iter_records into a SpillRecords, which keeps max_memory bytes
+            of records in memory and spills the others to a temporary file
+            in directory (see snow_spill). If the query fails then None is
+            returned. Close the result to delete the file.
+        '''
+        records = SpillRecords(max_memory, directory)
+        try:
+            records.extend(self.iter_records(query, view=view, fields=fields,
+                                             chunk_size=chunk_size))
+        except RuntimeError:
+            records.close()
+            return None
+        return records
+
+    def snapshot(self, path, query='', fields=None, chunk_size=100):
+        ''' Save the records matching an encoded query string to an NDJSON
+            snapshot with a sys_id index, see snow_snapshot. Return the
+            number of records saved or None if the query fails, in which
+            case a previous snapshot at path is left unchanged.
+        '''
+        with SnowSnapshotWriter(path) as writer:
+            try:
+                for record in self.iter_records(query, fields=fields,
+                                                chunk_size=chunk_size):
+                    writer.write(record)
+            except RuntimeError:
+                writer.abort()
+                return None
+        return writer.count
+
+    def get_columns(self, query, fields, dtypes=None, chunk_size=1000):
+        ''' Query the given fields of the records matching an encoded query
+            string and return them as a dict of NumPy arrays, one per field.
+            dtypes maps field names to 'str' (default), 'int', 'float',
+            'bool', 'datetime' or 'duration', see snow_columns. If the query
+            fails then None is returned. Requires numpy.
+        '''
+        records = self.iter_records(query, fields=fields,
+                                    chunk_size=chunk_size, lazy=True)
+        try:
+            return to_columns(records, fields, dtypes, chunk_size)
+        except RuntimeError:
+            return None
+
+    def count(self, query=''):
+        ''' Count the records matching an encoded query string on the
+            instance, without transferring them. Return the number of
+            records or None if the query fails.
+        '''
+        sysparm = 'sysparm_count=true&sysparm_query=%s' % query
+        response = self.conn.stats(self.table, sysparm)
+        if response is None:
+            return None
+        return int(response['stats']['count'])
+
+    def aggregate(self, query='', group_by=None, metrics=None):
+        ''' Compute aggregates of the records matching an encoded query
+            string on the instance. group_by is a list of field names and
+            metrics a dict mapping avg, sum, min or max to a list of field
+            names, e.g. {'avg': ['reassignment_count']}.
+
+            Return a list with one dict per group, holding the group field
+            values under 'group', the number of records under 'count' and
+            a dict of field values for each metric, or None if the query
+            fails. Without group_by there is a single group.
+        '''
+        sysparm = 'sysparm_count=true&sysparm_query=%s' % query
+        if group_by:
+            sysparm += '&sysparm_group_by=%s' % ','.join(group_by)
+        for function, fields in sorted((metrics or {}).items()):
+            if function not in ('avg', 'sum', 'min', 'max'):
+                raise ValueError('Unknown metric %s' % function)
+            sysparm += '&sysparm_%s_fields=%s' % (function, ','.join(fields))
+        response = self.conn.stats(self.table, sysparm)
+        if response is None:
+            return None
+        if isinstance(response, dict):
+            response = [response]
+        groups = []
+        for item in response:
+            group = dict(item['stats'])
+            group['count'] = int(group.get('count', 0))
+            group['group'] = dict((field['field'], field['value'])
+                                  for field in item.get('groupby_fields', []))
+            groups.append(group)
+        return groups
+
+    def watch(self, query, fields=None, **kwargs):
+        ''' Return a SnowWatch iterator over the records matching the
+            encoded query string that change from now on. See snow_watch
+            for the keyword arguments.
+        '''
+        return SnowWatch(self, query, fields=fields, **kwargs)
+
+    def _invalid(self, records, insert=False):
+        ''' Check write payloads against the schema of the table, if there
+            is one. Return True and log the problems if one is invalid.
+        '''
+        if self.schema is None:
+            return False
+        for record in records:
+            problems = self.schema.validate(self.table, record, insert)
+            if problems:
+                self.conn.log.error('%s: Invalid record: %s', self.table,
+                                    '; '.join(problems))
+                return True
+        return False
 
     def insert(self, data):
-        ''' Create one new record. If insertion fails then None is returned
-            otherwise the json response is returned.
+        ''' Create one new record. If insertion fails or the record is not
+            valid for the schema then None is returned otherwise the json
+            response is returned.
         '''
+        if self._invalid([data], insert=True):
+            return None
         sysparm = 'sysparm_action=insert'
         return self.conn.post(self.table, sysparm, data)
 
     def insert_multiple(self, data):
         ''' Create multiple new records. Format of payload should model
             { "records" : [ { ... }, { ... } ] }
+            None is returned if a record is not valid for the schema.
         '''
         if not isinstance(data, list):
             raise TypeError('Invalid type. insert_multiple requires list of '
                             'records.')
 
+        if self._invalid(data, insert=True):
+            return None
+
         sysparm = 'sysparm_action=insertMultiple'
         records = {'records': data}
         return self.conn.post(self.table, sysparm, records)
 
     def update(self, data, query):
         ''' Update existing records filtered by the encoded query string.
+            None is returned if the data is not valid for the schema.
         '''
+        if self._invalid([data]):
+            return None
         sysparm = 'sysparm_action=update&sysparm_query=%s' % query
-        return self.conn.post(self.table, sysparm, data)
+        response = self.conn.post(self.table, sysparm, data)
+        if self.cache is not None:
+            if isinstance(response, SnowFuture):
+                return response.then(self._refresh)
+            self._refresh(response)
+        return response
+
+    def _refresh(self, records):
+        ''' Store updated records in the cache. Returns the records.
+        '''
+        if records:
+            self.cache.put_many(self.table, [
+                dict((field, value) for field, value in record.items()
+                     if not field.startswith('__')) for record in records])
+        return records
+
+    def remember(self, records):
+        ''' Keep records as the known current version for update_changed.
+            Only the last KNOWN_RECORDS records are kept.
+        '''
+        for record in records:
+            self.known.pop(record['sys_id'], None)
+            self.known[record['sys_id']] = record
+        while len(self.known) > self.KNOWN_RECORDS:
+            self.known.popitem(last=False)
+
+    def update_changed(self, sys_id, data, current=None):
+        ''' Update one record sending only the fields of data that differ
+            from its current version, given as current or remembered from
+            an earlier call. With no known version all of data is sent.
+            If nothing changed no request is made and the current record
+            is returned in a list. The bytes and writes avoided are counted
+            in diff_stats. If the update fails then None is returned
+            otherwise the json response is returned, or a SnowFuture of it
+            when calls are batched.
+        '''
+        if current is None:
+            current = self.known.get(sys_id)
+        changes = data
+        if current is not None:
+            changes = dict((field, value) for field, value in data.items()
+                           if '%s' % ('' if value is None else value) !=
+                           '%s' % current.get(field, ''))
+
+        size = len(json.dumps(data))
+        sent = len(json.dumps(changes)) if changes else 0
+        self.diff_stats['bytes_skipped'] += size - sent
+        if not changes:
+            self.diff_stats['writes_skipped'] += 1
+            return [current]
+
+        self.diff_stats['writes'] += 1
+        self.diff_stats['bytes_sent'] += sent
+        response = self.update(changes, 'sys_id=%s' % sys_id)
+        if isinstance(response, SnowFuture):
+            return response.then(self._remember_response)
+        return self._remember_response(response)
+
+    def _remember_response(self, records):
+        ''' Remember the records of an update response. Returns the
+            records.
+        '''
+        if records:
+            self.remember(records)
+        return records
+
+    # pylint: disable=too-many-locals
+    def upsert_many(self, records, key='correlation_id', batch_size=100,
+                    view=None):
+        ''' Insert or update records keyed on a field. Existing keys are
+            resolved with one keyIN query per batch_size keys, new records
+            are created with insertMultiple in batches and records to
+            update are grouped by identical payload so each group is one
+            update per batch_size sys_ids. Later records override earlier
+            ones with the same key. A UI view holding sys_id and the key
+            field keeps the key lookups small. If resolving the keys
+            fails then None is returned and nothing is written.
+
+            Returns
+                dict with the 'inserted' and 'updated' records returned
+                by the instance and the input records whose request
+                'failed'
+        '''
+        merged = {}
+        for record in records:
+            value = '%s' % record.get(key, '')
+            if not value or ',' in value:
+                raise ValueError('Invalid upsert key %s=%r' % (key, value))
+            merged.setdefault(value, {}).update(record)
+
+        existing = {}
+        for chunk in _chunks(merged, batch_size):
+            query = '%sIN%s' % (key, ','.join(chunk))
+            response = self.get_records(query, view=view)
+            if response is None:
+                return None
+            for record in response:
+                existing['%s' % record.get(key)] = record['sys_id']
+
+        result = {'inserted': [], 'updated': [], 'failed': []}
+        new = [record for value, record in merged.items()
+               if value not in existing]
+        for chunk in _chunks(new, batch_size):
+            response = self.insert_multiple(chunk)
+            if response is None:
+                result['failed'].extend(chunk)
+            else:
+                result['inserted'].extend(response)
+
+        # The key field already matches so it is left out of the payload
+        groups = {}
+        for value, record in merged.items():
+            if value in existing:
+                payload = dict((field, data) for field, data in
+                               record.items() if field != key)
+                group = groups.setdefault(json.dumps(payload, sort_keys=True),
+                                          (payload, []))
+                group[1].append(record)
+        for payload, group in groups.values():
+            if not payload:
+                continue
+            for chunk in _chunks(group, batch_size):
+                query = 'sys_idIN%s' % ','.join(
+                    existing['%s' % record[key]] for record in chunk)
+                response = self.update(payload, query)
+                if response is None:
+                    result['failed'].extend(chunk)
+                else:
+                    result['updated'].extend(response)
+        return result
 
     def delete(self, sys_id):
         ''' Delete a record specifying its sys_id.
         '''
+        if self.cache is not None:
+            self.cache.delete(self.table, sys_id)
         sysparm = 'sysparm_action=deleteRecord'
         data = {'sysparm_sys_id' : sys_id}
         return self.conn.post(self.table, sysparm, data)
 
-    def delete_multiple(self, query):
+    def delete_multiple(self, query, sys_ids=None):
         ''' Delete multiple records filtered by an encoded query string.
+            With a cache the deleted records are dropped from it: sys_ids
+            lists the records the query can match if the caller knows
+            them, otherwise they are listed with get_all_keys first, and
+            the whole cache is cleared if that fails.
         '''
+        if self.cache is not None and sys_ids is None:
+            sys_ids = self.get_all_keys(query)
         sysparm = 'sysparm_action=deleteMultiple'
         data = {'sysparm_query' : query}
-        return self.conn.post(self.table, sysparm, data)
+        response = self.conn.post(self.table, sysparm, data)
+        if self.cache is not None:
+            if sys_ids is None:
+                self.cache.clear()
+            for sys_id in sys_ids or []:
+                self.cache.delete(self.table, sys_id)
+        return response
@@ -0,0 +1,229 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Transports
+
+SnowSession extends requests.Session, whose transport adapters speak
+HTTP/1.1 with one connection per concurrent request. A transport is a
+requests transport adapter mounted for every URL of the session, so the
+retry logic of SnowSession._make_request is unchanged whatever carries
+the requests:
+
+    client = SnowClient(hostname, username, password, transport='http2')
+
+HTTP2Adapter sends the requests through an httpx client with HTTP/2
+enabled: concurrent requests from many threads are multiplexed as
+streams over a few connections instead of opening one TCP and TLS
+connection each. httpx errors are raised as the requests exceptions
+_make_request retries on (Timeout, ConnectionError).
+
+Only HTTP/2 traffic goes through the shared httpx client. Its HTTP/1.1
+connection pool is not safe under concurrent threads (an idle connection
+being picked up by one thread can be closed as expired by another), so
+plain http URLs, and https hosts that answered the first request over
+HTTP/1.1, are sent through the stock requests adapter instead. The first
+request to an https host is sent alone to learn its protocol.
+
+The verify and cert settings of a request (Session.verify, Session.cert or
+the request arguments) select the httpx client it is sent through, one
+client per distinct setting. httpx has no per request proxy, so requests
+for which requests selects a proxy go through the stock adapter too.
+
+httpx, with its http2 extra, is an optional dependency imported when an
+HTTP2Adapter is created.
+'''
+
+import os
+import ssl
+import threading
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.certs import where
+from requests.exceptions import ConnectionError, ConnectTimeout, \
+    ReadTimeout
+from requests.structures import CaseInsensitiveDict
+from requests.utils import select_proxy
+
+def _httpx():
+    try:
+        import httpx   # pylint: disable=import-outside-toplevel
+    except ImportError:
+        raise ImportError('the http2 transport requires httpx, install '
+                          'ServiceNowRac[http2]')
+    return httpx
+
+def _ssl_context(verify, cert):
+    ''' Return an SSL context for the verify and cert arguments of a
+        requests call.
+    '''
+    if verify is True:
+        context = ssl.create_default_context(cafile=where())
+    elif verify and os.path.isdir(verify):
+        context = ssl.create_default_context(capath=verify)
+    elif verify:
+        context = ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if isinstance(cert, (tuple, list)):
+        context.load_cert_chain(cert[0], cert[1])
+    elif cert:
+        context.load_cert_chain(cert)
+    return context
+
+class HTTP2Adapter(BaseAdapter):
+    ''' requests transport adapter sending requests over HTTP/2 with
+        httpx.
+
+        Parameters:
+            max_connections: HTTP/2 connections kept open to all hosts
+                by each httpx client
+            http2: False to send every request with the HTTP/1.1 adapter
+    '''
+    def __init__(self, max_connections=4, http2=True):
+        super(HTTP2Adapter, self).__init__()
+        self.httpx = _httpx()
+        self.http2 = http2
+        self.max_connections = max_connections
+        # (verify, cert) to the httpx client sending with those settings
+        self.clients = {}
+        self._clients_lock = threading.Lock()
+        # Adapter for the hosts speaking HTTP/1.1
+        self.fallback = HTTPAdapter()
+        # (scheme, host) to the protocol of its first response
+        self.protocols = {}
+        self._probe_lock = threading.Lock()
+
+    def new_client(self, verify, cert):
+        ''' Return a new httpx client for the verify and cert arguments of
+            a requests call.
+        '''
+        return self.httpx.Client(
+            http2=True, verify=_ssl_context(verify, cert),
+            follow_redirects=False,
+            limits=self.httpx.Limits(max_connections=self.max_connections))
+
+    def _client(self, verify, cert):
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        with self._clients_lock:
+            client = self.clients.get((verify, cert))
+            if client is None:
+                client = self.clients[(verify, cert)] = \
+                    self.new_client(verify, cert)
+        return client
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self.httpx.Timeout(read, connect=connect)
+        return self.httpx.Timeout(timeout)
+
+    # pylint: disable=too-many-arguments
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        ''' Send a PreparedRequest. Requests through a proxy are sent
+            with the HTTP/1.1 adapter.
+        '''
+        origin = urlsplit(request.url)[:2]
+        if self.http2 and origin[0] == 'https' and \
+                not select_proxy(request.url, proxies or {}):
+            protocol = self.protocols.get(origin)
+            if protocol is None:
+                with self._probe_lock:
+                    protocol = self.protocols.get(origin)
+                    if protocol is None:
+                        response = self._send(self._client(verify, cert),
+                                              request, timeout)
+                        self.protocols[origin] = response.http_version
+                        return response
+            if protocol == 'HTTP/2':
+                return self._send(self._client(verify, cert), request,
+                                  timeout)
+        return self.fallback.send(request, stream=stream, timeout=timeout,
+                                  verify=verify, cert=cert, proxies=proxies)
+
+    def _send(self, client, request, timeout):
+        ''' Send a PreparedRequest through an httpx client.
+        '''
+        httpx = self.httpx
+        try:
+            reply = client.request(
+                request.method, request.url,
+                headers=dict(request.headers), content=request.body,
+                timeout=self._timeout(timeout))
+        except httpx.ConnectTimeout as error:
+            raise ConnectTimeout(error, request=request)
+        except httpx.TimeoutException as error:
+            raise ReadTimeout(error, request=request)
+        except (httpx.NetworkError, httpx.RemoteProtocolError) as error:
+            raise ConnectionError(error, request=request)
+
+        response = Response()
+        response.status_code = reply.status_code
+        response.headers = CaseInsensitiveDict(reply.headers.items())
+        response._content = reply.content   # pylint: disable=W0212
+        response._content_consumed = True   # pylint: disable=W0212
+        response.encoding = reply.encoding
+        response.url = request.url
+        response.request = request
+        response.reason = reply.reason_phrase
+        # The protocol used, 'HTTP/2' or 'HTTP/1.1'
+        response.http_version = reply.http_version
+        return response
+
+    def close(self):
+        with self._clients_lock:
+            clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            client.close()
+        self.fallback.close()
+
+TRANSPORTS = {
+    'http2': HTTP2Adapter,
+}
+
+def get_transport(transport):
+    ''' Return the adapter for the transport argument of SnowClient: an
+        adapter object or the name of a transport.
+    '''
+    if isinstance(transport, BaseAdapter):
+        return transport
+    if transport not in TRANSPORTS:
+        raise ValueError('Unknown transport %s' % transport)
+    return TRANSPORTS[transport]()
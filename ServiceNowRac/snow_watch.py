@@ -0,0 +1,209 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' ServiceNow Change Watch
+
+Poll a table for changed records without re-downloading unchanged ones.
+Each poll first asks getKeys for the sys_ids updated at or after the high
+water mark, which is a small response, and only then fetches the changed
+records in bulk with sys_idIN queries. The poll interval adapts to the
+observed change rate: it shrinks while changes keep arriving and grows
+while the table is quiet.
+
+    for record in SnowTable('incident', client).watch('active=true'):
+        handle(record)
+
+On Python 3 the watch is also an async iterator, each poll then runs in
+the default executor of the event loop:
+
+    async for record in table.watch('active=true'):
+        handle(record)
+
+sys_updated_on has a resolution of one second, so the records already
+delivered at the high water mark second are fetched again by every poll
+and only reported if their sys_updated_on or sys_mod_count moved. The
+probe is ordered by sys_updated_on; when it is truncated by the row cap
+only the records of the seconds it holds completely are delivered, the
+rest come with the next poll.
+'''
+
+import time
+import logging
+import threading
+
+from collections import deque
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+META_FIELDS = ('sys_id', 'sys_updated_on', 'sys_mod_count')
+
+class SnowWatch(object):
+    ''' Iterator over the changed records of a SnowTable.
+
+        Parameters:
+            table: SnowTable to watch
+            query: encoded query string restricting the watched records
+            fields: fields to keep in the records returned, None for all
+            since: sys_updated_on value to start from, defaults to the
+                   current UTC time
+            min_interval: shortest time between polls in seconds
+            max_interval: longest time between polls in seconds
+            chunk_size: number of sys_ids in one bulk fetch
+            row_cap: maximum number of records the instance returns for
+                     one request (glide.json.return_limit)
+    '''
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(self, table, query, fields=None, since=None,
+                 min_interval=1.0, max_interval=60.0, chunk_size=100,
+                 row_cap=10000):
+        self.table = table
+        self.query = query
+        self.fields = fields
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.chunk_size = chunk_size
+        self.row_cap = row_cap
+        self.interval = min_interval
+        if since is None:
+            since = time.strftime(TIME_FORMAT, time.gmtime())
+        self.high_water_mark = since
+        self.polls = 0
+        self._boundary = {}
+        self._pending = deque()
+        self._stopped = threading.Event()
+        self._first = True
+        self.log = logging.getLogger(__name__)
+
+    def stop(self):
+        ''' Stop the watch, iteration ends once pending records are
+            consumed.
+        '''
+        self._stopped.set()
+
+    def _project(self, record):
+        if self.fields is None:
+            return record
+        return dict((field, record.get(field)) for field in
+                    tuple(self.fields) + META_FIELDS if field in record)
+
+    @staticmethod
+    def _version(record):
+        return (record.get('sys_updated_on'), record.get('sys_mod_count'))
+
+    def _adapt(self, changes):
+        ''' Shrink the poll interval when changes arrive, grow it while
+            the table is quiet.
+        '''
+        if changes:
+            self.interval = max(self.min_interval, self.interval / 2.0)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    def poll(self):
+        ''' Poll the table once and return the list of changed records.
+            If a request fails the error is logged and an empty list is
+            returned.
+        '''
+        self.polls += 1
+        query = 'sys_updated_on>=%s^ORDERBYsys_updated_on' % \
+            self.high_water_mark
+        if self.query:
+            query = '%s^%s' % (self.query, query)
+        keys = self.table.get_keys(query)
+        if keys is None:
+            self.log.error('watch: %s: getKeys failed', self.table.table)
+            self._adapt(False)
+            return []
+
+        records = self.table.get_multiple(keys, self.chunk_size,
+                                          use_cache=False) if keys else []
+        if records is None:
+            self.log.error('watch: %s: Fetch of %d records failed',
+                           self.table.table, len(keys))
+            self._adapt(False)
+            return []
+
+        # Records delivered at the mark are only reported again if changed
+        records = [rec for rec in records if self._boundary.get(
+            rec['sys_id']) != self._version(rec)]
+        if len(keys) >= self.row_cap:
+            if not records:
+                self.log.error('watch: %s: More than %d records updated '
+                               'at %s', self.table.table, self.row_cap,
+                               self.high_water_mark)
+            # The last second of a truncated probe may be incomplete
+            last = max([rec.get('sys_updated_on', '') for rec in records] +
+                       [''])
+            complete = [rec for rec in records
+                        if rec.get('sys_updated_on', '') != last]
+            if complete:
+                records = complete
+
+        newest = max([rec.get('sys_updated_on', '') for rec in records] +
+                     [self.high_water_mark])
+        if newest != self.high_water_mark:
+            self._boundary = {}
+            self.high_water_mark = newest
+        self._boundary.update((rec['sys_id'], self._version(rec))
+                              for rec in records
+                              if rec.get('sys_updated_on') == newest)
+        self._adapt(records)
+        return [self._project(rec) for rec in records]
+
+    def _next_record(self, stop_exception):
+        while not self._pending:
+            if self._first:
+                self._first = False
+            elif self._stopped.wait(self.interval):
+                raise stop_exception()
+            if self._stopped.is_set():
+                raise stop_exception()
+            self._pending.extend(self.poll())
+        return self._pending.popleft()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._next_record(StopIteration)
+
+    next = __next__
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        ''' Return an awaitable for the next changed record. Polls run in
+            the default executor so the event loop is not blocked.
+        '''
+        import asyncio
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(None, self._next_record,
+                                    StopAsyncIteration)
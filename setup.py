@@ -114,5 +114,7 @@ setup(
     # $ pip install -e .[dev,test]
     extras_require={
         'dev': ['check-manifest', 'pep8', 'pyflakes', 'pylint', 'coverage', 'httmock'],
+        'numpy': ['numpy'],
+        'http2': ['httpx[http2]'],
     },
 )
@@ -0,0 +1,225 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Benchmarks for the client hot paths
+
+Measures the per call cost of:
+    o SnowClient.get and SnowClient.post against the in-process emulator
+    o JSON decode of getRecords responses of 1k/10k/100k records
+    o JSON decode plus the __error scan of POST responses of the same sizes
+    o insert_multiple payload serialization
+    o SnowSession._make_request compared to a plain requests.Session
+
+Results are written as JSON and compared against a stored baseline. The
+run fails when a benchmark is slower than its baseline by more than the
+tolerance. Run with `make bench`, or refresh the baseline with:
+
+    python -m test.bench.bench_snow --save-baseline test/bench/baseline.json
+'''
+from __future__ import print_function
+
+import sys
+import json
+import timeit
+import argparse
+import platform
+
+from requests import Response, Session
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_session import SnowSession
+from ServiceNowRac.snow_table import SnowTable
+
+SIZES = (1000, 10000, 100000)
+URL = 'https://servicenow-instance.service-now.com/'
+
+def make_record(num):
+    ''' Return a synthetic incident record.
+    '''
+    record = {'field_%02d' % idx: 'value %d-%d' % (num, idx)
+              for idx in range(20)}
+    record.update({'sys_id': '%032x' % num, 'number': 'INC%07d' % num,
+                   'sys_updated_on': '2016-01-01 00:00:00',
+                   'sys_mod_count': '0', '__status': 'success'})
+    return record
+
+class StaticAdapter(BaseAdapter):
+    ''' Transport adapter that answers every request with fixed content.
+    '''
+    def __init__(self, content):
+        super(StaticAdapter, self).__init__()
+        self.content = content
+
+    # pylint: disable=too-many-arguments,unused-argument
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        response = Response()
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict(
+            {'content-type': 'application/json'})
+        response._content = self.content    # pylint: disable=protected-access
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+def _client(adapter=None):
+    client = SnowClient('servicenow-instance', 'admin', 'admin')
+    if adapter is not None:
+        client.session.mount(client.instance, adapter)
+    return client
+
+def _time(func, number, repeat):
+    ''' Return the best per call time of func in microseconds.
+    '''
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e6
+
+def bench_client_calls(results, repeat):
+    ''' SnowClient.get/post overhead per call against the emulator.
+    '''
+    emulator = SnowEmulator()
+    sys_ids = emulator.load('incident', [make_record(num)
+                                         for num in range(10)])
+    client = emulator.attach(_client())
+    sysparm = 'sysparm_sys_id=%s' % sys_ids[0]
+    results['client_get'] = _time(lambda: client.get('incident', sysparm),
+                                  500, repeat)
+    data = {'sysparm_sys_id': 'missing'}
+    results['client_post'] = _time(
+        lambda: client.post('incident', 'sysparm_action=deleteRecord', data),
+        500, repeat)
+
+def bench_decode(results, repeat, sizes):
+    ''' JSON decode and __error scan for large responses.
+    '''
+    for size in sizes:
+        content = json.dumps({'records': [make_record(num)
+                                          for num in range(size)]})
+        client = _client(StaticAdapter(content.encode('utf-8')))
+        number = max(1, 10000 // size)
+        results['decode_get_%d' % size] = _time(
+            lambda c=client: c.get('incident', 'sysparm_action=getRecords'),
+            number, repeat)
+        results['decode_post_scan_%d' % size] = _time(
+            lambda c=client: c.post('incident', 'sysparm_action=update',
+                                    {'state': '7'}),
+            number, repeat)
+
+def bench_insert_multiple(results, repeat, sizes):
+    ''' insert_multiple payload serialization cost.
+    '''
+    table = SnowTable('incident', _client(StaticAdapter(b'{"records": []}')))
+    for size in sizes:
+        data = [make_record(num) for num in range(size)]
+        results['insert_multiple_%d' % size] = _time(
+            lambda d=data: table.insert_multiple(d),
+            max(1, 10000 // size), repeat)
+
+def bench_make_request(results, repeat):
+    ''' SnowSession._make_request overhead with no retries.
+    '''
+    adapter = StaticAdapter(b'{"records": []}')
+    plain = Session()
+    plain.mount(URL, adapter)
+    session = SnowSession()
+    session.mount(URL, adapter)
+    results['session_plain_get'] = _time(lambda: plain.get(URL), 2000, repeat)
+    results['session_make_request'] = _time(lambda: session.get(URL), 2000,
+                                            repeat)
+    results['session_overhead'] = max(0.0, results['session_make_request'] -
+                                      results['session_plain_get'])
+
+def run(sizes, repeat):
+    ''' Run all of the benchmarks and return a dict of results.
+    '''
+    results = {}
+    bench_client_calls(results, repeat)
+    bench_decode(results, repeat, sizes)
+    bench_insert_multiple(results, repeat, sizes)
+    bench_make_request(results, repeat)
+    return results
+
+def compare(results, baseline, tolerance):
+    ''' Compare results against a baseline. Returns a list of
+        (name, result, baseline) for each regression.
+    '''
+    regressions = []
+    for name, value in sorted(results.items()):
+        # Differences are too noisy to gate on
+        if name == 'session_overhead' or name not in baseline:
+            continue
+        if value > baseline[name] * (1 + tolerance):
+            regressions.append((name, value, baseline[name]))
+    return regressions
+
+def main(argv=None):
+    ''' Run the benchmarks, report and gate on the baseline.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--baseline', help='baseline file to compare with')
+    parser.add_argument('--save-baseline', help='write results as baseline')
+    parser.add_argument('--output', help='write results to this file')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown ratio (default 0.5)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    results = {name: round(value, 1) for name, value in results.items()}
+    report = {'python': platform.python_version(), 'unit': 'usec/call',
+              'results': results}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    for filename in (args.output, args.save_baseline):
+        if filename:
+            with open(filename, 'w') as out_file:
+                out_file.write(text + '\n')
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as in_file:
+        baseline = json.load(in_file)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    for name, value, base in regressions:
+        print('REGRESSION %s: %.1f usec/call, baseline %.1f' %
+              (name, value, base), file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
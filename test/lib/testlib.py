@@ -61,3 +61,12 @@ def random_string(minchar=1, maxchar=50):
     '''
     return ''.join(random.choice(string.ascii_uppercase + string.digits)
                    for _ in range(random.randint(minchar, maxchar)))
+
+class FakeClock(object):
+    ''' Clock that only moves when told to, for the emulator.
+    '''
+    def __init__(self, now=1451606400.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the ServiceNow backends
+'''
+import unittest
+
+from ServiceNowRac.snow_backend import (JSONv2Backend, TableAPIBackend,
+                                        parse_sysparm)
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_table import SnowTable
+
+class TestTableAPIBackend(unittest.TestCase):
+    ''' Tests SnowTable over the Table API against the emulator
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        self.sys_ids = self.emulator.load('incident', [
+            {'number': 'INC%04d' % num, 'active': 'true',
+             'priority': '%d' % (num % 3)} for num in range(25)])
+        self.client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin',
+                       api=TableAPIBackend(page_size=10)))
+        self.table = SnowTable('incident', self.client)
+
+    def test_00_select(self):
+        ''' Verify the backend is selected from the api argument
+        '''
+        client = SnowClient('servicenow-instance', 'admin', 'admin')
+        self.assertIsInstance(client.backend, JSONv2Backend)
+        client = SnowClient('servicenow-instance', 'admin', 'admin',
+                            api='table')
+        self.assertIsInstance(client.backend, TableAPIBackend)
+        self.assertEqual(parse_sysparm('a=1&b=&c=x=y'),
+                         {'a': '1', 'b': '', 'c': 'x=y'})
+
+    def test_01_paging(self):
+        ''' Verify list reads follow the Link header page by page
+        '''
+        records = self.table.get_records('active=true^ORDERBYnumber')
+        self.assertEqual([record['number'] for record in records],
+                         ['INC%04d' % num for num in range(25)])
+        self.assertEqual(self.emulator.requests, 3)
+        keys = self.table.get_keys('priority=0')
+        self.assertEqual(len(keys), 9)
+
+    def test_02_fields(self):
+        ''' Verify sysparm_fields limits the fields with both backends
+        '''
+        records = self.table.get_records('number=INC0003',
+                                         fields=['number', 'priority'])
+        self.assertEqual(records, [{'number': 'INC0003', 'priority': '0'}])
+
+        client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+        records = SnowTable('incident', client).get_records(
+            'number=INC0003', fields=['number', 'priority'])
+        self.assertEqual(records, [{'number': 'INC0003', 'priority': '0'}])
+
+    def test_03_writes(self):
+        ''' Verify single record reads and writes
+        '''
+        self.assertEqual(self.table.get(self.sys_ids[0])['number'],
+                         'INC0000')
+        self.assertEqual(self.table.get('f' * 32), None)
+        inserted = self.table.insert({'number': 'INC0100'})
+        self.assertEqual(inserted[0]['number'], 'INC0100')
+        updated = self.table.update({'state': '2'},
+                                    'sys_id=%s' % self.sys_ids[1])
+        self.assertEqual(updated[0]['state'], '2')
+        self.assertEqual(self.table.delete(self.sys_ids[2]),
+                         [{'sys_id': self.sys_ids[2]}])
+        self.assertEqual(len(self.emulator.records('incident')), 25)
+
+    def test_04_multiple(self):
+        ''' Verify update and delete by query apply to every match
+        '''
+        updated = self.table.update({'state': '6'}, 'priority=1')
+        self.assertEqual(len(updated), 8)
+        self.assertEqual(self.table.update({'state': '6'}, 'priority=9'),
+                         [])
+        self.assertEqual(self.table.delete_multiple('priority=2'),
+                         [{'count': 8}])
+        self.assertEqual(len(self.emulator.records('incident')), 17)
+
+    def test_05_errors(self):
+        ''' Verify errors are returned as None
+        '''
+        self.emulator.record_error_rate = 1.0
+        self.assertEqual(self.table.insert({'number': 'INC0100'}), None)
+        self.assertEqual(self.client.post('incident',
+                                          'sysparm_action=bogus', {}), None)
+        self.assertEqual(self.client.get('incident',
+                                         'sysparm_action=bogus'), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the batch transport
+'''
+import unittest
+
+from ServiceNowRac.snow_backend import translate
+from ServiceNowRac.snow_batch import SnowFuture
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSnowBatch(unittest.TestCase):
+    ''' Tests batching SnowTable calls against the emulator
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        self.sys_ids = self.emulator.load('incident', [
+            {'number': 'INC%04d' % num, 'active': 'true'}
+            for num in range(5)])
+        self.client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+        self.table = SnowTable('incident', self.client)
+
+    def test_00_batch(self):
+        ''' Verify queued calls are sent in one request
+        '''
+        with self.client.batch() as batch:
+            first = self.table.get(self.sys_ids[0])
+            missing = self.table.get('f' * 32)
+            keys = self.table.get_keys('active=true')
+            records = self.table.get_records('number=INC0001')
+            inserted = self.table.insert_multiple([{'number': 'INC0005'},
+                                                   {'number': 'INC0006'}])
+            updated = self.table.update({'state': '2'},
+                                        'sys_id=%s' % self.sys_ids[1])
+            deleted = self.table.delete(self.sys_ids[2])
+            self.assertFalse(first.done())
+            self.assertRaises(RuntimeError, first.result)
+
+        self.assertEqual((self.emulator.requests, batch.requests), (1, 1))
+        self.assertEqual(first.result()['number'], 'INC0000')
+        self.assertEqual(missing.result(), None)
+        self.assertEqual(sorted(keys.result()), sorted(self.sys_ids))
+        self.assertEqual(records.result()[0]['number'], 'INC0001')
+        self.assertEqual(len(inserted.result()), 2)
+        self.assertEqual(updated.result()[0]['state'], '2')
+        self.assertEqual(deleted.result(), [{'sys_id': self.sys_ids[2]}])
+        self.assertEqual(len(self.emulator.records('incident')), 6)
+
+    def test_01_max_requests(self):
+        ''' Verify batches are split at max_requests
+        '''
+        with self.client.batch(max_requests=2) as batch:
+            futures = [self.table.get(sys_id) for sys_id in self.sys_ids]
+        self.assertEqual(batch.requests, 3)
+        self.assertEqual([future.result()['sys_id'] for future in futures],
+                         self.sys_ids)
+
+    def test_02_not_batchable(self):
+        ''' Verify calls that can not be batched are sent immediately
+        '''
+        with self.client.batch():
+            resp = self.table.delete_multiple('active=true')
+            self.assertEqual(resp[0]['count'], 5)
+            self.assertEqual(self.emulator.requests, 1)
+
+    def test_03_record_error(self):
+        ''' Verify a failed write resolves to None
+        '''
+        self.emulator.record_error_rate = 1.0
+        with self.client.batch():
+            inserted = self.table.insert({'number': 'INC0005'})
+        self.assertEqual(inserted.result(), None)
+
+    def test_04_translate(self):
+        ''' Verify calls are translated to the Table API
+        '''
+        calls = translate('GET', 'incident',
+                          'sysparm_action=getKeys&sysparm_query=a=b^c=d')[0]
+        self.assertEqual(calls[0][1], '/api/now/table/incident?'
+                         'sysparm_exclude_reference_link=true&'
+                         'sysparm_fields=sys_id&sysparm_query=a%3Db%5Ec%3Dd')
+        self.assertEqual(translate('POST', 'incident', 'sysparm_action='
+                                   'update&sysparm_query=active=true', {}),
+                         None)
+
+    def test_05_future_then(self):
+        ''' Verify chained futures
+        '''
+        future = SnowFuture()
+        chained = future.then(len)
+        future.set_result([1, 2])
+        self.assertEqual(chained.result(), 2)
+        self.assertEqual(future.then(sum).result(), 3)
+
+    def test_06_send_failure(self):
+        ''' Verify the futures of a batch that fails to send raise
+        '''
+        post = self.client.session.post
+        calls = []
+
+        def failing_post(*args, **kwargs):
+            ''' Send the first batch, fail the others.
+            '''
+            calls.append(args)
+            if len(calls) > 1:
+                raise IOError('Connection reset')
+            return post(*args, **kwargs)
+        self.client.session.post = failing_post
+        futures = []
+        with self.assertRaises(IOError):
+            with self.client.batch(max_requests=2):
+                futures = [self.table.get(sys_id).then(len)
+                           for sys_id in self.sys_ids]
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(futures[0].result(), futures[1].result())
+        for future in futures[2:]:
+            self.assertRaises(IOError, future.result)
+        self.assertRaises(IOError, futures[4].then(str).result)
+
+    def test_07_future_exception(self):
+        ''' Verify an exception set on a future reaches chained futures
+        '''
+        future = SnowFuture()
+        chained = future.then(len)
+        future.set_exception(ValueError('bad'))
+        self.assertRaises(ValueError, chained.result)
+        self.assertRaises(ValueError, future.result)
+
+if __name__ == '__main__':
+    unittest.main()
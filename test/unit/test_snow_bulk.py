@@ -0,0 +1,163 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for bulk mutations
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from ServiceNowRac.snow_bulk import SnowBulk
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_table import SnowTable
+
+class FailingTable(SnowTable):
+    ''' SnowTable whose updates fail after a number of calls.
+    '''
+    def __init__(self, table, connection, good_calls):
+        super(FailingTable, self).__init__(table, connection)
+        self.good_calls = good_calls
+
+    def update(self, data, query):
+        self.good_calls -= 1
+        if self.good_calls < 0:
+            return None
+        return super(FailingTable, self).update(data, query)
+
+class TestSnowBulk(unittest.TestCase):
+    ''' Tests chunked bulk mutations against the emulator
+    '''
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tmpdir, 'bulk.json')
+        self.emulator = SnowEmulator()
+        self.client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+        self.table = SnowTable('incident', self.client)
+        self.table.insert_multiple([{'number': 'INC%04d' % num,
+                                     'active': 'true'} for num in range(95)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_00_update(self):
+        ''' Verify an update is applied in chunks by several workers
+        '''
+        progress = []
+        bulk = SnowBulk(self.table, chunk_size=10, workers=3,
+                        checkpoint=self.checkpoint,
+                        progress=lambda done, total: progress.append(done))
+        report = bulk.update({'state': '7'}, 'active=true')
+        self.assertEqual((report['targets'], report['affected'],
+                          report['chunks'], report['failed']),
+                         (95, 95, 10, 0))
+        self.assertEqual(max(progress), 95)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        states = [rec.get('state') for rec in
+                  self.emulator.records('incident')]
+        self.assertEqual(states.count('7'), 95)
+
+    def test_00_update_row_cap(self):
+        ''' Verify the targets are listed past the row cap
+        '''
+        self.emulator.row_cap = 20
+        report = SnowBulk(self.table, chunk_size=10,
+                          checkpoint=self.checkpoint).update(
+                              {'state': '7'}, 'active=true')
+        self.assertEqual((report['targets'], report['affected'],
+                          report['failed']), (95, 95, 0))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_01_delete(self):
+        ''' Verify a delete is applied in chunks
+        '''
+        report = SnowBulk(self.table, chunk_size=40).delete('numberSTARTSWITH'
+                                                            'INC00')
+        self.assertEqual((report['affected'], report['chunks']), (95, 3))
+        self.assertEqual(self.emulator.records('incident'), [])
+
+    def test_02_resume(self):
+        ''' Verify an interrupted run resumes from the checkpoint
+        '''
+        failing = FailingTable('incident', self.client, good_calls=4)
+        report = SnowBulk(failing, chunk_size=10,
+                          checkpoint=self.checkpoint).update({'state': '7'},
+                                                             'active=true')
+        self.assertEqual((report['affected'], report['failed']), (40, 6))
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        # New records matching the query are not picked up on resume
+        self.table.insert({'number': 'INC9999', 'active': 'true'})
+        requests = self.emulator.requests
+        report = SnowBulk(self.table, chunk_size=10,
+                          checkpoint=self.checkpoint).update({'state': '7'},
+                                                             'active=true')
+        self.assertEqual((report['affected'], report['chunks'],
+                          report['total_affected']), (55, 6, 95))
+        self.assertEqual(self.emulator.requests - requests, 6)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_02_resume_no_longer_matching(self):
+        ''' Verify records that stop matching before a resume are left
+            alone
+        '''
+        failing = FailingTable('incident', self.client, good_calls=4)
+        SnowBulk(failing, chunk_size=10,
+                 checkpoint=self.checkpoint).update({'state': '7'},
+                                                    'active=true')
+        pending = sorted(rec['sys_id'] for rec in
+                         self.emulator.records('incident')
+                         if rec.get('state') != '7')[:5]
+        self.table.update({'active': 'false'},
+                          'sys_idIN%s' % ','.join(pending))
+        report = SnowBulk(self.table, chunk_size=10,
+                          checkpoint=self.checkpoint).update({'state': '7'},
+                                                             'active=true')
+        self.assertEqual((report['affected'], report['failed']), (50, 0))
+        states = [rec.get('state') for rec in
+                  self.emulator.records('incident')
+                  if rec['sys_id'] in pending]
+        self.assertEqual(states.count('7'), 0)
+
+    def test_03_other_checkpoint(self):
+        ''' Verify a checkpoint of another operation is not resumed
+        '''
+        failing = FailingTable('incident', self.client, good_calls=0)
+        SnowBulk(failing, checkpoint=self.checkpoint).update({'state': '7'},
+                                                             'active=true')
+        report = SnowBulk(self.table, checkpoint=self.checkpoint).update(
+            {'state': '6'}, 'active=true')
+        self.assertEqual(report['affected'], 95)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the persistent GET response cache
+'''
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from ServiceNowRac.snow_cache import ResponseCache
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_table import SnowTable
+
+def _fill(path, worker):
+    ''' Store responses from another process.
+    '''
+    emulator = SnowEmulator()
+    emulator.load('sys_user', [{'name': 'user%d' % num}
+                               for num in range(10)])
+    client = emulator.attach(SnowClient('servicenow-instance', 'admin',
+                                        'admin'))
+    client.session.start_cache(path)
+    table = SnowTable('sys_user', client)
+    for num in range(10):
+        table.get_records('name=user%d^worker=%d' % (num, worker))
+
+class TestResponseCache(unittest.TestCase):
+    ''' Tests caching GET responses in SQLite
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+        self.emulator = SnowEmulator()
+        self.emulator.load('sys_user', [{'name': 'user%d' % num}
+                                        for num in range(10)])
+        self.emulator.load('incident', [{'number': 'INC0001'}])
+        self.client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+        self.cache = self.client.session.start_cache(
+            self.path, table_ttl={'incident': 0})
+        self.users = SnowTable('sys_user', self.client)
+
+    def tearDown(self):
+        self.client.session.stop_cache()
+        shutil.rmtree(self.directory)
+
+    def test_00_hit(self):
+        ''' Verify repeated GETs are answered from the cache, across
+            sessions
+        '''
+        first = self.users.get_records('name=user1')
+        self.assertEqual(self.users.get_records('name=user1'), first)
+        self.assertEqual(self.users.get_records('name=user1',
+                                                fields=['name']),
+                         [{'name': 'user1'}])
+        self.assertEqual(self.emulator.requests, 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+        client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+        client.session.start_cache(self.path)
+        self.assertEqual(SnowTable('sys_user', client).get_records(
+            'name=user1'), first)
+        self.assertEqual(self.emulator.requests, 2)
+
+        # Another user does not share the responses
+        client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'other', 'other'))
+        client.session.start_cache(self.path)
+        SnowTable('sys_user', client).get_records('name=user1')
+        self.assertEqual(self.emulator.requests, 3)
+
+    def test_01_ttl(self):
+        ''' Verify table TTLs and expiry
+        '''
+        now = [1000.0]
+        self.cache.clock = lambda: now[0]
+        incidents = SnowTable('incident', self.client)
+        incidents.get_records('number=INC0001')
+        incidents.get_records('number=INC0001')
+        self.assertEqual(self.emulator.requests, 2)
+
+        self.users.get_records('name=user1')
+        now[0] += 299
+        self.users.get_records('name=user1')
+        self.assertEqual(self.emulator.requests, 3)
+        now[0] += 1
+        self.users.get_records('name=user1')
+        self.assertEqual(self.emulator.requests, 4)
+
+    def test_02_errors(self):
+        ''' Verify errors are not cached
+        '''
+        self.assertEqual(self.users.get_records('bogus'), None)
+        self.assertEqual(self.users.get_records('bogus'), None)
+        self.assertEqual(self.emulator.requests, 2)
+
+    def test_03_eviction(self):
+        ''' Verify the oldest responses are evicted past max_size
+        '''
+        now = [1000.0]
+        self.cache.clock = lambda: now[0]
+        self.cache.max_size = 500
+        for num in range(10):
+            now[0] += 1
+            self.users.get_records('name=user%d' % num)
+        # pylint: disable=protected-access
+        size = self.cache._db().execute(
+            'SELECT TOTAL(size), COUNT(*) FROM responses').fetchone()
+        self.assertTrue(size[0] <= 500)
+        requests = self.emulator.requests
+        self.users.get_records('name=user9')
+        self.users.get_records('name=user0')
+        self.assertEqual(self.emulator.requests, requests + 1)
+        self.cache.invalidate('sys_user')
+        self.users.get_records('name=user9')
+        self.assertEqual(self.emulator.requests, requests + 2)
+
+    def test_04_processes(self):
+        ''' Verify several processes share the database
+        '''
+        workers = [multiprocessing.Process(target=_fill,
+                                           args=(self.path, worker))
+                   for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        # pylint: disable=protected-access
+        count = ResponseCache(self.path)._db().execute(
+            'SELECT COUNT(*) FROM responses').fetchone()[0]
+        self.assertEqual(count, 40)
+
+    def test_05_write_invalidation(self):
+        ''' Verify writes through the session invalidate their table
+        '''
+        self.assertEqual(self.users.get_records('name=user1')[0].get(
+            'email'), None)
+        self.users.update({'email': 'user1@example.com'}, 'name=user1')
+        self.assertEqual(self.users.get_records('name=user1')[0]['email'],
+                         'user1@example.com')
+        self.assertEqual(self.emulator.requests, 3)
+
+    def test_06_running_size(self):
+        ''' Verify the content size is not recounted on every store
+        '''
+        self.users.get_records('name=user0')
+        # pylint: disable=protected-access
+        counted = self.cache._size
+        self.cache.max_size = 10 ** 9
+        self.cache.evict = lambda: self.fail('evicted')
+        for num in range(1, 5):
+            self.users.get_records('name=user%d' % num)
+        self.assertTrue(self.cache._size > counted)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for traffic capture and replay
+'''
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from ServiceNowRac.snow_capture import TrafficCapture, load_capture, \
+    split_url
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_replay import main, replay
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSnowCapture(unittest.TestCase):
+    ''' Tests capturing traffic from SnowSession and replaying it
+    '''
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'capture.log')
+        self.emulator = SnowEmulator()
+        self.client = SnowClient('servicenow-instance', 'admin', 'secret')
+        self.client.session.RETRY_DELAY = 0
+        self.emulator.attach(self.client)
+        self.table = SnowTable('incident', self.client)
+
+    def tearDown(self):
+        self.client.session.stop_capture()
+        shutil.rmtree(self.tmpdir)
+
+    def test_00_split_url(self):
+        ''' Verify table and sysparm are split out of the URL
+        '''
+        self.assertEqual(split_url('https://x.service-now.com/incident.do?'
+                                   'JSONv2&sysparm_action=getKeys'),
+                         ('incident', 'sysparm_action=getKeys'))
+
+    def test_01_capture(self):
+        ''' Verify requests and retries are written to the log
+        '''
+        self.client.session.start_capture(self.filename)
+        self.table.insert({'short_description': 'captured'})
+        self.table.get_keys('active=true')
+        self.emulator.error_rates = {503: 1.0}
+        self.assertRaises(Exception, self.table.get_records, '')
+        self.client.session.stop_capture()
+
+        events = load_capture(self.filename)
+        self.assertEqual(len(events), 2 + self.client.session.MAX_RETRIES)
+        self.assertEqual(events[0]['method'], 'POST')
+        self.assertEqual(events[0]['sysparm'], 'sysparm_action=insert')
+        self.assertGreater(events[0]['out'], 0)
+        self.assertNotIn('body', events[0])
+        self.assertEqual(events[1]['status'], 200)
+        self.assertEqual([event['attempt'] for event in events[2:]],
+                         [1, 2, 3])
+        self.assertEqual(events[-1]['status'], 503)
+        with open(self.filename) as log_file:
+            self.assertNotIn('secret', log_file.read())
+
+    def test_02_capture_bodies(self):
+        ''' Verify bodies are captured only when asked for
+        '''
+        self.client.session.start_capture(self.filename, bodies=True,
+                                          sysparm=False)
+        self.table.insert({'short_description': 'captured'})
+        self.client.session.stop_capture()
+        event = load_capture(self.filename)[0]
+        self.assertEqual(json.loads(event['body']),
+                         {'short_description': 'captured'})
+        self.assertNotIn('sysparm', event)
+
+    def test_03_replay(self):
+        ''' Verify a capture is replayed through a client
+        '''
+        self.client.session.start_capture(self.filename)
+        for _ in range(5):
+            self.table.insert({'short_description': 'captured'})
+            self.table.get_records('short_description=captured')
+        self.client.session.stop_capture()
+
+        emulator = SnowEmulator()
+        client = emulator.attach(SnowClient('replay', 'admin', 'admin'))
+        report = replay(load_capture(self.filename), client, speed=100,
+                        workers=2)
+        self.assertEqual(report['requests'], 10)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(emulator.requests, 10)
+        self.assertEqual(len(emulator.records('incident')), 5)
+
+    def test_04_replay_table_api(self):
+        ''' Verify Table API requests are replayed by method and URL
+        '''
+        client = self.emulator.attach(SnowClient(
+            'servicenow-instance', 'admin', 'secret', api='table'))
+        table = SnowTable('incident', client)
+        client.session.start_capture(self.filename, bodies=True)
+        sys_id = table.insert({'number': 'INC0001'})[0]['sys_id']
+        table.update({'state': '2'}, 'number=INC0001')
+        table.get_records('number=INC0001')
+        table.delete(sys_id)
+        client.session.stop_capture()
+        events = load_capture(self.filename)
+        self.assertTrue(all('path' in event for event in events))
+        methods = set(event['method'] for event in events)
+        self.assertTrue(methods > set(['GET', 'POST', 'DELETE']))
+
+        emulator = SnowEmulator()
+        emulator.load('incident', [{'sys_id': sys_id, 'number': 'INC0001'}])
+        replay_client = emulator.attach(SnowClient('replay', 'admin',
+                                                   'admin'))
+        report = replay(events, replay_client, speed=100, workers=1)
+        self.assertEqual(report['requests'], len(events))
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(emulator.requests, len(events))
+        self.assertEqual(len(emulator.records('incident')), 1)
+
+    def test_05_replay_without_sysparm(self):
+        ''' Verify a capture without sysparm is refused
+        '''
+        self.client.session.start_capture(self.filename, sysparm=False)
+        self.table.get_records('')
+        self.client.session.stop_capture()
+        self.assertRaises(ValueError, replay, load_capture(self.filename),
+                          self.client)
+
+    def test_06_capture_bytes(self):
+        ''' Verify the request size is counted in bytes
+        '''
+        body = u'{"short_description": "caf\u00e9 \u2603"}'
+        capture = TrafficCapture(self.filename, bodies=True)
+        capture.record('POST', 'https://x.service-now.com/incident.do?'
+                       'JSONv2&sysparm_action=insert', body, 200, 0, 0, 0)
+        capture.record('POST', 'https://x.service-now.com/incident.do?'
+                       'JSONv2&sysparm_action=insert', body.encode('utf-8'),
+                       200, 0, 0, 0)
+        capture.close()
+        events = load_capture(self.filename)
+        self.assertEqual([event['out'] for event in events],
+                         [len(body.encode('utf-8'))] * 2)
+        self.assertEqual(events[0]['body'], body)
+
+    def test_07_main_fixture(self):
+        ''' Verify the command line replays against a seeded emulator
+            and refuses an empty one
+        '''
+        self.client.session.start_capture(self.filename)
+        self.table.get_records('number=INC0001')
+        self.client.session.stop_capture()
+        self.assertRaises(SystemExit, main, [self.filename])
+
+        fixture = os.path.join(self.tmpdir, 'tables.json')
+        with open(fixture, 'w') as fixture_file:
+            json.dump({'incident': [{'number': 'INC0001'}]}, fixture_file)
+        self.assertEqual(main([self.filename, '--speed', '100',
+                               '--fixture', fixture]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
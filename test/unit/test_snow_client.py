@@ -31,6 +31,8 @@
 #
 ''' Unit Tests for SnowClient
 '''
+import time
+import threading
 import unittest
 
 from requests.exceptions import HTTPError, TooManyRedirects
@@ -38,6 +40,7 @@ from requests.exceptions import HTTPError, TooManyRedirects
 from httmock import HTTMock
 
 from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator, constant_latency
 from ServiceNowRac.snow_session import MaxRetryError
 
 from test.unit.mock_defs import http_return_302, http_return_404, \
@@ -223,5 +226,99 @@ class TestSnowClient(unittest.TestCase):
                               self.client.post, 'incident',
                               'sysparm_action=insert', DATA)
 
+class TestSnowClientCoalescing(unittest.TestCase):
+    ''' Tests coalescing of identical GETs against the emulator
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator(latency=constant_latency(0.2))
+        self.sys_id = self.emulator.load('incident', [{'number': 'INC1'}])[0]
+        self.client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+
+    def _burst(self, sysparms):
+        results = [None] * len(sysparms)
+
+        def get(index):
+            results[index] = self.client.get('incident', sysparms[index])
+        threads = [threading.Thread(target=get, args=(index,))
+                   for index in range(len(sysparms))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_00_coalesce(self):
+        ''' Verify identical GETs in flight share one request
+        '''
+        sysparm = 'sysparm_sys_id=%s' % self.sys_id
+        results = self._burst([sysparm] * 8 + ['sysparm_action=getKeys'])
+        self.assertEqual(self.emulator.requests, 2)
+        self.assertEqual(self.client.coalesced, 7)
+        self.assertEqual([result[0]['number'] for result in results[:8]],
+                         ['INC1'] * 8)
+        self.assertEqual(results[8], [self.sys_id])
+
+        # Once the request completed the next GET is sent again
+        self.client.get('incident', sysparm)
+        self.assertEqual(self.emulator.requests, 3)
+
+    def test_01_disabled(self):
+        ''' Verify coalescing can be turned off
+        '''
+        self.client.coalesce = False
+        self._burst(['sysparm_sys_id=%s' % self.sys_id] * 4)
+        self.assertEqual((self.emulator.requests, self.client.coalesced),
+                         (4, 0))
+
+    def test_02_error(self):
+        ''' Verify waiters see the exception of the shared request
+        '''
+        self.emulator.error_rates = {404: 1.0}
+        errors = []
+
+        def get():
+            try:
+                self.client.get('incident', 'sysparm_action=getKeys')
+            except HTTPError as error:
+                errors.append(error)
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(self.emulator.requests, 1)
+
+    def test_03_copies(self):
+        ''' Verify coalesced callers get their own copy of the response
+        '''
+        results = self._burst(['sysparm_sys_id=%s' % self.sys_id] * 4)
+        self.assertEqual(self.client.coalesced, 3)
+        results[0][0]['number'] = 'changed'
+        results[1].append({})
+        self.assertEqual([len(result) for result in results[1:]], [2, 1, 1])
+        self.assertEqual([result[0]['number'] for result in results[1:]],
+                         ['INC1'] * 3)
+
+    def test_04_write(self):
+        ''' Verify a GET after a write does not join a GET sent before it
+        '''
+        latencies = [0.6]
+        self.emulator.latency = lambda rand: latencies.pop() \
+            if latencies else 0
+        before = []
+        thread = threading.Thread(target=lambda: before.append(
+            self.client.get('incident', 'sysparm_action=getKeys')))
+        thread.start()
+        time.sleep(0.1)
+        sys_id = self.client.post('incident', 'sysparm_action=insert',
+                                  {'number': 'INC2'})[0]['sys_id']
+        after = self.client.get('incident', 'sysparm_action=getKeys')
+        thread.join()
+        self.assertIn(sys_id, after)
+        self.assertEqual((self.emulator.requests, self.client.coalesced),
+                         (3, 0))
+
 if __name__ == '__main__':
     unittest.main()
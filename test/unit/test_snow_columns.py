@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the columnar results
+'''
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_columns import convert
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_table import SnowTable
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestSnowColumns(unittest.TestCase):
+    ''' Tests get_columns against the emulator
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        self.emulator.load('incident', [{
+            'number': 'INC%04d' % num,
+            'priority': '%d' % (num % 5) if num else '',
+            'active': 'true' if num % 2 else 'false',
+            'opened_at': '2016-01-%02d 10:00:00' % (num + 1),
+            'time_worked': '1970-01-01 00:%02d:00' % num,
+        } for num in range(25)])
+        client = self.emulator.attach(SnowClient('servicenow-instance',
+                                                 'admin', 'admin'))
+        self.table = SnowTable('incident', client)
+
+    def test_00_get_columns(self):
+        ''' Verify records are returned as typed arrays
+        '''
+        fields = ['number', 'priority', 'active', 'opened_at',
+                  'time_worked']
+        columns = self.table.get_columns(
+            '', fields, chunk_size=10,
+            dtypes={'priority': 'int', 'active': 'bool',
+                    'opened_at': 'datetime', 'time_worked': 'duration'})
+        self.assertEqual(sorted(columns), sorted(fields))
+        self.assertEqual(columns['number'].dtype, object)
+        self.assertEqual(sorted(columns['number'])[24], 'INC0024')
+        # Records come back in sys_id order
+        third = list(columns['number']).index('INC0003')
+        self.assertEqual(columns['priority'].dtype, numpy.int64)
+        self.assertEqual(int(columns['priority'].sum()), 50)
+        self.assertEqual(int(columns['active'].sum()), 12)
+        self.assertEqual(columns['opened_at'][third],
+                         numpy.datetime64('2016-01-04T10:00:00'))
+        self.assertEqual(columns['time_worked'][third],
+                         numpy.timedelta64(180, 's'))
+        # 2 getKeys pages and 3 chunks
+        self.assertEqual(self.emulator.requests, 5)
+
+    def test_01_empty_values(self):
+        ''' Verify empty values and empty results
+        '''
+        self.assertTrue(numpy.isnan(convert(['', '1.5'], 'float')[0]))
+        self.assertTrue(numpy.isnat(convert(['', ''], 'datetime')[1]))
+        columns = self.table.get_columns('number=none', ['number'],
+                                         {'number': 'int'})
+        self.assertEqual(len(columns['number']), 0)
+        self.assertRaises(ValueError, self.table.get_columns, '',
+                          ['number'], {'number': 'complex'})
+        self.assertEqual(self.table.get_columns('bogus', ['number']), None)
+
+if __name__ == '__main__':
+    unittest.main()
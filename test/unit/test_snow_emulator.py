@@ -0,0 +1,139 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the ServiceNow emulator
+'''
+import unittest
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator, SnowEmulatorServer, \
+    compile_query
+from ServiceNowRac.snow_session import MaxRetryError
+from ServiceNowRac.snow_table import SnowTable
+
+RECORDS = [
+    {'number': 'INC0001', 'priority': '1', 'state': 'New'},
+    {'number': 'INC0002', 'priority': '3', 'state': 'Closed'},
+    {'number': 'INC0003', 'priority': '10', 'state': 'New'},
+]
+
+class TestSnowEmulator(unittest.TestCase):
+    ''' Tests the emulator through SnowClient and SnowTable
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator(seed=1)
+        self.sys_ids = self.emulator.load('incident', RECORDS)
+        self.client = SnowClient('servicenow-instance', 'admin', 'admin')
+        self.client.session.RETRY_DELAY = 0
+        self.emulator.attach(self.client)
+        self.table = SnowTable('incident', self.client)
+
+    def test_00_get_records_query(self):
+        ''' Verify getRecords filters and orders by the encoded query
+        '''
+        records = self.table.get_records('state=New^ORDERBYDESCpriority')
+        self.assertEqual([rec['number'] for rec in records],
+                         ['INC0003', 'INC0001'])
+
+    def test_01_get_and_get_keys(self):
+        ''' Verify get by sys_id and getKeys
+        '''
+        record = self.table.get(self.sys_ids[1])
+        self.assertEqual(record['number'], 'INC0002')
+        keys = self.table.get_keys('priority>2')
+        self.assertEqual(sorted(keys), sorted(self.sys_ids[1:]))
+
+    def test_02_insert_update_delete(self):
+        ''' Verify writes are applied to the store
+        '''
+        inserted = self.table.insert({'number': 'INC0004'})
+        self.assertEqual(inserted[0]['sys_mod_count'], '0')
+        self.table.insert_multiple([{'number': 'INC0005'},
+                                    {'number': 'INC0006'}])
+        updated = self.table.update({'state': 'Closed'}, 'state=New')
+        self.assertEqual(len(updated), 2)
+        self.assertEqual(updated[0]['sys_mod_count'], '1')
+        self.table.delete(inserted[0]['sys_id'])
+        resp = self.table.delete_multiple('numberININC0005,INC0006')
+        self.assertEqual(resp[0]['count'], 2)
+        self.assertEqual(len(self.emulator.records('incident')), 3)
+
+    def test_03_row_cap(self):
+        ''' Verify reads are truncated to the row cap
+        '''
+        self.emulator.row_cap = 2
+        self.assertEqual(len(self.table.get_records('')), 2)
+
+    def test_04_http_errors(self):
+        ''' Verify injected 503 errors are retried then give up
+        '''
+        self.emulator.error_rates = {503: 1.0}
+        self.assertRaises(MaxRetryError, self.table.get_records, '')
+        self.assertEqual(self.emulator.requests,
+                         self.client.session.MAX_RETRIES)
+
+    def test_05_timeouts(self):
+        ''' Verify injected timeouts are retried then give up
+        '''
+        self.emulator.timeout_rate = 1.0
+        self.assertRaises(MaxRetryError, self.table.get_keys, '')
+
+    def test_06_record_errors(self):
+        ''' Verify partial record errors fail the insert and are not stored
+        '''
+        self.emulator.record_error_rate = 1.0
+        self.assertEqual(self.table.insert({'number': 'INC0004'}), None)
+        self.assertEqual(len(self.emulator.records('incident')), 3)
+
+    def test_07_http_server(self):
+        ''' Verify the emulator served over HTTP on localhost
+        '''
+        with SnowEmulatorServer(self.emulator) as server:
+            client = SnowClient('servicenow-instance', 'admin', 'admin')
+            server.attach(client)
+            table = SnowTable('incident', client)
+            self.assertEqual(len(table.get_records('priority<=3')), 2)
+            self.assertEqual(len(table.insert({'number': 'INC0004'})), 1)
+
+    def test_08_compile_query(self):
+        ''' Verify encoded query operators
+        '''
+        record = {'a': 'foo', 'b': '', 'c': '5'}
+        cases = [('a=foo', True), ('a!=foo', False), ('aSTARTSWITHf', True),
+                 ('aENDSWITHx', False), ('aLIKEo', True), ('bISEMPTY', True),
+                 ('aISNOTEMPTY^c>4', True), ('c>=6^ORa=foo', True),
+                 ('c<5^NQa=foo', True), ('aNOT INfoo,bar', False)]
+        for query, expected in cases:
+            self.assertEqual(compile_query(query)[0](record), expected, query)
+        self.assertRaises(ValueError, compile_query, 'A?B')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for lazy record decoding
+'''
+import json
+import threading
+import unittest
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_lazy import lazy_records, split_records
+from ServiceNowRac.snow_table import SnowTable
+
+RECORDS = [
+    {'number': 'INC1', 'short_description': 'brace } and "quote" \\ {'},
+    {'number': 'INC2', 'caller_id': {'link': 'x', 'value': 'abc'},
+     'description': u'caf\xe9'},
+    {},
+]
+
+class TestSnowLazy(unittest.TestCase):
+    ''' Tests splitting responses and LazyRecord
+    '''
+    def test_00_split(self):
+        ''' Verify responses are split into the byte ranges of records
+        '''
+        content = json.dumps({'records': RECORDS}).encode('utf-8')
+        spans = split_records(content)
+        self.assertEqual([json.loads(content[start:end].decode('utf-8'))
+                          for start, end, _ in spans], RECORDS)
+        self.assertEqual([flat for _, _, flat in spans], [True, False, True])
+        compact = json.dumps({'result': RECORDS},
+                             separators=(',', ':')).encode('utf-8')
+        self.assertEqual(len(split_records(compact, 'result')), 3)
+        self.assertEqual(split_records(b'{"records": []}'), [])
+        self.assertEqual(split_records(b'{"error": "Invalid"}'), None)
+        self.assertEqual(split_records(b'{"records": ["a", "b"]}'), None)
+        self.assertEqual(split_records(b'{"records": [{"a": "b"'), None)
+
+    def test_01_lazy_record(self):
+        ''' Verify fields are decoded on access
+        '''
+        content = json.dumps({'records': RECORDS}).encode('utf-8')
+        first, second, third = lazy_records(content)
+        self.assertEqual(first['short_description'],
+                         RECORDS[0]['short_description'])
+        self.assertRaises(KeyError, lambda: first['state'])
+        self.assertFalse(first.decoded())
+        self.assertEqual(dict(first), RECORDS[0])
+        self.assertTrue(first.decoded())
+        self.assertEqual(second['caller_id'], {'link': 'x', 'value': 'abc'})
+        self.assertEqual(second['description'], u'caf\xe9')
+        self.assertEqual(len(third), 0)
+
+        first = lazy_records(content, fields=['number'])[0]
+        self.assertEqual(first['number'], 'INC1')
+        self.assertRaises(KeyError, lambda: first['short_description'])
+        self.assertEqual(dict(first), {'number': 'INC1'})
+
+    def test_02_get_records(self):
+        ''' Verify get_records(lazy=True) with both backends
+        '''
+        emulator = SnowEmulator()
+        emulator.load('incident', [{'number': 'INC%04d' % num,
+                                    'state': '%d' % (num % 3)}
+                                   for num in range(30)])
+        for api in ('JSONv2', 'table'):
+            client = emulator.attach(SnowClient('servicenow-instance',
+                                                'admin', 'admin', api=api))
+            table = SnowTable('incident', client)
+            records = table.get_records('state=1^ORDERBYnumber', lazy=True)
+            self.assertEqual([record['number'] for record in records],
+                             ['INC%04d' % num for num in range(1, 30, 3)])
+            self.assertFalse(any(record.decoded() for record in records))
+            self.assertEqual(table.get_records('bogus', lazy=True), None)
+
+    def test_03_shared_records(self):
+        ''' Verify records can be read and decoded by several threads
+        '''
+        content = json.dumps({'records': [
+            {'number': 'INC%04d' % num, 'state': '1'}
+            for num in range(2000)]}).encode('utf-8')
+        records = lazy_records(content)
+        errors = []
+
+        def read():
+            ''' Mix field reads with full decodes.
+            '''
+            try:
+                for num, record in enumerate(records):
+                    if num % 3 == 0:
+                        dict(record)
+                    self.assertEqual(record['number'], 'INC%04d' % num)
+                    self.assertEqual(record['state'], '1')
+            except Exception as error:   # pylint: disable=broad-except
+                errors.append(error)
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
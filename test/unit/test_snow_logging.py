@@ -0,0 +1,91 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the logging setup
+'''
+import logging
+import unittest
+
+from ServiceNowRac import snow_logging
+from ServiceNowRac.snow_logging import QueueHandler
+from ServiceNowRac.snow_client import SnowClient
+
+class ListHandler(logging.Handler):
+    ''' Handler that keeps the records it has handled.
+    '''
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class TestSnowLogging(unittest.TestCase):
+    ''' Tests the process wide logging setup
+    '''
+    def setUp(self):
+        self.log = snow_logging.setup_logging()
+
+    def _queue_handlers(self):
+        return [handler for handler in self.log.handlers
+                if isinstance(handler, QueueHandler)]
+
+    def test_00_single_handler(self):
+        ''' Verify creating many clients attaches a single handler
+        '''
+        for _ in range(10):
+            SnowClient('servicenow-instance', 'admin', 'admin')
+        self.assertEqual(len(self._queue_handlers()), 1)
+
+    def test_01_setup_is_idempotent(self):
+        ''' Verify setup_logging returns the same logger every call
+        '''
+        self.assertIs(snow_logging.setup_logging(), self.log)
+        self.assertEqual(len(self._queue_handlers()), 1)
+
+    def test_02_messages_reach_target(self):
+        ''' Verify messages are delivered through the listener thread
+        '''
+        target = ListHandler()
+        # pylint: disable=protected-access
+        listener = snow_logging._STATE['listener']
+        listener.handlers = listener.handlers + (target,)
+        try:
+            self.log.error('queued %s', 'message')
+            listener.stop()
+            listener.start()
+        finally:
+            listener.handlers = listener.handlers[:-1]
+        self.assertEqual(len(target.records), 1)
+        self.assertEqual(target.records[0].getMessage(), 'queued message')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for read-ahead prefetching
+'''
+import threading
+import time
+import unittest
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator, constant_latency
+from ServiceNowRac.snow_prefetch import prefetch
+from ServiceNowRac.snow_table import SnowTable
+
+class TestPrefetch(unittest.TestCase):
+    ''' Tests prefetch() and SnowTable.iter_records(prefetch=N)
+    '''
+    def test_00_order_and_backpressure(self):
+        ''' Verify items keep their order and at most depth are ahead
+        '''
+        produced = []
+
+        def items():
+            for num in range(10):
+                produced.append(num)
+                yield num
+        iterator = prefetch(items(), depth=2)
+        self.assertEqual(next(iterator), 0)
+        time.sleep(0.2)
+        # One handed out, two queued and one waiting to be queued
+        self.assertTrue(len(produced) <= 4, produced)
+        self.assertEqual(list(iterator), list(range(1, 10)))
+
+    def test_01_errors_and_close(self):
+        ''' Verify errors are raised in the caller and closing stops the
+            thread
+        '''
+        def failing():
+            yield 1
+            raise ValueError('page failed')
+        iterator = prefetch(failing())
+        self.assertEqual(next(iterator), 1)
+        self.assertRaises(ValueError, next, iterator)
+
+        def endless():
+            num = 0
+            while True:
+                num += 1
+                yield num
+        threads = threading.active_count()
+        iterator = prefetch(endless(), depth=1)
+        self.assertEqual(next(iterator), 1)
+        iterator.close()
+        time.sleep(0.3)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_02_iter_records(self):
+        ''' Verify pages are downloaded while the caller processes
+        '''
+        emulator = SnowEmulator(latency=constant_latency(0.05))
+        emulator.load('incident', [{'number': 'INC%04d' % num}
+                                   for num in range(50)])
+        table = SnowTable('incident', emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin')))
+
+        def scan(depth):
+            started = time.time()
+            numbers = []
+            for record in table.iter_records('ORDERBYnumber', chunk_size=5,
+                                             prefetch=depth):
+                numbers.append(record['number'])
+                time.sleep(0.01)
+            return time.time() - started, numbers
+
+        serial, expected = scan(0)
+        overlapped, numbers = scan(2)
+        self.assertEqual(numbers, expected)
+        self.assertEqual(len(numbers), 50)
+        self.assertTrue(overlapped < serial * 0.8, (overlapped, serial))
+        self.assertRaises(RuntimeError, list,
+                          table.iter_records('bogus', prefetch=2))
+
+if __name__ == '__main__':
+    unittest.main()
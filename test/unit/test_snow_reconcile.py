@@ -0,0 +1,133 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for table reconciliation
+'''
+import unittest
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_reconcile import SnowReconciler
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSnowReconcile(unittest.TestCase):
+    ''' Tests reconciling a local copy against an emulated table
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        self.emulator.add_view('incident', 'reconcile',
+                               ['sys_id', 'sys_mod_count'])
+        client = self.emulator.attach(SnowClient('servicenow-instance',
+                                                 'admin', 'admin'))
+        self.table = SnowTable('incident', client)
+        self.table.insert_multiple([{'number': 'INC%04d' % num,
+                                     'description': 'x' * 100}
+                                    for num in range(300)])
+        self.local = dict((rec['sys_id'], rec['sys_mod_count'])
+                          for rec in self.emulator.records('incident'))
+        self.reconciler = SnowReconciler(self.table,
+                                         version_field='sys_mod_count',
+                                         view='reconcile', leaf_size=8)
+
+    def test_00_no_drift(self):
+        ''' Verify an identical copy reports no drift
+        '''
+        drift = self.reconciler.reconcile(self.local)
+        self.assertEqual((drift['missing'], drift['extra'], drift['changed'],
+                          drift['buckets']), ([], [], [], 0))
+        self.assertEqual(drift['requests'], 16)
+
+    def test_01_drift(self):
+        ''' Verify changed, deleted and added records are found
+        '''
+        keys = sorted(self.local)
+        self.table.update({'state': '2'}, 'sys_idIN%s' % ','.join(keys[:3]))
+        self.table.delete(keys[3])
+        added = self.table.insert({'number': 'INC9999'})[0]['sys_id']
+        self.local['f' * 32] = '0'
+
+        drift = self.reconciler.reconcile(self.local)
+        self.assertEqual(drift['changed'], keys[:3])
+        self.assertEqual(drift['missing'], [added])
+        self.assertEqual(sorted(drift['extra']), sorted([keys[3], 'f' * 32]))
+
+    def test_02_view_projection(self):
+        ''' Verify only the view fields are fetched
+        '''
+        records = self.table.get_records('', view='reconcile')
+        self.assertEqual(sorted(records[0].keys()),
+                         ['sys_id', 'sys_mod_count'])
+
+    def test_03_row_cap_paging(self):
+        ''' Verify a leaf larger than the row cap is read page by page
+        '''
+        self.emulator.row_cap = self.reconciler.row_cap = 5
+        self.reconciler.leaf_size = 64
+        keys = sorted(self.local)
+        self.table.update({'state': '2'}, 'sys_id=%s' % keys[-1])
+        drift = self.reconciler.reconcile(self.local)
+        self.assertEqual(drift['changed'], [keys[-1]])
+        self.assertEqual((drift['missing'], drift['extra']), ([], []))
+        leaf = len([key for key in keys if key[0] == keys[-1][0]])
+        self.assertEqual(drift['requests'], 16 + leaf // 5 + 1)
+
+    def test_04_request_failure(self):
+        ''' Verify a failed fetch returns None
+        '''
+        self.reconciler.query = 'bad?query'
+        self.assertEqual(self.reconciler.reconcile(self.local), None)
+
+    def test_05_fields(self):
+        ''' Verify a view is required with JSONv2 but not the Table API
+        '''
+        self.assertRaises(ValueError, SnowReconciler, self.table)
+        table = SnowTable('incident', self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin',
+                       api='table')))
+        reconciler = SnowReconciler(table, version_field='sys_mod_count',
+                                    leaf_size=8)
+        self.assertEqual(reconciler.reconcile(self.local)['buckets'], 0)
+
+    def test_06_summaries(self):
+        ''' Verify only the records of differing leaves are downloaded
+        '''
+        keys = sorted(self.local)
+        self.table.update({'state': '2'}, 'sys_id=%s' % keys[0])
+        requests = self.emulator.requests
+        drift = self.reconciler.reconcile(self.local)
+        self.assertEqual(drift['changed'], [keys[0]])
+        # Top level and second level summaries, then one leaf
+        self.assertEqual(drift['requests'], 16 + 16 + 1)
+        self.assertEqual(self.emulator.requests - requests, 16 + 16 + 1)
+        self.assertEqual(drift['buckets'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the compact record representation
+'''
+import json
+import unittest
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from ServiceNowRac.snow_records import RecordSchema, SnowRecords
+
+def _record(num):
+    record = dict(('u_field_%03d' % field, ['true', '', 'x%d' % (num % 7)]
+                   [field % 3]) for field in range(150))
+    record.update({'sys_id': '%032x' % num, 'number': 'INC%07d' % num})
+    return record
+
+class TestSnowRecords(unittest.TestCase):
+    ''' Tests SnowRecords and SnowRecord
+    '''
+    def test_00_mapping(self):
+        ''' Verify records behave as read-only mappings
+        '''
+        records = SnowRecords([{'number': 'INC1', 'state': '1'},
+                               {'state': '2', 'priority': '3'}])
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records.schema.fields,
+                         ('number', 'state', 'priority'))
+        first, second = records
+        self.assertEqual(first['number'], 'INC1')
+        self.assertEqual(dict(first), {'number': 'INC1', 'state': '1'})
+        self.assertEqual(first.get('priority'), None)
+        self.assertRaises(KeyError, lambda: second['number'])
+        self.assertFalse('number' in second)
+        self.assertEqual(sorted(second), ['priority', 'state'])
+        self.assertEqual(len(second), 2)
+        self.assertEqual(records[-1].to_dict(), {'state': '2',
+                                                 'priority': '3'})
+        self.assertEqual(records[1:].to_dicts(), [dict(second)])
+
+        def assign():
+            ''' Records are read-only.
+            '''
+            first['state'] = '2'
+        self.assertRaises(TypeError, assign)
+
+    def test_01_shared_schema(self):
+        ''' Verify result sets can share one schema and interned names
+        '''
+        schema = RecordSchema(['sys_id'])
+        first = SnowRecords([{'sys_id': 'a', 'number': 'INC1'}], schema)
+        second = SnowRecords([{'number': 'INC2', 'sys_id': 'b'}], schema)
+        self.assertEqual(schema.fields, ('sys_id', 'number'))
+        self.assertEqual(dict(first[0]), {'sys_id': 'a', 'number': 'INC1'})
+        self.assertEqual(dict(second[0]), {'sys_id': 'b', 'number': 'INC2'})
+        # Rows added before a field was known do not have it
+        third = second.append({'sys_id': 'c', 'state': '1'})
+        self.assertEqual(dict(third), {'sys_id': 'c', 'state': '1'})
+        self.assertEqual(dict(first[0]), {'sys_id': 'a', 'number': 'INC1'})
+
+    @unittest.skipIf(tracemalloc is None, 'tracemalloc is not available')
+    def test_02_memory(self):
+        ''' Verify a large result set takes several times less memory
+        '''
+        content = json.dumps([_record(num) for num in range(1000)])
+        tracemalloc.start()
+        try:
+            records = json.loads(content)
+            plain = tracemalloc.get_traced_memory()[0]
+            del records
+            start = tracemalloc.get_traced_memory()[0]
+            records = SnowRecords(json.loads(content))
+            compact = tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(records[999], _record(999))
+        self.assertTrue(plain > 3 * compact, (plain, compact))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for bulk reference resolution
+'''
+import unittest
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_references import SnowReferences
+
+REFERENCES = {
+    'assigned_to': ('sys_user', ['name', 'email']),
+    'caller_id': ('sys_user', ['name']),
+    'assignment_group': ('sys_user_group', ['name'], 'compact'),
+}
+
+class TestSnowReferences(unittest.TestCase):
+    ''' Tests resolving references against the emulator
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        self.emulator.add_view('sys_user_group', 'compact',
+                               ['sys_id', 'name'])
+        self.users = self.emulator.load('sys_user', [
+            {'name': 'User %d' % num, 'email': 'user%d@example.com' % num}
+            for num in range(30)])
+        self.groups = self.emulator.load('sys_user_group', [
+            {'name': 'Group %d' % num, 'manager': 'x'} for num in range(3)])
+        self.records = [{'number': 'INC%04d' % num,
+                         'assigned_to': self.users[num % 30],
+                         'caller_id': self.users[(num + 1) % 30],
+                         'assignment_group': self.groups[num % 3]}
+                        for num in range(300)]
+        self.records[0]['assigned_to'] = ''
+        self.records[1]['assigned_to'] = 'f' * 32
+        client = self.emulator.attach(SnowClient('servicenow-instance',
+                                                 'admin', 'admin'))
+        self.refs = SnowReferences(client, chunk_size=20)
+
+    def test_00_resolve(self):
+        ''' Verify references are resolved with a few bulk requests
+        '''
+        records = self.refs.resolve_references(self.records, REFERENCES)
+        self.assertEqual(records[2]['assigned_to.name'], 'User 2')
+        self.assertEqual(records[2]['assigned_to.email'],
+                         'user2@example.com')
+        self.assertEqual(records[2]['caller_id.name'], 'User 3')
+        self.assertEqual(records[4]['assignment_group.name'], 'Group 1')
+        self.assertEqual(records[0]['assigned_to.name'], '')
+        self.assertEqual(records[1]['assigned_to.email'], '')
+        # 31 user sys_ids in chunks of 20 plus one group fetch
+        self.assertEqual(self.emulator.requests, 3)
+
+    def test_01_cache(self):
+        ''' Verify cached references are not fetched again
+        '''
+        self.refs.resolve_references(self.records, REFERENCES)
+        self.refs.resolve_references(self.records, REFERENCES)
+        self.assertEqual(self.emulator.requests, 3)
+
+    def test_02_cache_view(self):
+        ''' Verify a record fetched through a view does not serve a target
+            needing other fields
+        '''
+        self.emulator.add_view('sys_user', 'short', ['sys_id', 'name'])
+        self.refs.resolve_references(self.records, {
+            'caller_id': ('sys_user', ['name'], 'short')})
+        records = self.refs.resolve_references(self.records, {
+            'assigned_to': ('sys_user', ['name', 'email'])})
+        self.assertEqual(records[2]['assigned_to.email'],
+                         'user2@example.com')
+
+    def test_03_request_failure(self):
+        ''' Verify a failed fetch returns None
+        '''
+        self.refs.client.get = lambda table, sysparm: None
+        self.assertEqual(self.refs.resolve_references(self.records,
+                                                      REFERENCES), None)
+        self.assertNotIn('assigned_to.name', self.records[2])
+
+    def test_04_fields(self):
+        ''' Verify only the requested fields are fetched and cached
+        '''
+        self.refs.resolve_references(self.records, REFERENCES)
+        users = [record for key, record in self.refs.cache.items()
+                 if key[0] == 'sys_user' and record is not None]
+        self.assertEqual(sorted(users[0].keys()), ['email', 'name', 'sys_id'])
+        # Another field set is fetched again
+        self.refs.resolve_references(self.records, {
+            'caller_id': ('sys_user', ['email'])})
+        self.assertEqual(self.emulator.requests, 5)
+
+    def test_05_max_records(self):
+        ''' Verify the cache is bounded
+        '''
+        refs = SnowReferences(self.refs.client, chunk_size=20,
+                              max_records=10)
+        records = refs.resolve_references(self.records, REFERENCES)
+        self.assertEqual(len(refs.cache), 10)
+        self.assertEqual(records[2]['assigned_to.email'],
+                         'user2@example.com')
+        self.assertEqual(records[29]['caller_id.name'], 'User 0')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# pylint: disable=wrong-import-position
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the table schema cache
+'''
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+import datetime
+import shutil
+import tempfile
+import unittest
+
+from testlib import FakeClock
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_schema import SnowSchema
+from ServiceNowRac.snow_table import SnowTable
+
+def _element(table, element, internal_type, max_length='40', **extra):
+    record = {'name': table, 'element': element,
+              'internal_type': internal_type, 'max_length': max_length,
+              'mandatory': 'false', 'default_value': ''}
+    record.update(extra)
+    return record
+
+class TestSnowSchema(unittest.TestCase):
+    ''' Tests loading, caching and using table metadata
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        task = self.emulator.load('sys_db_object', [
+            {'name': 'task', 'super_class': ''}])[0]
+        self.emulator.load('sys_db_object', [
+            {'name': 'incident', 'super_class': task}])
+        self.emulator.load('sys_dictionary', [
+            _element('task', 'number', 'string', default_value='INC'),
+            _element('task', 'short_description', 'string', '20',
+                     mandatory='true'),
+            _element('task', 'state', 'integer'),
+            _element('task', 'active', 'boolean'),
+            _element('task', 'opened_at', 'glide_date_time'),
+            _element('task', 'business_duration', 'glide_duration'),
+            _element('incident', 'state', 'integer'),
+            _element('incident', 'severity', 'integer'),
+            _element('incident', 'caller_id', 'reference', '32'),
+        ])
+        self.emulator.load('sys_choice', [
+            {'name': 'incident', 'element': 'severity', 'value': value,
+             'inactive': 'false'} for value in ('1', '2', '3')])
+        self.client = self.emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin'))
+        self.clock = FakeClock()
+        self.cache_dir = tempfile.mkdtemp()
+        self.schema = SnowSchema(self.client, cache_dir=self.cache_dir,
+                                 ttl=3600, clock=self.clock)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_00_fields(self):
+        ''' Verify fields are loaded with the inherited ones
+        '''
+        fields = self.schema.fields('incident')
+        self.assertEqual(sorted(fields), [
+            'active', 'business_duration', 'caller_id', 'number',
+            'opened_at', 'severity', 'short_description', 'state'])
+        self.assertEqual(fields['severity']['choices'], ['1', '2', '3'])
+        self.assertEqual(fields['short_description']['max_length'], 20)
+        self.assertTrue(fields['short_description']['mandatory'])
+        self.assertEqual(self.schema.fields('nosuchtable'), {})
+
+    def test_01_cache(self):
+        ''' Verify the metadata is cached in memory and on disk with a TTL
+        '''
+        self.schema.fields('incident')
+        requests = self.emulator.requests
+        self.schema.fields('incident')
+        self.assertEqual(self.emulator.requests, requests)
+
+        other = SnowSchema(self.client, cache_dir=self.cache_dir,
+                           ttl=3600, clock=self.clock)
+        self.assertEqual(other.fields('incident'),
+                         self.schema.fields('incident'))
+        self.assertEqual(self.emulator.requests, requests)
+
+        self.clock.now += 3600
+        other.fields('incident')
+        self.assertTrue(self.emulator.requests > requests)
+        requests = self.emulator.requests
+        other.invalidate('incident')
+        self.schema.invalidate()
+        self.schema.fields('incident')
+        self.assertTrue(self.emulator.requests > requests)
+
+    def test_02_coerce(self):
+        ''' Verify records are converted to Python types
+        '''
+        record = self.schema.coerce('incident', {
+            'number': 'INC0001', 'state': '2', 'active': 'true',
+            'severity': '', 'opened_at': '2016-01-01 10:00:00',
+            'business_duration': '1970-01-02 01:00:00', 'other': 'x'})
+        self.assertEqual(record, {
+            'number': 'INC0001', 'state': 2, 'active': True,
+            'severity': None,
+            'opened_at': datetime.datetime(2016, 1, 1, 10),
+            'business_duration': datetime.timedelta(days=1, hours=1),
+            'other': 'x'})
+
+        table = SnowTable('incident', self.client, schema=self.schema)
+        self.emulator.load('incident', [{'number': 'INC1', 'state': '3'}])
+        records = table.get_records('number=INC1', coerce=True)
+        self.assertEqual(records[0]['state'], 3)
+
+    def test_03_validate(self):
+        ''' Verify invalid payloads are rejected without a request
+        '''
+        self.assertEqual(self.schema.validate('incident', {
+            'short_description': 'x' * 21, 'severity': '4', 'state': 'new',
+            'active': True, 'bogus': '1'}), [
+                'bogus: unknown field', 'severity: 4 is not a choice',
+                'short_description: longer than 20',
+                'state: new is not a valid integer'])
+        self.assertEqual(self.schema.validate('incident', {'state': '2'},
+                                              insert=True),
+                         ['short_description: mandatory'])
+
+        table = SnowTable('incident', self.client, schema=self.schema)
+        self.schema.fields('incident')
+        requests = self.emulator.requests
+        self.assertEqual(table.insert({'state': 'new'}), None)
+        self.assertEqual(table.insert_multiple([
+            {'short_description': 'ok'}, {'severity': '9'}]), None)
+        self.assertEqual(table.update({'severity': '9'}, 'state=1'), None)
+        self.assertEqual(self.emulator.requests, requests)
+        inserted = table.insert({'short_description': 'ok', 'state': '1'})
+        self.assertEqual(inserted[0]['short_description'], 'ok')
+
+if __name__ == '__main__':
+    unittest.main()
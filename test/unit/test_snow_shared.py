@@ -0,0 +1,206 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the cross-process record cache
+'''
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from ServiceNowRac.snow_bulk import SnowBulk
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_shared import SharedRecordCache
+from ServiceNowRac.snow_table import SnowTable
+
+def _worker(path, worker, results):
+    ''' Write records and read the ones of the other workers.
+    '''
+    cache = SharedRecordCache(path, buckets=64)
+    for num in range(50):
+        cache.put('incident', {'sys_id': '%d-%d' % (worker, num),
+                               'number': 'INC%d' % num})
+    results.put(worker)
+
+class TestSharedRecordCache(unittest.TestCase):
+    ''' Tests the memory-mapped record cache
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'records')
+        self.now = [1000.0]
+        self.cache = SharedRecordCache(self.path, buckets=16, ways=2,
+                                       slot_size=512, ttl=60,
+                                       clock=lambda: self.now[0])
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_00_get_put(self):
+        ''' Verify records are stored, expire and can be deleted
+        '''
+        record = {'sys_id': 'a' * 32, 'number': 'INC0001'}
+        self.assertTrue(self.cache.put('incident', record))
+        self.assertEqual(self.cache.get('incident', 'a' * 32), record)
+        self.assertEqual(self.cache.get('problem', 'a' * 32), None)
+        self.assertFalse(self.cache.put('incident', {'sys_id': 'b',
+                                                     'text': 'x' * 512}))
+        self.assertEqual(self.cache.rejected, 1)
+        self.cache.delete('incident', 'a' * 32)
+        self.assertEqual(self.cache.get('incident', 'a' * 32), None)
+        self.cache.put('incident', record)
+        self.now[0] += 60
+        self.assertEqual(self.cache.get('incident', 'a' * 32), None)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+
+    def test_01_lru(self):
+        ''' Verify a full bucket evicts its least recently used record
+        '''
+        # Find three keys of one bucket
+        # pylint: disable=protected-access
+        keys = [str(num) for num in range(200)
+                if self.cache._bucket(self.cache._key('t', str(num)))[0] ==
+                self.cache._bucket(self.cache._key('t', '0'))[0]][:3]
+        for key in keys[:2]:
+            self.now[0] += 1
+            self.cache.put('t', {'sys_id': key})
+        self.now[0] += 1
+        self.cache.get('t', keys[0])
+        self.cache.put('t', {'sys_id': keys[2]})
+        self.assertEqual(self.cache.get('t', keys[1]), None)
+        self.assertEqual(self.cache.get('t', keys[0]), {'sys_id': keys[0]})
+        self.assertEqual(self.cache.get('t', keys[2]), {'sys_id': keys[2]})
+        self.cache.clear()
+        self.assertEqual(self.cache.get('t', keys[0]), None)
+
+    def test_02_processes(self):
+        ''' Verify records written by other processes are shared
+        '''
+        path = os.path.join(self.directory, 'shared')
+        cache = SharedRecordCache(path, buckets=64)
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_worker,
+                                           args=(path, worker, results))
+                   for worker in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        found = cache.get_many('incident', ['%d-%d' % (worker, num)
+                                            for worker in range(4)
+                                            for num in range(50)])
+        self.assertEqual(len(found), 200)
+        cache.close()
+
+    def test_03_table(self):
+        ''' Verify SnowTable reads go through the cache
+        '''
+        emulator = SnowEmulator()
+        sys_ids = emulator.load('incident', [{'number': 'INC%04d' % num}
+                                             for num in range(10)])
+        client = emulator.attach(SnowClient('servicenow-instance', 'admin',
+                                            'admin'))
+        cache = SharedRecordCache(os.path.join(self.directory, 'table'),
+                                  buckets=64)
+        table = SnowTable('incident', client, cache=cache)
+        other = SnowTable('incident', client, cache=cache)
+        self.assertEqual(table.get(sys_ids[0])['number'], 'INC0000')
+        self.assertEqual(other.get(sys_ids[0])['number'], 'INC0000')
+        self.assertEqual(emulator.requests, 1)
+
+        records = other.get_multiple(sys_ids[:5], chunk_size=2)
+        self.assertEqual(sorted(record['number'] for record in records),
+                         ['INC%04d' % num for num in range(5)])
+        # sys_ids 1 to 4 in two chunks
+        self.assertEqual(emulator.requests, 3)
+        self.assertEqual(len(table.get_multiple(sys_ids[:5])), 5)
+        self.assertEqual(emulator.requests, 3)
+
+        table.update({'state': '2'}, 'sys_id=%s' % sys_ids[0])
+        self.assertEqual(other.get(sys_ids[0])['state'], '2')
+        self.assertFalse('__status' in other.get(sys_ids[0]))
+        table.delete(sys_ids[1])
+        self.assertEqual(other.get(sys_ids[1]), None)
+        cache.close()
+
+    def test_04_geometry(self):
+        ''' Verify a file of another geometry is refused, not reset
+        '''
+        self.cache.put('incident', {'sys_id': 'a'})
+        self.assertRaises(ValueError, SharedRecordCache, self.path,
+                          buckets=32, ways=2, slot_size=512)
+        other = SharedRecordCache(self.path, buckets=16, ways=2,
+                                  slot_size=512, clock=self.cache.clock)
+        self.assertEqual(other.get('incident', 'a'), {'sys_id': 'a'})
+        other.close()
+
+        record = dict(('u_field_%03d' % num, 'value %d' % num)
+                      for num in range(150))
+        record['sys_id'] = 'b' * 32
+        cache = SharedRecordCache(os.path.join(self.directory, 'default'))
+        self.assertTrue(cache.put('incident', record))
+        cache.close()
+
+    def test_05_writes_elsewhere(self):
+        ''' Verify readers that need current records bypass the cache and
+            bulk deletes drop their records from it
+        '''
+        emulator = SnowEmulator()
+        sys_ids = emulator.load('incident', [{'number': 'INC%04d' % num}
+                                             for num in range(10)])
+        client = emulator.attach(SnowClient('servicenow-instance', 'admin',
+                                            'admin'))
+        table = SnowTable('incident', client, cache=self.cache)
+        self.assertEqual(len(table.get_multiple(sys_ids)), 10)
+        # Changed by another client
+        SnowTable('incident', client).update({'state': '2'},
+                                             'sys_id=%s' % sys_ids[0])
+        self.assertEqual(table.get(sys_ids[0]).get('state'), None)
+        records = table.get_multiple(sys_ids[:1], use_cache=False)
+        self.assertEqual(records[0]['state'], '2')
+        self.assertEqual(table.get(sys_ids[0])['state'], '2')
+        SnowTable('incident', client).update({'state': '3'},
+                                             'sys_id=%s' % sys_ids[5])
+        watch = table.watch('', since='2000-01-01 00:00:00')
+        changed = dict((record['sys_id'], record) for record in watch.poll())
+        self.assertEqual(changed[sys_ids[5]]['state'], '3')
+
+        table.delete_multiple('number=INC0001')
+        self.assertEqual(table.get(sys_ids[1]), None)
+        SnowBulk(table, chunk_size=3).delete('numberININC0002,INC0003')
+        self.assertEqual(table.get_multiple(sys_ids[2:4]), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the table snapshots
+'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_snapshot import SnowSnapshot, SnowSnapshotWriter
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSnowSnapshot(unittest.TestCase):
+    ''' Tests writing and reading snapshots
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'incident.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_00_table_snapshot(self):
+        ''' Verify a table is saved and looked up by sys_id
+        '''
+        emulator = SnowEmulator()
+        sys_ids = emulator.load('incident', [
+            {'number': 'INC%04d' % num, 'description': u'line\nbreak \xe9'}
+            for num in range(50)])
+        table = SnowTable('incident', emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin')))
+        self.assertEqual(table.snapshot(self.path, chunk_size=20), 50)
+
+        with SnowSnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 50)
+            for num, sys_id in enumerate(sys_ids):
+                record = snapshot.get(sys_id)
+                self.assertEqual(record['number'], 'INC%04d' % num)
+                self.assertEqual(record['description'], u'line\nbreak \xe9')
+            self.assertEqual(snapshot.get('f' * 32), None)
+            self.assertFalse('f' * 32 in snapshot)
+            self.assertEqual(sorted(record['sys_id'] for record in snapshot),
+                             sorted(sys_ids))
+            lines = list(snapshot.iter_raw())
+            if sys.version_info[0] > 2:
+                self.assertTrue(isinstance(lines[0], memoryview))
+            self.assertEqual(len(lines), 50)
+            del lines
+        # A failed snapshot leaves the previous one in place
+        self.assertEqual(table.snapshot(self.path, 'bogus'), None)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['incident.ndjson', 'incident.ndjson.idx'])
+        with SnowSnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 50)
+
+    def test_01_writer(self):
+        ''' Verify records without sys_id and empty snapshots
+        '''
+        with SnowSnapshotWriter(self.path) as writer:
+            writer.write({'sys_id': 'a', 'number': '1'})
+            writer.write({'number': '2'})
+            self.assertRaises(ValueError, writer.write, {'sys_id': 'x' * 33})
+        with SnowSnapshot(self.path) as snapshot:
+            self.assertEqual(snapshot.get('a'), {'sys_id': 'a',
+                                                 'number': '1'})
+            self.assertEqual(len(list(snapshot)), 2)
+
+        with SnowSnapshotWriter(self.path):
+            pass
+        with SnowSnapshot(self.path) as snapshot:
+            self.assertEqual((len(snapshot), list(snapshot)), (0, []))
+            self.assertEqual(snapshot.get('a'), None)
+
+        def fail():
+            ''' Leave a writer on an exception.
+            '''
+            with SnowSnapshotWriter(self.path) as writer:
+                writer.write({'sys_id': 'b', 'number': '3'})
+                raise KeyError('b')
+        self.assertRaises(KeyError, fail)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['incident.ndjson', 'incident.ndjson.idx'])
+        with SnowSnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 0)
+
+    def test_02_mismatched_index(self):
+        ''' Verify an index is not paired with another data file
+        '''
+        with SnowSnapshotWriter(self.path) as writer:
+            writer.write({'sys_id': 'a', 'number': '1'})
+        shutil.copy(self.path + '.idx', self.path + '.old')
+        with SnowSnapshotWriter(self.path) as writer:
+            writer.write({'sys_id': 'a', 'number': '12'})
+        with SnowSnapshot(self.path, verify=True) as snapshot:
+            self.assertEqual(snapshot.get('a')['number'], '12')
+
+        # The data file renamed, the index not yet
+        os.rename(self.path + '.old', self.path + '.idx')
+        self.assertRaises(ValueError, SnowSnapshot, self.path)
+        with SnowSnapshotWriter(self.path) as writer:
+            writer.write({'sys_id': 'a', 'number': '3'})
+        with open(self.path, 'r+b') as data:
+            data.write(b'{"number":"4"')
+        with SnowSnapshot(self.path) as snapshot:
+            self.assertEqual(snapshot.get('a')['number'], '4')
+        self.assertRaises(ValueError, SnowSnapshot, self.path, True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the memory-bounded results
+'''
+import json
+import unittest
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_spill import SpillRecords, record_size
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSpillRecords(unittest.TestCase):
+    ''' Tests SpillRecords and SnowTable.get_records_bounded
+    '''
+    def test_00_spill(self):
+        ''' Verify records past the budget go to disk
+        '''
+        records = [{'number': 'INC%04d' % num, 'state': '1'}
+                   for num in range(100)]
+        size = record_size(records[0])
+        with SpillRecords(max_memory=size * 10) as spill:
+            spill.extend(records[:50])
+            self.assertEqual((spill.memory, spill.spilled), (size * 10, 40))
+            self.assertEqual(spill[5], records[5])
+            self.assertEqual(spill[45], records[45])
+            # Appending after reading keeps both in order
+            spill.extend(records[50:])
+            self.assertEqual(len(spill), 100)
+            self.assertEqual(list(spill), records)
+            self.assertEqual(spill[-1], records[-1])
+            self.assertRaises(IndexError, spill.__getitem__, 100)
+        self.assertEqual(len(spill), 0)
+
+    def test_01_in_memory(self):
+        ''' Verify no file is created below the budget
+        '''
+        spill = SpillRecords()
+        spill.append({'number': 'INC0001'})
+        self.assertEqual((len(spill), spill.spilled), (1, 0))
+        self.assertEqual(list(spill), [{'number': 'INC0001'}])
+        spill.close()
+
+    @unittest.skipIf(tracemalloc is None, 'tracemalloc is not available')
+    def test_01_resident_size(self):
+        ''' Verify the budget bounds the memory held by wide records
+        '''
+        line = json.dumps(dict(('u_field_%03d' % num, 'value %d' % num)
+                               for num in range(150)))
+        max_memory = 2 * 1024 * 1024
+        tracemalloc.start()
+        try:
+            spill = SpillRecords(max_memory=max_memory)
+            spill.extend(json.loads(line) for _ in range(500))
+            used = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(spill.spilled, 0)
+        self.assertLess(used, max_memory * 1.25)
+        spill.close()
+
+    def test_02_get_records_bounded(self):
+        ''' Verify a table read into a bounded container
+        '''
+        emulator = SnowEmulator()
+        emulator.load('incident', [{'number': 'INC%04d' % num}
+                                   for num in range(30)])
+        table = SnowTable('incident', emulator.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin')))
+        records = table.get_records_bounded('',
+                                            max_memory=1000, chunk_size=7)
+        self.assertEqual(len(records), 30)
+        self.assertTrue(records.spilled > 0)
+        self.assertEqual(sorted(record['number'] for record in records),
+                         ['INC%04d' % num for num in range(30)])
+        records.close()
+        self.assertEqual(table.get_records_bounded('bogus'), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# pylint: disable=wrong-import-position
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the SQLite delta sync
+'''
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+import unittest
+
+from testlib import FakeClock
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_sync import SnowSync
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSnowSync(unittest.TestCase):
+    ''' Tests mirroring an emulated table into SQLite
+    '''
+    def setUp(self):
+        self.clock = FakeClock()
+        self.emulator = SnowEmulator()
+        self.emulator.clock = self.clock
+        client = self.emulator.attach(SnowClient('servicenow-instance',
+                                                 'admin', 'admin'))
+        self.table = SnowTable('incident', client)
+        for num in range(5):
+            self.clock.now += 1
+            self.table.insert({'number': 'INC%04d' % num, 'state': '1',
+                               'active': 'true', 'description': 'x'})
+        self.sync = SnowSync(':memory:', reconcile_interval=None)
+        self.sync.add_table(self.table, ['number', 'state'],
+                            query='active=true')
+
+    def tearDown(self):
+        self.sync.close()
+
+    def test_00_initial_sync(self):
+        ''' Verify the first sync mirrors the selected fields
+        '''
+        self.assertEqual(self.sync.sync(), {'incident': 5})
+        records = self.sync.records('incident')
+        self.assertEqual(len(records), 5)
+        self.assertEqual(sorted(records[0].keys()),
+                         ['number', 'state', 'sys_id', 'sys_updated_on'])
+
+    def test_01_delta_sync(self):
+        ''' Verify later syncs only fetch records at or after the watermark
+        '''
+        self.sync.sync()
+        self.clock.now += 60
+        self.table.update({'state': '2'}, 'number=INC0003')
+        requests = self.emulator.requests
+        # The updated record and INC0004 which is at the old watermark
+        self.assertEqual(self.sync.sync_table('incident'), 2)
+        self.assertEqual(self.emulator.requests, requests + 1)
+        self.assertEqual(self.sync.records('incident', 'state = ?', ('2',))
+                         [0]['number'], 'INC0003')
+
+    def test_02_row_cap(self):
+        ''' Verify a truncated result is continued from the new watermark
+        '''
+        self.emulator.row_cap = self.sync.row_cap = 3
+        self.clock.now += 60
+        self.table.update({'state': '3'}, 'number>=INC0003')
+        self.sync.sync_table('incident')
+        self.assertEqual(len(self.sync.records('incident')), 5)
+
+    def test_03_reconcile(self):
+        ''' Verify deleted and no longer matching records are removed
+        '''
+        self.sync.sync()
+        self.table.delete_multiple('number=INC0000')
+        self.table.update({'active': 'false'}, 'number=INC0001')
+        self.assertEqual(self.sync.reconcile('incident'), 2)
+        self.assertEqual(self.sync.get('incident', 'missing'), None)
+        self.assertEqual(len(self.sync.records('incident')), 3)
+
+    def test_04_add_field(self):
+        ''' Verify fields can be added to an existing mirror
+        '''
+        self.sync.sync()
+        self.sync.add_table(self.table, ['number', 'state', 'description'])
+        self.assertEqual(self.sync.records('incident')[0]['description'],
+                         None)
+
+    def test_05_reconcile_row_cap(self):
+        ''' Verify reconcile keeps the records beyond the row cap
+        '''
+        self.sync.sync()
+        self.emulator.row_cap = self.sync.row_cap = 2
+        self.assertEqual(self.sync.reconcile('incident'), 0)
+        self.assertEqual(len(self.sync.records('incident')), 5)
+        self.table.delete_multiple('number=INC0004')
+        self.assertEqual(self.sync.reconcile('incident'), 1)
+
+    def test_06_row_cap_same_second(self):
+        ''' Verify more records than the row cap updated in the same
+            second are all synced
+        '''
+        self.sync.sync()
+        self.emulator.row_cap = self.sync.row_cap = 2
+        self.clock.now += 60
+        self.table.update({'state': '4'}, 'active=true')
+        self.assertEqual(self.sync.sync_table('incident'), 5)
+        self.assertEqual(len(self.sync.records('incident', 'state = ?',
+                                               ('4',))), 5)
+
+    def test_07_fields(self):
+        ''' Verify only the mirrored fields are requested
+        '''
+        requested = []
+        get_records = self.table.get_records
+
+        def recording(query, **kwargs):
+            ''' Record the fields asked for.
+            '''
+            requested.append(kwargs.get('fields'))
+            return get_records(query, **kwargs)
+        self.table.get_records = recording
+        self.sync.sync()
+        self.assertEqual(requested, [['sys_id', 'sys_updated_on', 'number',
+                                      'state']])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -38,6 +38,7 @@ from requests.exceptions import HTTPError
 from httmock import HTTMock
 
 from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
 from ServiceNowRac.snow_table import SnowTable
 
 from test.unit.mock_defs import snow_table_get, http_return_404, \
@@ -165,5 +166,168 @@ class TestSnowTable(unittest.TestCase):
 
         self.assertEqual(resp[0]['count'], 5)
 
+class TestSnowTableEmulated(unittest.TestCase):
+    ''' Tests the bulk table api against the emulator
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        client = self.emulator.attach(SnowClient('servicenow-instance',
+                                                 'admin', 'admin'))
+        self.table = SnowTable('incident', client)
+
+    def test_00_upsert_many(self):
+        ''' Verify upsert_many inserts new keys and updates existing ones
+        '''
+        self.table.insert_multiple([{'correlation_id': 'C%03d' % num,
+                                     'state': '1'} for num in range(50)])
+        requests = self.emulator.requests
+        records = [{'correlation_id': 'C%03d' % num, 'state': '2'}
+                   for num in range(25, 75)]
+        result = self.table.upsert_many(records, batch_size=20)
+
+        self.assertEqual(len(result['inserted']), 25)
+        self.assertEqual(len(result['updated']), 25)
+        self.assertEqual(result['failed'], [])
+        # 3 key lookups, 2 insertMultiple, 2 grouped updates
+        self.assertEqual(self.emulator.requests - requests, 7)
+        states = [rec['state'] for rec in self.emulator.records('incident')]
+        self.assertEqual((len(states), states.count('2')), (75, 50))
+
+    def test_01_upsert_many_merges_keys(self):
+        ''' Verify records with the same key are merged
+        '''
+        result = self.table.upsert_many([
+            {'correlation_id': 'C1', 'state': '1', 'priority': '3'},
+            {'correlation_id': 'C1', 'state': '2'}])
+        self.assertEqual(len(result['inserted']), 1)
+        self.assertEqual(result['inserted'][0]['state'], '2')
+        self.assertEqual(result['inserted'][0]['priority'], '3')
+
+    def test_02_upsert_many_bad_key(self):
+        ''' Verify missing keys and keys with commas are rejected
+        '''
+        self.assertRaises(ValueError, self.table.upsert_many, [{'a': '1'}])
+        self.assertRaises(ValueError, self.table.upsert_many,
+                          [{'correlation_id': 'a,b'}])
+
+    def test_03_update_changed(self):
+        ''' Verify only changed fields are sent and no-op writes skipped
+        '''
+        current = self.table.insert({'number': 'INC0001', 'state': '1',
+                                     'priority': '3'})[0]
+        sys_id = current['sys_id']
+        requests = self.emulator.requests
+        resp = self.table.update_changed(sys_id, {'state': '1',
+                                                  'priority': 3}, current)
+        self.assertEqual(resp, [current])
+        self.assertEqual(self.emulator.requests, requests)
+
+        resp = self.table.update_changed(sys_id, {'state': '2',
+                                                  'priority': '3'}, current)
+        self.assertEqual(resp[0]['sys_mod_count'], '1')
+        self.assertEqual(self.emulator.requests, requests + 1)
+
+        # The response is remembered as the known version
+        self.table.update_changed(sys_id, {'state': '2'})
+        self.assertEqual(self.emulator.requests, requests + 1)
+        stats = self.table.diff_stats
+        self.assertEqual((stats['writes'], stats['writes_skipped']), (1, 2))
+        self.assertEqual(stats['bytes_sent'], len('{"state": "2"}'))
+        self.assertGreater(stats['bytes_skipped'], 0)
+
+    def test_03_update_changed_batch(self):
+        ''' Verify update_changed returns a future when batched
+        '''
+        current = self.table.insert({'number': 'INC0001', 'state': '1'})[0]
+        with self.table.conn.batch():
+            resp = self.table.update_changed(current['sys_id'],
+                                             {'state': '2'}, current)
+        self.assertEqual(resp.result()[0]['state'], '2')
+        self.assertEqual(self.table.known[current['sys_id']]['state'], '2')
+
+    def test_04_update_changed_unknown(self):
+        ''' Verify the full payload is sent without a known version
+        '''
+        sys_id = self.table.insert({'number': 'INC0001'})[0]['sys_id']
+        self.table.known.clear()
+        self.table.update_changed(sys_id, {'number': 'INC0001'})
+        self.assertEqual(self.table.diff_stats['writes'], 1)
+
+    def test_05_count_and_aggregate(self):
+        ''' Verify counts and aggregates are computed by the instance
+        '''
+        self.table.insert_multiple([{'priority': '%d' % (num % 3 + 1),
+                                     'reassignment_count': '%d' % num}
+                                    for num in range(9)])
+        requests = self.emulator.requests
+        self.assertEqual(self.table.count('priority=1'), 3)
+        self.assertEqual(self.table.count('priority=9'), 0)
+        groups = self.table.aggregate(
+            'priority!=3', group_by=['priority'],
+            metrics={'avg': ['reassignment_count'],
+                     'max': ['reassignment_count']})
+        self.assertEqual(self.emulator.requests - requests, 3)
+        self.assertEqual([(group['group'], group['count'],
+                           float(group['avg']['reassignment_count']),
+                           group['max']['reassignment_count'])
+                          for group in groups],
+                         [({'priority': '1'}, 3, 3.0, '6'),
+                          ({'priority': '2'}, 3, 4.0, '7')])
+        total = self.table.aggregate(metrics={'sum': ['reassignment_count']})
+        self.assertEqual(float(total[0]['sum']['reassignment_count']), 36)
+        self.assertEqual(total[0]['count'], 9)
+        self.assertRaises(ValueError, self.table.aggregate,
+                          metrics={'median': ['priority']})
+        self.assertEqual(self.table.count('bogus'), None)
+
+    def test_06_iter_records(self):
+        ''' Verify iter_records pages through sys_idIN chunks in sys_id
+            order
+        '''
+        self.table.insert_multiple([{'number': 'INC%04d' % num,
+                                     'state': '%d' % (num % 2)}
+                                    for num in range(25)])
+        requests = self.emulator.requests
+        records = list(self.table.iter_records('state=1^ORDERBYDESCnumber',
+                                               chunk_size=5))
+        self.assertEqual(sorted(record['number'] for record in records),
+                         ['INC%04d' % num for num in range(1, 24, 2)])
+        self.assertEqual([record['sys_id'] for record in records],
+                         sorted(record['sys_id'] for record in records))
+        # 2 getKeys pages, the last one empty, and 3 chunks
+        self.assertEqual(self.emulator.requests - requests, 5)
+
+        records = list(self.table.iter_records('state=0', chunk_size=5,
+                                               fields=['number'],
+                                               compact=True))
+        self.assertEqual(len(records), 13)
+        self.assertEqual(sorted(records[0]), ['number', 'sys_id'])
+        self.assertTrue(all(record._schema is records[0]._schema
+                            for record in records))
+        compact = self.table.get_records('state=0', compact=True)
+        self.assertEqual(len(compact), 13)
+        self.assertEqual(compact[0]['state'], '0')
+        self.assertRaises(RuntimeError, list,
+                          self.table.iter_records('bogus'))
+
+    def test_07_iter_records_row_cap(self):
+        ''' Verify the key listing is paged past the row cap
+        '''
+        self.emulator.row_cap = 5
+        self.emulator.load('incident', [{'number': 'INC%04d' % num,
+                                         'active': 'true'}
+                                        for num in range(12)])
+        self.emulator.load('incident', [{'number': 'INC1000',
+                                         'active': 'false'}])
+        self.assertEqual(len(self.table.get_keys('active=true')), 5)
+        keys = self.table.get_all_keys('active=true')
+        self.assertEqual(len(set(keys)), 12)
+        self.assertEqual(
+            sorted(record['number'] for record in
+                   self.table.iter_records('active=true', chunk_size=5)),
+            ['INC%04d' % num for num in range(12)])
+        self.assertEqual(len(self.table.get_all_keys(
+            'active=true^NQnumber=INC1000')), 13)
+
 if __name__ == '__main__':
     unittest.main()
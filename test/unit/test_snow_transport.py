@@ -0,0 +1,219 @@
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the pluggable transports
+'''
+import ssl
+import threading
+import unittest
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator, SnowEmulatorServer
+from ServiceNowRac.snow_session import MaxRetryError
+from ServiceNowRac.snow_table import SnowTable
+from ServiceNowRac import snow_transport
+from ServiceNowRac.snow_transport import HTTP2Adapter
+
+class TestSnowTransport(unittest.TestCase):
+    ''' Tests selecting a transport
+    '''
+    def test_00_adapter(self):
+        ''' Verify an adapter object is mounted for every URL
+        '''
+        adapter = HTTPAdapter()
+        client = SnowClient('servicenow-instance', 'admin', 'admin',
+                            transport=adapter)
+        self.assertIs(client.session.get_adapter(client.instance), adapter)
+        self.assertIs(client.session.get_adapter('http://localhost/'),
+                      adapter)
+        self.assertRaises(ValueError, SnowClient, 'servicenow-instance',
+                          'admin', 'admin', transport='smoke-signals')
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class TestHTTP2Adapter(unittest.TestCase):
+    ''' Tests the httpx transport against the emulator server
+    '''
+    def setUp(self):
+        self.emulator = SnowEmulator()
+        self.emulator.load('incident', [{'number': 'INC%04d' % num}
+                                        for num in range(20)])
+        self.server = SnowEmulatorServer(self.emulator, stall=1).start()
+        self.client = self.server.attach(
+            SnowClient('servicenow-instance', 'admin', 'admin',
+                       transport=HTTP2Adapter(max_connections=2)))
+        self.client.session.RETRY_DELAY = 0
+        self.table = SnowTable('incident', self.client)
+
+    def tearDown(self):
+        self.server.stop()
+        self.client.session.close()
+
+    def test_00_requests(self):
+        ''' Verify reads and writes from many threads
+        '''
+        results = []
+
+        def read(num):
+            results.append(self.table.get_records('number=INC%04d' % num))
+        threads = [threading.Thread(target=read, args=(num,))
+                   for num in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(result[0]['number'] for result in results),
+                         ['INC%04d' % num for num in range(20)])
+        self.assertEqual(len(self.table.insert({'number': 'INC0100'})), 1)
+        # No request was retried
+        self.assertEqual(self.emulator.requests, 21)
+
+    def test_01_retries(self):
+        ''' Verify the session still retries errors and timeouts
+        '''
+        self.emulator.error_rates = {503: 1.0}
+        self.assertRaises(MaxRetryError, self.table.get_records, '')
+        self.assertEqual(self.emulator.requests,
+                         self.client.session.MAX_RETRIES)
+
+        self.emulator.error_rates = {}
+        self.emulator.timeout_rate = 1.0
+        self.client.timeout = 0.2
+        self.assertRaises(MaxRetryError, self.table.get_keys, '')
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class TestHTTP2Dispatch(unittest.TestCase):
+    ''' Tests which hosts are sent through httpx
+    '''
+    def setUp(self):
+        self.versions = {'h2.example.com': b'HTTP/2',
+                         'h1.example.com': b'HTTP/1.1'}
+        self.hosts = []
+        self.adapter = HTTP2Adapter()
+        self.settings = []
+        self.adapter.new_client = self.new_client
+        self.fallback = []
+        self.adapter.fallback.send = self.send_fallback
+        self.client = SnowClient('servicenow-instance', 'admin', 'admin',
+                                 transport=self.adapter)
+        self.client.session.RETRY_DELAY = 0
+
+    def new_client(self, verify, cert):
+        ''' Return a client answering through handle().
+        '''
+        self.settings.append((verify, cert))
+        return httpx.Client(transport=httpx.MockTransport(self.handle))
+
+    def send_fallback(self, request, **kwargs):
+        ''' Record a request sent through the HTTP/1.1 adapter.
+        '''
+        # pylint: disable=unused-argument
+        self.fallback.append(request.url)
+        response = Response()
+        response.status_code = 200
+        response.request = request
+        return response
+
+    def handle(self, request):
+        ''' Answer with the protocol of the host, or time out.
+        '''
+        self.hosts.append(request.url.host)
+        if request.url.host == 'slow.example.com':
+            raise httpx.ReadTimeout('timed out', request=request)
+        return httpx.Response(200, json={'records': []}, extensions={
+            'http_version': self.versions[request.url.host]})
+
+    def test_00_dispatch(self):
+        ''' Verify HTTP/2 hosts use httpx and the others the fallback
+        '''
+        session = self.client.session
+        for _ in range(3):
+            response = session.get('https://h2.example.com/incident.do')
+            self.assertEqual(response.json(), {'records': []})
+            self.assertEqual(response.http_version, 'HTTP/2')
+        session.get('https://h1.example.com/incident.do')
+        session.get('https://h1.example.com/incident.do')
+        session.get('http://h2.example.com/incident.do')
+        self.assertEqual(self.hosts, ['h2.example.com'] * 3 +
+                         ['h1.example.com'])
+        self.assertEqual(self.fallback,
+                         ['https://h1.example.com/incident.do',
+                          'http://h2.example.com/incident.do'])
+
+    def test_01_timeout(self):
+        ''' Verify httpx timeouts are retried by the session
+        '''
+        self.assertRaises(MaxRetryError, self.client.session.get,
+                          'https://slow.example.com/incident.do')
+        self.assertEqual(len(self.hosts), self.client.session.MAX_RETRIES)
+
+    def test_02_settings(self):
+        ''' Verify verify and cert select the client and proxied requests
+            use the fallback
+        '''
+        session = self.client.session
+        # No CA bundle or proxy from the environment
+        session.trust_env = False
+        session.get('https://h2.example.com/incident.do')
+        session.get('https://h2.example.com/incident.do', verify=False)
+        session.get('https://h2.example.com/incident.do',
+                    cert=('client.pem', 'client.key'))
+        session.get('https://h2.example.com/incident.do', verify=False)
+        self.assertEqual(self.settings, [(True, None), (False, None),
+                                         (True, ('client.pem',
+                                                 'client.key'))])
+        session.get('https://h2.example.com/incident.do',
+                    proxies={'https': 'http://proxy.example.com:3128'})
+        self.assertEqual(len(self.hosts), 4)
+        self.assertEqual(self.fallback,
+                         ['https://h2.example.com/incident.do'])
+
+    def test_03_ssl_context(self):
+        ''' Verify the SSL context follows verify
+        '''
+        # pylint: disable=protected-access
+        context = snow_transport._ssl_context(True, None)
+        self.assertEqual(context.verify_mode, ssl.CERT_REQUIRED)
+        context = snow_transport._ssl_context(False, None)
+        self.assertEqual((context.verify_mode, context.check_hostname),
+                         (ssl.CERT_NONE, False))
+        self.assertRaises(IOError, snow_transport._ssl_context, True,
+                          '/nonexistent/client.pem')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# pylint: disable=wrong-import-position
+#
+# Copyright (c) 2016, Arista Networks, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#   Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimer.
+#
+#   Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in the
+#   documentation and/or other materials provided with the distribution.
+#
+#   Neither the name of Arista Networks nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# 'AS IS' AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL ARISTA NETWORKS
+# BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+# BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+# WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE
+# OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN
+# IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+''' Unit Tests for the change watch
+'''
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../lib'))
+import unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from testlib import FakeClock
+
+from ServiceNowRac.snow_client import SnowClient
+from ServiceNowRac.snow_emulator import SnowEmulator
+from ServiceNowRac.snow_table import SnowTable
+
+class TestSnowWatch(unittest.TestCase):
+    ''' Tests watching an emulated table for changes
+    '''
+    def setUp(self):
+        self.clock = FakeClock()
+        self.emulator = SnowEmulator()
+        self.emulator.clock = self.clock
+        client = self.emulator.attach(SnowClient('servicenow-instance',
+                                                 'admin', 'admin'))
+        self.table = SnowTable('incident', client)
+        for num in range(20):
+            self.table.insert({'number': 'INC%04d' % num, 'active': 'true'})
+        self.clock.now += 10
+        self.watch = self.table.watch('active=true', fields=['number'],
+                                      since='2016-01-01 00:00:05',
+                                      min_interval=0, max_interval=0.01)
+
+    def test_00_get_multiple(self):
+        ''' Verify records are fetched in bulk by sys_id
+        '''
+        keys = self.table.get_keys('')
+        records = self.table.get_multiple(keys, chunk_size=7)
+        self.assertEqual(sorted(rec['sys_id'] for rec in records),
+                         sorted(keys))
+        self.assertEqual(self.emulator.requests, 20 + 1 + 3)
+
+    def test_01_poll_changes_only(self):
+        ''' Verify a poll fetches only records changed since the mark
+        '''
+        self.assertEqual(self.watch.poll(), [])
+        self.table.update({'state': '2'}, 'number=INC0003')
+        changed = self.watch.poll()
+        self.assertEqual([rec['number'] for rec in changed], ['INC0003'])
+        self.assertEqual(sorted(changed[0].keys()),
+                         ['number', 'sys_id', 'sys_mod_count',
+                          'sys_updated_on'])
+        # The record at the high water mark is checked, not reported again
+        requests = self.emulator.requests
+        self.assertEqual(self.watch.poll(), [])
+        self.assertEqual(self.emulator.requests, requests + 2)
+
+    def test_01_poll_boundary_change(self):
+        ''' Verify a record at the high water mark that changes again in
+            the same second is reported
+        '''
+        self.table.update({'state': '2'}, 'number=INC0003')
+        self.assertEqual([rec['number'] for rec in self.watch.poll()],
+                         ['INC0003'])
+        self.table.update({'state': '3'}, 'number=INC0003')
+        changed = self.watch.poll()
+        self.assertEqual([rec['number'] for rec in changed], ['INC0003'])
+        self.assertEqual(changed[0]['sys_mod_count'], '2')
+        self.assertEqual(self.watch.poll(), [])
+
+    def test_01_poll_row_cap(self):
+        ''' Verify a probe truncated by the row cap loses no changes
+        '''
+        self.emulator.row_cap = self.watch.row_cap = 5
+        self.watch.poll()
+        for num in range(12):
+            if num % 3 == 0:
+                self.clock.now += 1
+            self.table.update({'state': '2'}, 'number=INC%04d' % (11 - num))
+        changed = []
+        for _ in range(10):
+            changed.extend(rec['number'] for rec in self.watch.poll())
+        self.assertEqual(sorted(changed),
+                         ['INC%04d' % num for num in range(12)])
+
+    def test_02_adaptive_interval(self):
+        ''' Verify the interval grows while quiet and shrinks on change
+        '''
+        self.watch.min_interval, self.watch.max_interval = 1, 8
+        self.watch.interval = 2
+        self.watch.poll()
+        self.assertEqual(self.watch.interval, 3)
+        self.table.update({'state': '2'}, 'number=INC0003')
+        self.watch.poll()
+        self.assertEqual(self.watch.interval, 1.5)
+
+    def test_03_iterate(self):
+        ''' Verify iteration yields changes until stopped
+        '''
+        self.table.update({'state': '2'}, 'numberININC0001,INC0002')
+        watch = iter(self.watch)
+        numbers = sorted([next(watch)['number'], next(watch)['number']])
+        self.assertEqual(numbers, ['INC0001', 'INC0002'])
+        self.watch.stop()
+        self.assertRaises(StopIteration, next, watch)
+
+    @unittest.skipIf(asyncio is None, 'asyncio is not available')
+    def test_04_async_iterate(self):
+        ''' Verify async iteration yields changes
+        '''
+        self.table.update({'state': '2'}, 'number=INC0004')
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            record = loop.run_until_complete(
+                self.watch.__aiter__().__anext__())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.assertEqual(record['number'], 'INC0004')
+
+if __name__ == '__main__':
+    unittest.main()